@@ -1,17 +1,28 @@
 # donna_agent.py
 
 import re
+import time
 from datetime import date
-from langchain.agents import create_tool_calling_agent, AgentExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+from langchain.agents import create_tool_calling_agent
 from langchain_core.prompts import ChatPromptTemplate, PromptTemplate
-from langchain_community.chat_message_histories import ChatMessageHistory
 from langchain_core.runnables.history import RunnableWithMessageHistory
 from langchain_core.agents import AgentAction
 
 # Local modules
 from llm_config import get_llm
-from models import AgentResult
+from models import AgentResult, PendingAction, EventSlots
 from llm_observer import observe_tool_output
+from session_pool import AgentSession
+from session_store import PersistentSessionPool
+from intent_router import IntentRouter
+from response_cache import response_cache
+from tool_memo import memoize_tools, turn_scope
+from parallel_tools import ParallelToolExecutor
+from tool_selector import ToolSelector
+from memory_manager import render_history, compact_memory
+from token_accounting import usage_scope, set_stage
+from slot_extractor import extract_event_slots, describe_event, slot_stats, EVENT_SLOT_CONFIDENCE
 
 # Tools from Microsoft Graph integrations
 from graph_tools.tasks import tools as task
@@ -21,10 +32,25 @@ from graph_tools.teams_tools import tools as teams_tools
 from graph_tools.user_management_tools import tools as user_tool
 from graph_tools.contacts_tools import tools as contact
 from graph_tools.email_tools import tools as email
+from graph_tools.contact_directory import contact_directory
+from graph_tools import data_versions
+from graph_tools.tracing import span, enter_stage, end_stage
 from search_tool import search_tool
 
-# Combine all tools into one list
-all_tools = email + contact + user_tool + teams_tools + presence_tools + event + task + [search_tool]
+# Combine all tools into one list (read-only Graph tools are memoized per turn)
+all_tools = memoize_tools(email + contact + user_tool + teams_tools + presence_tools + event + task + [search_tool])
+
+# Tool groups the agent can be given per turn instead of every tool
+tool_selector = ToolSelector(all_tools, {
+    "email": [t.name for t in email],
+    "contacts": [t.name for t in contact],
+    "users": [t.name for t in user_tool],
+    "teams": [t.name for t in teams_tools],
+    "presence": [t.name for t in presence_tools],
+    "calendar": [t.name for t in event],
+    "tasks": [t.name for t in task],
+    "web": [search_tool.name],
+})
 
 # -------------------------
 # Contextual behavior rules
@@ -66,35 +92,58 @@ def contains_time(text):
     return any(re.search(p, text, re.IGNORECASE) for p in patterns)
 
 # -------------------------
-# Memory management
+# Dialog state (pending actions)
 # -------------------------
-def save_pending_action(memory, action_type, details):
-    """Store a pending action in memory."""
-    clear_pending_action(memory)
-    memory.add_ai_message(f"__PENDING__:type={action_type},details={details}")
+# What each pending action is waiting for from the user
+PENDING_MISSING_SLOTS = {
+    "task": ["time"],
+    "event": ["time"],
+}
 
-def get_pending_action(memory):
-    """Extract the most recent pending action."""
-    for message in reversed(memory.messages):
-        if message.type == "ai" and message.content.startswith("__PENDING__"):
-            parts = message.content.replace("__PENDING__:", "").split(",")
-            return {"type": parts[0].split("=")[1], "details": parts[1].split("=")[1]}
-    return None
+def save_pending_action(session, action_type, details, slots=None, missing=None):
+    """Store the action awaiting user input in the session's dialog state."""
+    session.dialog.pending = PendingAction(
+        type=action_type,
+        details=details,
+        slots=slots or {},
+        missing=missing if missing is not None else PENDING_MISSING_SLOTS.get(action_type, [])
+    )
 
-def clear_pending_action(memory):
+def get_pending_action(session) -> Optional[PendingAction]:
+    """Return the pending action, if any."""
+    return session.dialog.pending
+
+def read_event_locally(user_input: str, pending_action: Optional[PendingAction]) -> Optional[EventSlots]:
+    """
+    Slots of a new-event request, or of the answer to its follow-up question,
+    when the rule-based extractor is confident; None leaves the turn to the LLM.
+    """
+    previous = None
+    if pending_action:
+        if pending_action.type != "event" or "title" not in pending_action.slots:
+            return None  # Not started by the extractor
+        previous = EventSlots.model_validate(pending_action.slots)
+    slots, confidence = extract_event_slots(user_input, previous=previous)
+    if confidence == 0:
+        return None
+    if confidence < EVENT_SLOT_CONFIDENCE:
+        slot_stats.record("fallback")
+        return None
+    return slots
+
+def clear_pending_action(session):
     """Clear any existing pending action."""
-    memory.messages = [m for m in memory.messages if not (m.type == "ai" and m.content.startswith("__PENDING__"))]
+    session.dialog.pending = None
 
 # -------------------------
-# In-memory chat sessions
+# Chat sessions (shared across workers via the session store)
 # -------------------------
-session_memory_store = {}
+DEFAULT_SESSION_ID = "clippy-session"
+agent_pool = PersistentSessionPool()
 
-def get_memory(session_id="clippy-session"):
+def get_memory(session_id=DEFAULT_SESSION_ID):
     """Fetch or create chat memory for a session."""
-    if session_id not in session_memory_store:
-        session_memory_store[session_id] = ChatMessageHistory(session_id=session_id)
-    return session_memory_store[session_id]
+    return agent_pool.get(session_id).memory
 
 # -------------------------
 # System prompt definition
@@ -106,123 +155,296 @@ system_prompt = ChatPromptTemplate.from_messages([
 ])
 
 # -------------------------
-# Main agent function
+# Fast path for clear read-only requests
 # -------------------------
-def get_chained_agent(session_id="clippy-session"):
-    """Builds the LangChain agent pipeline for Donna."""
-    llm = get_llm()
-    memory = get_memory(session_id)
+intent_router = IntentRouter(all_tools, context)
 
-    agent = create_tool_calling_agent(llm=llm, tools=all_tools, prompt=system_prompt)
-    agent_executor = AgentExecutor(agent=agent, tools=all_tools, verbose=True)
-
-    runnable_agent = RunnableWithMessageHistory(
+# -------------------------
+# Shared agent components (built once per process)
+# -------------------------
+_shared = {}
+
+def _build_agent(llm, tools: List):
+    agent = create_tool_calling_agent(llm=llm, tools=tools, prompt=system_prompt)
+    # Read-only tool calls planned in the same step run concurrently; writes stay ordered
+    agent_executor = ParallelToolExecutor(
+        agent=agent,
+        tools=tools,
+        verbose=True,
+        return_intermediate_steps=True,
+        read_only_tools=frozenset(data_versions.READ_TOOL_DOMAINS) | {search_tool.name}
+    )
+    return RunnableWithMessageHistory(
         agent_executor,
-        lambda session_id: memory,
+        get_memory,
         input_messages_key="input",
         history_messages_key="chat_history"
     )
 
-    async def run_full_chain(user_input: str):
-        pending_action = get_pending_action(memory)
-
-        # Prepare historical conversation and context for LLM polishing
-        full_history = "\n".join(
-            [f"User: {msg.content}" if msg.type == "human" else f"Assistant: {msg.content}"
-             for msg in memory.messages if not msg.content.startswith("__PENDING__")]
-        )
-        safe_context_text = beautify_context(context)
-
-        polish_prompt = PromptTemplate.from_template(
-            """
-            Conversation history:
-            {recent_history}
-
-            New input:
-            {user_input}
-
-            Context:
-            {context}
-
-            Instructions:
-            - If responding to a pending action (task, meeting, email), complete it.
-            - Always confirm email body with user before sending.
-            - Append "Best regards, Rushil Mehta" to email body during formatting.
-            - Ask for missing time if creating a task or meeting without time.
-            - For email, use actual contact email if known.
-            - There should be no placeholder in final emails.
-            - Avoid repeating previous questions. Only ask once and reuse memory.
-            """
-        )
+def get_shared_agent():
+    """
+    Build the LLM client, tool-calling agent and executor once. They hold no
+    per-conversation state, so every session reuses them; chat memory is
+    looked up per call through the session_id in the run config.
+    """
+    if not _shared:
+        llm = get_llm()
+        _shared["llm"] = llm
+        _shared["runnable_agent"] = _build_agent(llm, all_tools)
+        _shared["agents"] = {None: _shared["runnable_agent"]}  # tool groups -> agent bound to them
+    return _shared
+
+def get_agent_for(groups: Optional[Tuple[str, ...]]):
+    """Agent whose LLM is bound to the tools of `groups` only (built once per group set)."""
+    agents = get_shared_agent()["agents"]
+    if groups not in agents:
+        agents[groups] = _build_agent(_shared["llm"], tool_selector.tools_for(groups))
+    return agents[groups]
 
+# -------------------------
+# Main agent function
+# -------------------------
+async def _stream_agent(runnable_agent, inputs: Dict, config: Dict, emit: Callable[[Dict], None]) -> Dict:
+    """Run the agent via astream_events, forwarding tool calls and tokens to `emit`."""
+    result = {}
+    async for event in runnable_agent.astream_events(inputs, config=config, version="v2"):
+        kind = event["event"]
+        if kind == "on_tool_start":
+            emit({"event": "tool_start", "tool": event["name"], "input": event["data"].get("input")})
+        elif kind == "on_tool_end":
+            emit({"event": "tool_end", "tool": event["name"], "output": event["data"].get("output")})
+        elif kind == "on_chat_model_stream":
+            text = event["data"]["chunk"].content
+            if text:
+                emit({"event": "token", "stage": "agent", "text": text})
+        elif kind == "on_custom_event" and event["name"] in ("tool_cache_hit", "tool_step"):
+            emit({"event": event["name"], **event["data"]})
+        elif kind == "on_chain_end" and not event.get("parent_ids"):
+            result = event["data"].get("output") or {}
+    return result
+
+async def run_full_chain(
+    session: AgentSession,
+    user_input: str,
+    emit: Optional[Callable[[Dict], None]] = None
+) -> AgentResult:
+    """
+    Run one conversational turn for a session (callers hold session.lock).
+
+    Read-only questions are answered from the response cache while the Graph
+    data they came from is unchanged. When `emit` is given, progress events
+    (stages, tool calls, tool results and answer tokens) are passed to it as
+    they happen.
+    """
+    with span("turn", kind="turn", session_id=session.session_id):
+        return await _run_cached_turn(session, user_input, emit)
+
+async def _run_cached_turn(session: AgentSession, user_input: str, emit: Optional[Callable[[Dict], None]] = None) -> AgentResult:
+    memory = session.memory
+    cacheable = not get_pending_action(session) and response_cache.is_cacheable_query(user_input)
+
+    if cacheable:
+        with span("response_cache", kind="stage") as cache_span:
+            cached = response_cache.lookup(user_input, session.session_id)
+            cache_span.set(hit=cached is not None)
+        if cached:
+            if emit:
+                emit({"event": "stage", "stage": "cache"})
+            memory.add_user_message(user_input)
+            memory.add_ai_message(cached.output)
+            compact_memory(session, get_shared_agent()["llm"], on_update=agent_pool.save)
+            return cached
+
+    versions = data_versions.snapshot()
+    with turn_scope(), usage_scope(session.token_usage):
         try:
-            formatted = polish_prompt.format(
-                recent_history=full_history,
-                user_input=user_input,
-                context=safe_context_text
-            )
-            llm_response = await llm.ainvoke(formatted)
-            polished_output = llm_response.content.strip()
-        except Exception:
-            return AgentResult(output="I couldn't process that. Can you clarify?", tool_used="error")
-
-        # Handle continuation from pending state
+            result = await _run_turn(session, user_input, emit)
+        except BaseException as e:
+            end_stage(error=e)
+            raise
+        end_stage()
+    if cacheable:
+        response_cache.store(user_input, result, versions, session.session_id)
+
+    # Keep memory and prompt size bounded: old turns go to the rolling summary
+    compact_memory(session, get_shared_agent()["llm"], on_update=agent_pool.save)
+    return result
+
+async def _run_turn(
+    session: AgentSession,
+    user_input: str,
+    emit: Optional[Callable[[Dict], None]] = None
+) -> AgentResult:
+    llm = get_shared_agent()["llm"]
+    memory = session.memory
+
+    def stage(name: str):
+        set_stage(name)  # Token accounting
+        enter_stage(name)  # Tracing
+        if emit:
+            emit({"event": "stage", "stage": name})
+
+    pending_action = get_pending_action(session)
+
+    # Clear read-only requests go straight to their tool (no polish/agent/observer LLM calls)
+    if not pending_action:
+        routed = await intent_router.try_fast_path(user_input, has_time=contains_time(user_input))
+        if routed:
+            stage("fast_path")
+            memory.add_user_message(user_input)
+            memory.add_ai_message(routed.output)
+            return routed
+    started = time.perf_counter()
+
+    # New events in standard date/time phrasing are read by rules, without the polish LLM call
+    slots = read_event_locally(user_input, pending_action)
+    if slots is not None:
+        stage("slots")
+        request = f"{pending_action.details}\n{user_input}" if pending_action else user_input
+        if "start" in slots.missing_fields:
+            slot_stats.record("asked_for_time")
+            save_pending_action(session, "event", request, slots=slots.model_dump(exclude_none=True))
+            return AgentResult(output="When would you like to schedule this meeting?", tool_used="waiting_for_time")
+        slot_stats.record("local")
         if pending_action:
-            state_input = f"{pending_action['details']} at {user_input}"
-            clear_pending_action(memory)
-        else:
-            state_input = polished_output
-
-            if "task" in polished_output.lower() and not contains_time(user_input):
-                save_pending_action(memory, "task", polished_output)
-                return AgentResult(output="What time should I set for this task?", tool_used="waiting_for_time")
-
-            if "meeting" in polished_output.lower() and not contains_time(user_input):
-                save_pending_action(memory, "event", polished_output)
-                return AgentResult(output="When would you like to schedule this meeting?", tool_used="waiting_for_time")
-
-            if "send email" in polished_output.lower():
-                contact_list = await search_tool.invoke({"query": "get_user_contacts"})
-                recipient_email = None
-                for contact in contact_list.get("contacts", []):
-                    if contact["name"].lower() in polished_output.lower():
-                        recipient_email = contact["email"]
-                        break
-
-                if not recipient_email:
-                    save_pending_action(memory, "email", polished_output)
-                    return AgentResult(output="Whom should I send this email to?", tool_used="waiting_for_recipient")
-
-                if "confirm" not in polished_output.lower():
-                    save_pending_action(memory, "email", polished_output)
-                    return AgentResult(output="Please confirm the email body before sending.", tool_used="waiting_for_email_confirmation")
-
-        # Invoke final tool execution via the agent
-        result = await runnable_agent.ainvoke(
-            {"input": state_input},
-            config={
-                "configurable": {"session_id": session_id},
-                "run": {"metadata": {"return_intermediate_steps": True}}
-            }
-        )
-
-        # Store final results and intermediate steps
-        steps = result.get("intermediate_steps", [])
-        output = result.get("output", "No response.")
-        memory.add_user_message(user_input)
-        memory.add_ai_message(output)
-
-        # Post-process intermediate tool usage
-        if not steps:
-            return AgentResult(output=output, tool_used="final_output")
+            clear_pending_action(session)
+        return await _run_agent(session, user_input, describe_event(slots, request), stage, emit, started)
+
+    # Prepare historical conversation (summary + recent turns, within the token budget)
+    full_history = render_history(session)
+    safe_context_text = beautify_context(context)
+
+    polish_prompt = PromptTemplate.from_template(
+        """
+        Conversation history:
+        {recent_history}
+
+        New input:
+        {user_input}
+
+        Context:
+        {context}
+
+        Instructions:
+        - If responding to a pending action (task, meeting, email), complete it.
+        - Always confirm email body with user before sending.
+        - Append "Best regards, Rushil Mehta" to email body during formatting.
+        - Ask for missing time if creating a task or meeting without time.
+        - For email, use actual contact email if known.
+        - There should be no placeholder in final emails.
+        - Avoid repeating previous questions. Only ask once and reuse memory.
+        """
+    )
 
+    stage("polish")
+    try:
+        formatted = polish_prompt.format(
+            recent_history=full_history,
+            user_input=user_input,
+            context=safe_context_text
+        )
+        llm_response = await llm.ainvoke(formatted)
+        polished_output = llm_response.content.strip()
+    except Exception:
+        return AgentResult(output="I couldn't process that. Can you clarify?", tool_used="error")
+
+    # Handle continuation from pending state
+    if pending_action:
+        state_input = f"{pending_action.details} at {user_input}"
+        recipient = pending_action.slots.get("recipient")
+        if recipient:
+            state_input += f"\nRecipient: {recipient['name']} <{recipient['email']}>"
+        clear_pending_action(session)
+    else:
+        state_input = polished_output
+
+        if "task" in polished_output.lower() and not contains_time(user_input):
+            save_pending_action(session, "task", polished_output)
+            return AgentResult(output="What time should I set for this task?", tool_used="waiting_for_time")
+
+        if "meeting" in polished_output.lower() and not contains_time(user_input):
+            save_pending_action(session, "event", polished_output)
+            return AgentResult(output="When would you like to schedule this meeting?", tool_used="waiting_for_time")
+
+        if "send email" in polished_output.lower():
+            # Resolved against the in-memory contact directory (no network call)
+            recipient = contact_directory.resolve_recipient(polished_output)
+
+            if not recipient:
+                save_pending_action(session, "email", polished_output, missing=["recipient"])
+                return AgentResult(output="Whom should I send this email to?", tool_used="waiting_for_recipient")
+
+            if "confirm" not in polished_output.lower():
+                save_pending_action(session, "email", polished_output, slots={"recipient": recipient}, missing=["confirmation"])
+                return AgentResult(output="Please confirm the email body before sending.", tool_used="waiting_for_email_confirmation")
+
+            state_input = f"{polished_output}\nRecipient: {recipient['name']} <{recipient['email']}>"
+
+    return await _run_agent(session, user_input, state_input, stage, emit, started)
+
+# Agent outputs that carry no answer (stopped early, or an empty reply)
+UNUSABLE_OUTPUTS = re.compile(r"^(|no response\.?|agent stopped due to (iteration limit|max iterations|time limit).*)$", re.I | re.S)
+
+def _usable_output(output: str) -> bool:
+    return not UNUSABLE_OUTPUTS.match(output.strip())
+
+async def _run_agent(
+    session: AgentSession,
+    user_input: str,
+    state_input: str,
+    stage: Callable[[str], None],
+    emit: Optional[Callable[[Dict], None]],
+    started: float
+) -> AgentResult:
+    memory = session.memory
+
+    # Invoke final tool execution via the agent, bound only to the tools this request needs
+    stage("agent")
+    groups = tool_selector.select(f"{user_input}\n{state_input}")
+    runnable_agent = get_agent_for(groups)
+    agent_usage = session.token_usage.get("agent", {}).get("calls", 0)
+    agent_config = {
+        "configurable": {"session_id": session.session_id},
+        "run": {"metadata": {"return_intermediate_steps": True}}
+    }
+    if emit:
+        result = await _stream_agent(runnable_agent, {"input": state_input}, agent_config, emit)
+    else:
+        result = await runnable_agent.ainvoke({"input": state_input}, config=agent_config)
+    intent_router.stats.record_full(time.perf_counter() - started)
+    tool_selector.record_turn(groups, session.token_usage.get("agent", {}).get("calls", 0) - agent_usage)
+
+    # Answer with the agent's own output; the observer only stands in for it when
+    # a single tool ran and the agent came back with nothing usable
+    steps = result.get("intermediate_steps", [])
+    output = (result.get("output") or "").strip()
+    tools_called = [action.tool for action, _ in steps if isinstance(action, AgentAction)]
+    tool_used = tools_called[-1] if tools_called else "final_output"
+    if _usable_output(output) or len(steps) != 1 or not isinstance(steps[0][0], AgentAction):
+        output = output or "✅ Action complete."
+    else:
         action, observation = steps[0]
-        if isinstance(action, AgentAction):
-            observer_result = await observe_tool_output(user_input, action.tool, observation)
-            if observer_result != "NOT COMPLETE":
-                memory.add_ai_message(observer_result)
-                return AgentResult(output="✅ Done. Let me know if you need anything else.", tool_used=action.tool)
-
-        return AgentResult(output="✅ Action complete.", tool_used="fallback")
-
-    return run_full_chain
+        stage("observer")
+        on_token = (lambda text: emit({"event": "token", "stage": "observer", "text": text})) if emit else None
+        observer_result = await observe_tool_output(user_input, action.tool, observation, on_token=on_token)
+        if observer_result != "NOT COMPLETE":
+            output = observer_result
+        else:
+            output, tool_used = "✅ Action complete.", "fallback"
+
+    memory.add_user_message(user_input)
+    memory.add_ai_message(output)
+    return AgentResult(output=output, tool_used=tool_used, tools_called=tools_called)
+
+async def run_agent_turn(session_id: str, user_input: str, emit: Optional[Callable[[Dict], None]] = None) -> AgentResult:
+    """
+    Run a turn in the given session. Turns of the same session are serialized
+    by its lock; different sessions run concurrently.
+    """
+    return await agent_pool.run(session_id, lambda session: run_full_chain(session, user_input, emit))
+
+def get_chained_agent(session_id=DEFAULT_SESSION_ID):
+    """Return a runner bound to one session (kept for single-session callers)."""
+    async def runner(user_input: str):
+        return await run_agent_turn(session_id, user_input)
+    return runner
@@ -1,21 +1,45 @@
 # main.py
 
-from fastapi import FastAPI, UploadFile, File, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse, HTMLResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from uuid import uuid4
 import os
+import re
+import html
 import shutil
+import asyncio
+import threading
 
 # Models and Agent Setup
 from models import QueryRequest, QueryResponse
-from agent_setup import get_chained_agent
+from agent_setup import run_agent_turn, intent_router, agent_pool, tool_selector
+from llm_observer import observer_stats
+from response_cache import response_cache
+from tool_memo import memo_stats
+from parallel_tools import parallel_stats
+from memory_manager import memory_report
+from token_accounting import stage_totals
+from session_store import session_store, get_document_session, save_document_session
+from llm_registry import llm_registry, llm_priority
+from slot_extractor import slot_stats
+from jobs import job_runner, JobQueueFull
 
 # Routers (modular APIs)
 from task_event_api import router as task_event_router
 from contact_api import router as contacts_router
 from email_api import router as email_team_router
+from presence_api import router as presence_router
+from user_api import router as user_router
+
+# Background Graph services
+from graph_tools.outbox import start_sender
+from graph_tools.contact_directory import contact_directory
+from graph_tools import user_directory, teams_sync
+from graph_tools.chat_cache import warm_chat_cache
+from graph_tools.pagination import sse_event
+from graph_tools.tracing import trace, current_trace_id, get_trace, recent_traces
 
 # File Q&A Services
 from services.summarize_pdf import summarize_text
@@ -42,17 +66,63 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# -------------------------------------------
+# Request tracing
+# -------------------------------------------
+UNTRACED_PREFIXES = ("/debug", "/docs", "/redoc", "/openapi.json", "/jobs")
+REQUEST_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """
+    Trace each API request. The trace id is the caller's X-Request-ID (when
+    usable) or a new id, and is returned in the X-Request-ID header; view it
+    at /debug/traces/{id}.
+    """
+    path = request.url.path
+    if path.startswith(UNTRACED_PREFIXES) or path.endswith("stats"):
+        return await call_next(request)
+
+    request_id = request.headers.get("x-request-id", "")
+    with trace(f"{request.method} {path}", trace_id=request_id if REQUEST_ID.match(request_id) else None) as root:
+        response = await call_next(request)
+        root.set(status=response.status_code)
+    response.headers["X-Request-ID"] = root.trace_id
+    return response
+
 # -------------------------------------------
 # API Routers for modular endpoints
 # -------------------------------------------
 app.include_router(task_event_router, prefix="/api", tags=["Task & Event APIs"])
 app.include_router(email_team_router, prefix="/api", tags=["Email & Teams APIs"])
 app.include_router(contacts_router, prefix="/api", tags=["Contacts"])
+app.include_router(presence_router, prefix="/api", tags=["Presence"])
+app.include_router(user_router, prefix="/api", tags=["Users"])
 
 # -------------------------------------------
-# In-memory session-based file store
+# Background workers
 # -------------------------------------------
-session_store = {}
+@app.on_event("startup")
+async def start_background_workers():
+    # Resume delivery of any emails left in the outbox by a previous run
+    start_sender()
+    # Warm the contact directory so recipient lookups never wait on Graph
+    contact_directory.start_background_refresh()
+    # Keep the organization directory cache in sync via users/delta
+    user_directory.start_background_refresh()
+    # Keep the 1:1 Teams message cache fresh so /api/teams_messages reads never wait on Graph
+    teams_sync.start_background_refresh()
+    # Learn existing 1:1 chat IDs so private messages skip chat creation
+    threading.Thread(target=warm_chat_cache, name="chat-cache-warmup", daemon=True).start()
+    # Workers for background /ask jobs
+    job_runner.start()
+
+@app.on_event("shutdown")
+async def flush_sessions():
+    # Stop background jobs (recorded as cancelled) before the final flush
+    await job_runner.stop()
+    # Write sessions still queued by the write-behind store
+    session_store.flush()
 
 class ChatRequest(BaseModel):
     session_id: str
@@ -86,12 +156,13 @@ async def upload_file(file: UploadFile = File(...)):
     file_type = "pdf" if file_extension == ".pdf" else "excel"
     extracted_text = extract_text_from_pdf(temp_file_path) if file_type == "pdf" else None
 
-    session_store[session_id] = {
-        "file_path": temp_file_path,
+    # Stored in the shared session store so any worker can answer /chat
+    save_document_session(session_id, {
+        "file_path": os.path.abspath(temp_file_path),
         "file_type": file_type,
         "pdf_text": extracted_text,
         "chat_history": []
-    }
+    })
 
     return {"session_id": session_id, "file_type": file_type}
 
@@ -103,7 +174,7 @@ async def chat_with_file(chat_request: ChatRequest):
     session_id = chat_request.session_id
     question = chat_request.question
 
-    session = session_store.get(session_id)
+    session = get_document_session(session_id)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found.")
 
@@ -112,20 +183,23 @@ async def chat_with_file(chat_request: ChatRequest):
     chat_history = session.get("chat_history", [])
 
     try:
-        if file_type == "pdf":
-            document_text = session.get("pdf_text", "")
-            if not document_text:
-                raise HTTPException(status_code=500, detail="PDF content is empty or not parsed.")
-            answer = summarize_text(document_text, question)
+        # Queued behind interactive /ask turns when the LLM quota is tight
+        with llm_priority("documents"):
+            if file_type == "pdf":
+                document_text = session.get("pdf_text", "")
+                if not document_text:
+                    raise HTTPException(status_code=500, detail="PDF content is empty or not parsed.")
+                answer = await asyncio.to_thread(summarize_text, document_text, question)
 
-        elif file_type == "excel":
-            answer = await ask_question_to_excel(file_path, question)
+            elif file_type == "excel":
+                answer = await ask_question_to_excel(file_path, question)
 
-        else:
-            raise HTTPException(status_code=400, detail="Unsupported file type.")
+            else:
+                raise HTTPException(status_code=400, detail="Unsupported file type.")
 
         chat_history.append({"user": question, "assistant": answer})
         session["chat_history"] = chat_history
+        save_document_session(session_id, session)
 
         return {"session_id": session_id, "answer": answer, "chat_history": chat_history}
 
@@ -135,26 +209,256 @@ async def chat_with_file(chat_request: ChatRequest):
 # -------------------------------------------
 # Main Assistant Agent Endpoint (LLM + Tools)
 # -------------------------------------------
-agent_runner = get_chained_agent()
-
 @app.post("/ask", response_model=QueryResponse)
 async def ask(request: QueryRequest):
     """
     Main endpoint to query Donna AI Assistant.
     Uses LangChain Agent with Microsoft Graph tools.
+
+    Each session_id gets its own chat memory and pending actions; pass the
+    returned session_id back to continue the conversation.
+
+    With "background": true the turn runs as a job instead: the response
+    (202) carries its job_id at once; poll /jobs/{job_id} or follow
+    /jobs/{job_id}/events for progress and the result.
     """
+    session_id = request.session_id or str(uuid4())
+    if request.background:
+        try:
+            job = job_runner.submit(session_id, request.query)
+        except JobQueueFull as e:
+            raise HTTPException(status_code=503, detail=f"❌ Too many background jobs: {e}")
+        return JSONResponse(status_code=202, content={
+            "job_id": job.id,
+            "session_id": session_id,
+            "status": job.status,
+            "status_url": f"/jobs/{job.id}",
+            "events_url": f"/jobs/{job.id}/events"
+        })
     try:
-        agent_result = await agent_runner(request.query)
+        agent_result = await run_agent_turn(session_id, request.query)
         return QueryResponse(
             question=request.query,
             tool_used=agent_result.tool_used,
             response=agent_result.output,
-            human_feedback="👍 Good"
+            human_feedback="👍 Good",
+            session_id=session_id
         )
     except Exception as e:
         return QueryResponse(
             question=request.query,
             tool_used="error",
             response=f"❌ Failed: {str(e)}",
-            human_feedback="👎 Error"
+            human_feedback="👎 Error",
+            session_id=session_id
         )
+
+# -------------------------------------------
+# Streaming variant of /ask (Server-Sent Events)
+# -------------------------------------------
+active_streams = {}  # stream_id -> asyncio.Task running the turn
+
+@app.post("/ask/stream")
+async def ask_stream(request: QueryRequest):
+    """
+    Same as /ask, but streams progress as Server-Sent Events: "started"
+    (with stream_id and session_id), "stage", "tool_start", "tool_end",
+    "tool_cache_hit", "tool_step" (wall time saved by parallel tool calls),
+    "token", and finally "final", "error" or "cancelled".
+
+    Disconnecting, or calling /ask/stream/{stream_id}/cancel, cancels the
+    turn so no further LLM or Graph calls are made.
+    """
+    session_id = request.session_id or str(uuid4())
+    stream_id = str(uuid4())
+    queue = asyncio.Queue()
+
+    async def run_turn():
+        try:
+            agent_result = await run_agent_turn(session_id, request.query, emit=queue.put_nowait)
+            queue.put_nowait({"event": "final", "tool_used": agent_result.tool_used, "response": agent_result.output})
+        except asyncio.CancelledError:
+            queue.put_nowait({"event": "cancelled"})
+            raise
+        except Exception as e:
+            queue.put_nowait({"event": "error", "detail": f"❌ Failed: {str(e)}"})
+        finally:
+            queue.put_nowait(None)
+
+    task = asyncio.create_task(run_turn())
+    active_streams[stream_id] = task
+
+    async def events():
+        try:
+            yield sse_event({"event": "started", "stream_id": stream_id, "session_id": session_id, "trace_id": current_trace_id()})
+            while (event := await queue.get()) is not None:
+                yield sse_event(event)
+        finally:
+            # Client went away (or the turn ended): stop any remaining work
+            task.cancel()
+            active_streams.pop(stream_id, None)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.post("/ask/stream/{stream_id}/cancel")
+async def cancel_stream(stream_id: str):
+    """Cancel a running /ask/stream turn."""
+    task = active_streams.get(stream_id)
+    if not task:
+        raise HTTPException(status_code=404, detail="Stream not found or already finished.")
+    task.cancel()
+    return {"stream_id": stream_id, "status": "cancelling"}
+
+# -------------------------------------------
+# Background /ask jobs
+# -------------------------------------------
+@app.get("/jobs/stats")
+async def job_statistics():
+    """Background jobs submitted, rejected (queue full), finished by outcome, running and queued."""
+    return job_runner.report()
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    """Status of a background /ask job, its tool trace so far and, when finished, the result or error."""
+    status = job_runner.status(job_id)
+    if not status:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return status
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """
+    Progress of a background job as Server-Sent Events: "job" (current
+    status), the stage and tool events so far, then live events (including
+    answer tokens) until "final", "failed" or "cancelled". Disconnecting
+    only ends the stream; the job keeps running.
+    """
+    job = job_runner.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found in this worker; poll /jobs/{job_id} instead.")
+    past = list(job.events)
+    listener = None if job.done else job.listen()
+
+    async def events():
+        try:
+            yield sse_event({"event": "job", "job_id": job.id, "session_id": job.session_id, "status": job.status})
+            for event in past:
+                yield sse_event(event)
+            if listener is None:
+                yield sse_event(job.final_event())
+                return
+            while (event := await listener.get()) is not None:
+                yield sse_event(event)
+        finally:
+            if listener is not None:
+                job.unlisten(listener)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    """Cancel a queued or running background job."""
+    job = job_runner.cancel(job_id)
+    if not job:
+        if job_runner.status(job_id):
+            raise HTTPException(status_code=409, detail="Job belongs to another worker.")
+        raise HTTPException(status_code=404, detail="Job not found.")
+    if job.done and job.status != "cancelled":
+        raise HTTPException(status_code=409, detail=f"Job already {job.status}.")
+    return {"job_id": job.id, "status": "cancelled" if job.done else "cancelling"}
+
+# -------------------------------------------
+# Agent statistics (fast path and observer)
+# -------------------------------------------
+@app.get("/ask/routing_stats")
+async def routing_stats():
+    """Turns answered without LLM calls and the latency saved, per intent, plus events read without the polish call."""
+    return dict(intent_router.stats.report(), event_slots=slot_stats.report())
+
+@app.get("/ask/observer_stats")
+async def observer_statistics():
+    """How many tool outputs were interpreted by rules vs. sent to the LLM observer."""
+    return observer_stats.report()
+
+@app.get("/ask/cache_stats")
+async def cache_statistics():
+    """Response cache hits (exact and near-duplicate) and per-turn tool memoization counters."""
+    return {"responses": response_cache.report(), "tools": dict(memo_stats)}
+
+@app.get("/ask/parallel_tool_stats")
+async def parallel_tool_statistics():
+    """Agent steps with several tool calls, timeouts and wall time saved by running reads concurrently."""
+    return parallel_stats.report()
+
+@app.get("/ask/tool_selection_stats")
+async def tool_selection_statistics():
+    """Tool groups bound per turn, schema tokens saved, and selection accuracy on the fixed evaluation set."""
+    return tool_selector.report()
+
+@app.get("/llm/stats")
+async def llm_statistics():
+    """Per-deployment LLM requests, queueing, wait time, token budget and throttling."""
+    return llm_registry.report()
+
+@app.get("/ask/token_stats")
+async def token_statistics():
+    """LLM calls and prompt/completion tokens per stage (polish, agent, observer, summary)."""
+    return {"stages": stage_totals}
+
+@app.get("/ask/sessions/{session_id}/memory")
+async def session_memory(session_id: str):
+    """Rolling summary, history size and token usage of one /ask session."""
+    session = agent_pool.peek(session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found.")
+    return memory_report(session)
+
+@app.get("/ask/session_store_stats")
+async def session_store_statistics():
+    """Session backend in use plus write-behind counters (queued, coalesced, written, errors)."""
+    return session_store.report()
+
+# -------------------------------------------
+# Trace viewer
+# -------------------------------------------
+@app.get("/debug/traces")
+async def list_traces(limit: int = 50):
+    """Most recent traces of this worker (root span name, duration, span count)."""
+    return recent_traces(limit)
+
+@app.get("/debug/traces/{trace_id}")
+async def view_trace(trace_id: str, format: str = "json"):
+    """
+    One trace as a span tree with time per span kind (stage, llm, tool,
+    graph, ...). Use ?format=html for a waterfall view.
+    """
+    # Traces of other workers are read from the trace files
+    found = await asyncio.to_thread(get_trace, trace_id)
+    if not found:
+        raise HTTPException(status_code=404, detail="Trace not found.")
+    if format != "html":
+        return found
+
+    total = max((node["offset_ms"] + (node["duration_ms"] or 0) for node in found["tree"]), default=1) or 1
+    rows = []
+
+    def add_rows(nodes, depth):
+        for node in nodes:
+            duration = node["duration_ms"] or 0
+            left, width = node["offset_ms"] / total * 100, max(duration / total * 100, 0.3)
+            attributes = ", ".join(f"{k}={v}" for k, v in node["attributes"].items())
+            color = "#d9534f" if node["status"] == "error" else "#5b8def"
+            rows.append(
+                f"<tr><td style='padding-left:{depth * 16}px'>{html.escape(node['name'])}</td>"
+                f"<td>{node['kind']}</td><td align='right'>{duration:.1f} ms</td>"
+                f"<td style='width:50%'><div style='margin-left:{left:.2f}%;width:{width:.2f}%;background:{color};height:10px'></div></td>"
+                f"<td><small>{html.escape(attributes)}</small></td></tr>"
+            )
+            add_rows(node["children"], depth + 1)
+
+    add_rows(found["tree"], 0)
+    summary = ", ".join(f"{kind}: {ms:.1f} ms" for kind, ms in found["time_by_kind_ms"].items())
+    return HTMLResponse(
+        f"<html><body style='font-family:sans-serif'><h3>Trace {html.escape(trace_id)}</h3><p>{html.escape(summary)}</p>"
+        f"<table cellspacing='0' cellpadding='3'>{''.join(rows)}</table></body></html>"
+    )
@@ -0,0 +1,379 @@
+# benchmark.py
+#
+# Deterministic benchmark of the agent pipeline, without Azure OpenAI or
+# Microsoft Graph: a scripted chat model replays fixed LLM responses and a
+# stub answers Graph HTTP calls from fixtures, both with configurable latency.
+#
+#   python benchmark.py                                   # run the whole suite
+#   python benchmark.py --scenario "schedule meeting" --repeat 20
+#   python benchmark.py --llm-latency-ms 400 --graph-latency-ms 80 --json bench.json
+
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import asyncio
+import argparse
+import tempfile
+import statistics
+import tracemalloc
+import threading
+from contextlib import redirect_stdout
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+# ---------------------------------------------
+# Isolated local state (set before the app modules read their config)
+# ---------------------------------------------
+_state_dir = tempfile.mkdtemp(prefix="donna-bench-")
+os.environ["SESSION_BACKEND"] = "memory"
+os.environ["TRACE_FILE_PATH"] = ""
+os.environ["OUTBOX_DB_PATH"] = os.path.join(_state_dir, "outbox.db")
+os.environ["TEAMS_CACHE_DB_PATH"] = os.path.join(_state_dir, "teams_cache.db")
+os.environ["USER_DIRECTORY_DB_PATH"] = os.path.join(_state_dir, "user_directory.db")
+os.environ.setdefault("TAVILY_API_KEY", "benchmark")  # The search tool is built but never called
+
+import requests
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from pydantic import Field
+
+import llm_config
+from token_accounting import token_usage_callback
+
+# ---------------------------------------------
+# Scripted chat model
+# ---------------------------------------------
+class ScriptedChatModel(BaseChatModel):
+    """
+    Chat model that answers every call (polish, agent, observer, summary)
+    with the next message of its script after `latency_seconds`. Tool calls
+    are replayed from the scripted AIMessage's tool_calls.
+    """
+
+    script: List[BaseMessage] = Field(default_factory=list)
+    latency_seconds: float = 0.0
+    calls: int = 0
+    exhausted: bool = False
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def bind_tools(self, tools, **kwargs):
+        return self  # Tool calls come from the script
+
+    def load(self, script: List[BaseMessage]):
+        """Replace the remaining script; returns the messages left unused."""
+        unused, self.script, self.exhausted = self.script, list(script), False
+        return unused
+
+    def _next(self) -> ChatResult:
+        self.calls += 1
+        if not self.script:
+            self.exhausted = True
+            raise RuntimeError("Scripted model has no response left")
+        return ChatResult(generations=[ChatGeneration(message=self.script.pop(0))])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(self.latency_seconds)
+        return self._next()
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        await asyncio.sleep(self.latency_seconds)
+        return self._next()
+
+model = ScriptedChatModel(callbacks=[token_usage_callback])  # Per-stage token accounting still applies
+llm_config.get_llm = lambda *args, **kwargs: model  # Before any module builds its client
+
+# ---------------------------------------------
+# Stubbed Microsoft Graph
+# ---------------------------------------------
+class StubGraph:
+    """
+    Stands in for the `requests` module used by graph_client: answers each
+    call from a route table after `latency_seconds` and counts the calls.
+    """
+
+    def __init__(self, routes: List[tuple], latency_seconds: float = 0.0):
+        self.routes = [(method, re.compile(pattern), handler) for method, pattern, handler in routes]
+        self.latency_seconds = latency_seconds
+        self.calls = []  # "METHOD path" of every call
+        self._lock = threading.Lock()
+
+    def request(self, method: str, url: str, payload=None) -> requests.Response:
+        path = url.split("?", 1)[0].replace(f"{GRAPH_API}/", "")
+        with self._lock:
+            self.calls.append(f"{method} {path}")
+        time.sleep(self.latency_seconds)
+
+        status, body = 404, {"error": {"code": "NotFound", "message": f"No stub for {method} {path}"}}
+        for route_method, pattern, handler in self.routes:
+            if route_method == method and pattern.fullmatch(path):
+                status, body = handler(payload) if callable(handler) else handler
+                break
+
+        response = requests.Response()
+        response.status_code = status
+        response.url = url
+        response.headers["Content-Type"] = "application/json"
+        response._content = json.dumps(body).encode("utf-8") if body is not None else b""
+        return response
+
+    def get(self, url, headers=None, **kwargs):
+        return self.request("GET", url)
+
+    def post(self, url, headers=None, json=None, **kwargs):
+        return self.request("POST", url, json)
+
+    def patch(self, url, headers=None, json=None, **kwargs):
+        return self.request("PATCH", url, json)
+
+    def delete(self, url, headers=None, **kwargs):
+        return self.request("DELETE", url)
+
+    def put(self, url, headers=None, data=None, **kwargs):
+        return self.request("PUT", url, data)
+
+def _batch_accepted(payload: Dict):
+    return 200, {"responses": [{"id": r["id"], "status": 202, "headers": {}, "body": None} for r in payload["requests"]]}
+
+def graph_routes() -> List[tuple]:
+    """Fixture data: two task lists, one meeting today, one contact, the signed-in user."""
+    today = datetime.utcnow().date().isoformat()
+    return [
+        ("GET", r"me/todo/lists", (200, {"value": [
+            {"id": "list-1", "displayName": "Tasks"},
+            {"id": "list-2", "displayName": "Work"},
+        ]})),
+        ("GET", r"me/todo/lists/list-1/tasks", (200, {"value": [
+            {"id": "task-1", "title": "Pay invoice", "status": "notStarted",
+             "dueDateTime": {"dateTime": f"{today}T00:00:00.0000000", "timeZone": "UTC"}},
+            {"id": "task-2", "title": "Renew passport", "status": "notStarted",
+             "dueDateTime": {"dateTime": "2031-01-01T00:00:00.0000000", "timeZone": "UTC"}},
+        ]})),
+        ("GET", r"me/todo/lists/list-2/tasks", (200, {"value": [
+            {"id": "task-3", "title": "Send weekly report", "status": "inProgress",
+             "dueDateTime": {"dateTime": f"{today}T00:00:00.0000000", "timeZone": "UTC"}},
+        ]})),
+        ("GET", r"me/events", (200, {"value": [
+            {"id": "event-1", "subject": "Standup",
+             "start": {"dateTime": f"{today}T09:00:00", "timeZone": "UTC"},
+             "end": {"dateTime": f"{today}T09:15:00", "timeZone": "UTC"}},
+        ]})),
+        ("POST", r"me/events", (201, {"id": "event-2"})),
+        ("GET", r"me/contacts", (200, {"value": [
+            {"id": "contact-1", "displayName": "Alex Kim", "companyName": "Contoso",
+             "emailAddresses": [{"address": "alex.kim@contoso.com"}]},
+        ]})),
+        ("GET", r"me/people", (200, {"value": [
+            {"id": "person-1", "displayName": "Rushil Mehta", "scoredEmailAddresses": [{"address": "rushil.mehta@contoso.com"}]},
+        ]})),
+        ("GET", r"me", (200, {"id": "user-1", "displayName": "Rushil Mehta", "mail": "rushil.mehta@contoso.com",
+                              "userPrincipalName": "rushil.mehta@contoso.com"})),
+        ("POST", r"\$batch", _batch_accepted),
+    ]
+
+# ---------------------------------------------
+# App modules (import after the LLM factory is replaced)
+# ---------------------------------------------
+import agent_setup
+from graph_tools import graph_client, outbox, data_versions
+from graph_tools.graph_client import GRAPH_API
+from graph_tools.contact_directory import contact_directory
+
+graph = StubGraph(graph_routes())
+graph_client.requests = graph
+graph_client.get_token = lambda: "benchmark-token"
+# Queued emails are delivered inline (see the email scenario) instead of by
+# the background sender, so their Graph call lands in the turn that sent them
+outbox.start_sender = lambda: None
+
+# ---------------------------------------------
+# Scenarios: user turns + the LLM responses each turn consumes
+# ---------------------------------------------
+def _tool_call(name: str, args: Dict) -> AIMessage:
+    return AIMessage(content="", tool_calls=[{"name": name, "args": args, "id": f"call_{uuid.uuid4().hex[:8]}"}])
+
+def list_tasks_today() -> List[Dict]:
+    question = "What tasks are due today?"
+    return [
+        {"input": question, "llm": [], "expect": "list_tasks_today_tool"},
+        # Same question again: answered from the response cache
+        {"input": question, "llm": [], "expect": "list_tasks_today_tool"},
+    ]
+
+def schedule_meeting() -> List[Dict]:
+    start = (datetime.now() + timedelta(days=1)).replace(hour=15, minute=0, second=0, microsecond=0)
+    return [
+        # Both turns are read by the slot extractor (no polish call)
+        {"input": "Schedule a meeting with Alex Kim about the roadmap", "expect": "waiting_for_time", "llm": []},
+        {"input": "tomorrow at 3 PM", "expect": "add_calendar_event_with_availability_check", "llm": [
+            _tool_call("add_calendar_event_with_availability_check", {
+                "subject": "Roadmap",
+                "body_content": "Roadmap discussion",
+                "start_datetime": start.isoformat(),
+                "end_datetime": (start + timedelta(minutes=30)).isoformat(),
+                "attendee_emails": ["alex.kim@contoso.com"],
+            }),
+            AIMessage(content="The roadmap meeting with Alex Kim is booked for tomorrow at 3 PM."),
+        ]},
+    ]
+
+def send_email_with_confirmation() -> List[Dict]:
+    body = "Hi Alex,\n\nThe report is ready.\n\nBest regards, Rushil Mehta"
+    return [
+        {"input": "Send an email to Alex Kim saying the report is ready", "expect": "waiting_for_email_confirmation", "llm": [
+            AIMessage(content=f"Send email to Alex Kim with subject 'Report ready':\n{body}"),
+        ]},
+        {"input": "Yes, send it", "expect": "send_email", "deliver": True, "llm": [
+            AIMessage(content=f"The user approved. Send email to Alex Kim with subject 'Report ready':\n{body}"),
+            _tool_call("send_email", {
+                "recipient_email": "alex.kim@contoso.com",
+                "subject": "Report ready",
+                "body": body,
+                "idempotency_key": f"benchmark:{uuid.uuid4()}",  # A new email each run
+            }),
+            AIMessage(content="Your email to Alex Kim is on its way."),
+        ]},
+    ]
+
+SCENARIOS: Dict[str, Callable[[], List[Dict]]] = {
+    "list tasks today": list_tasks_today,
+    "schedule meeting": schedule_meeting,
+    "send email with confirmation": send_email_with_confirmation,
+}
+
+# ---------------------------------------------
+# Runner
+# ---------------------------------------------
+async def run_turn(session_id: str, turn: Dict, trace_allocations: bool) -> Dict:
+    """Run one user turn and measure it."""
+    model.load(turn["llm"])
+    llm_calls, graph_calls = model.calls, len(graph.calls)
+    if trace_allocations:
+        tracemalloc.reset_peak()
+        memory_before = tracemalloc.get_traced_memory()[0]
+
+    started = time.perf_counter()
+    result = await agent_setup.run_agent_turn(session_id, turn["input"])
+    if turn.get("deliver"):
+        outbox.flush_outbox()
+    wall = time.perf_counter() - started
+
+    measured = {
+        "input": turn["input"],
+        "path": result.tool_used,
+        "ok": result.tool_used == turn["expect"] and not model.exhausted,
+        "llm_calls": model.calls - llm_calls,
+        "graph_calls": len(graph.calls) - graph_calls,
+        "graph_endpoints": graph.calls[graph_calls:],
+        "unused_llm_responses": len(model.load([])),
+        "wall_ms": wall * 1000,
+    }
+    if trace_allocations:
+        memory_after, peak = tracemalloc.get_traced_memory()
+        measured["peak_kib"] = (peak - memory_before) / 1024
+        measured["retained_kib"] = (memory_after - memory_before) / 1024
+    return measured
+
+async def run_scenario(name: str, trace_allocations: bool = False) -> List[Dict]:
+    """Run a scenario in a fresh session; cached answers of earlier runs are invalidated first."""
+    for domain in data_versions.DOMAINS:
+        data_versions.bump(domain)
+    session_id = f"bench-{uuid.uuid4().hex[:8]}"
+    return [await run_turn(session_id, turn, trace_allocations) for turn in SCENARIOS[name]()]
+
+async def run_suite(names: List[str], repeat: int, verbose: bool) -> Dict:
+    """
+    Run every scenario once to warm up (agent build, tokenizer, contact
+    directory), `repeat` times for wall time, then once under tracemalloc
+    for allocations (tracing slows everything down, so it is timed apart).
+    """
+    output = sys.stdout if verbose else open(os.devnull, "w")
+    with redirect_stdout(output):
+        contact_directory.refresh()
+        for name in names:
+            await run_scenario(name)
+
+        results = {}
+        for name in names:
+            runs = [await run_scenario(name) for _ in range(repeat)]
+            tracemalloc.start()
+            try:
+                traced = await run_scenario(name, trace_allocations=True)
+            finally:
+                tracemalloc.stop()
+
+            turns = []
+            for index, turn in enumerate(runs[0]):
+                samples = [run[index] for run in runs]
+                turns.append(dict(
+                    turn,
+                    ok=all(sample["ok"] for sample in samples),
+                    deterministic=len({(s["llm_calls"], s["graph_calls"]) for s in samples}) == 1,
+                    wall_ms=round(statistics.median(s["wall_ms"] for s in samples), 2),
+                    wall_ms_max=round(max(s["wall_ms"] for s in samples), 2),
+                    peak_kib=round(traced[index]["peak_kib"], 1),
+                    retained_kib=round(traced[index]["retained_kib"], 1),
+                ))
+            results[name] = turns
+    if not verbose:
+        output.close()
+    return results
+
+def overhead_ms(turn: Dict, llm_latency: float, graph_latency: float) -> float:
+    """Wall time not spent in simulated LLM/Graph latency (parallel Graph calls make this a lower bound)."""
+    return turn["wall_ms"] - 1000 * (turn["llm_calls"] * llm_latency + turn["graph_calls"] * graph_latency)
+
+def print_report(results: Dict, llm_latency: float, graph_latency: float):
+    header = f"{'Scenario / turn':<52} {'Path':<42} {'LLM':>4} {'Graph':>6} {'Wall ms':>9} {'Own ms':>8} {'Peak KiB':>9} {'Kept KiB':>9}"
+    print(header)
+    print("-" * len(header))
+    for name, turns in results.items():
+        print(name)
+        for turn in turns:
+            status = "✅" if turn["ok"] and turn["deterministic"] else "❌"
+            label = f"  {status} {turn['input']}"[:52]
+            print(
+                f"{label:<52} {turn['path']:<42} {turn['llm_calls']:>4} {turn['graph_calls']:>6} "
+                f"{turn['wall_ms']:>9.1f} {overhead_ms(turn, llm_latency, graph_latency):>8.1f} "
+                f"{turn['peak_kib']:>9.1f} {turn['retained_kib']:>9.1f}"
+            )
+            if not turn["ok"]:
+                print("      ❌ expected a different path, or the LLM script ran out")
+            if not turn["deterministic"]:
+                print("      ❌ call counts differed between runs")
+        totals = {key: sum(turn[key] for turn in turns) for key in ("llm_calls", "graph_calls", "wall_ms")}
+        print(f"  {'per conversation':<92} {totals['llm_calls']:>4} {totals['graph_calls']:>6} {totals['wall_ms']:>9.1f}")
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the agent with a scripted LLM and stubbed Graph.")
+    parser.add_argument("--scenario", action="append", choices=list(SCENARIOS), help="Scenario to run (repeatable; default: all)")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per scenario (median is reported)")
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="Simulated latency of each LLM call")
+    parser.add_argument("--graph-latency-ms", type=float, default=0.0, help="Simulated latency of each Graph call")
+    parser.add_argument("--json", metavar="PATH", help="Also write the results as JSON")
+    parser.add_argument("--verbose", action="store_true", help="Show the app's own logging")
+    args = parser.parse_args(argv)
+
+    model.latency_seconds = args.llm_latency_ms / 1000
+    graph.latency_seconds = args.graph_latency_ms / 1000
+    results = asyncio.run(run_suite(args.scenario or list(SCENARIOS), max(1, args.repeat), args.verbose))
+
+    print_report(results, model.latency_seconds, graph.latency_seconds)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({
+                "llm_latency_ms": args.llm_latency_ms,
+                "graph_latency_ms": args.graph_latency_ms,
+                "repeat": args.repeat,
+                "scenarios": results,
+            }, f, indent=2, ensure_ascii=False)
+    return 0 if all(turn["ok"] and turn["deterministic"] for turns in results.values() for turn in turns) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+# bulk_import.py
+
+import os
+import csv
+from uuid import uuid4
+from fastapi import UploadFile, HTTPException
+from typing import Dict, Iterator, Optional, Tuple
+
+SUPPORTED_EXTENSIONS = (".csv", ".xlsx")
+
+# ---------------------------------------------
+# Helper: Save an upload to disk for row-by-row parsing
+# ---------------------------------------------
+async def spool_upload(file: UploadFile, prefix: str) -> Tuple[str, str]:
+    """
+    Copy an uploaded CSV/XLSX file to the temp folder in 1 MB chunks.
+
+    The file is parsed from disk while results stream back, so it must outlive
+    the request body. Callers delete it when they are done.
+
+    Returns:
+        tuple: (temp file path, lower-case extension)
+    """
+    extension = os.path.splitext(file.filename)[-1].lower()
+    if extension not in SUPPORTED_EXTENSIONS:
+        raise HTTPException(status_code=400, detail="Only CSV or XLSX files are supported.")
+
+    temp_folder = "temp"
+    os.makedirs(temp_folder, exist_ok=True)
+    temp_file_path = os.path.join(temp_folder, f"{prefix}-{uuid4()}{extension}")
+    with open(temp_file_path, "wb") as buffer:
+        while chunk := await file.read(1024 * 1024):
+            buffer.write(chunk)
+
+    return temp_file_path, extension
+
+# ---------------------------------------------
+# Generator: Stream rows from CSV / XLSX
+# ---------------------------------------------
+def iter_file_rows(path: str, extension: str) -> Iterator[Tuple[int, Dict]]:
+    """Yield (row_number, raw_row) from a CSV or XLSX file without loading it whole."""
+    if extension == ".csv":
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            for row_number, raw in enumerate(csv.DictReader(f), start=1):
+                yield row_number, raw
+        return
+
+    from openpyxl import load_workbook
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        headers = next(rows, None) or []
+        for row_number, values in enumerate(rows, start=1):
+            if any(v is not None for v in values):
+                yield row_number, dict(zip(headers, values))
+    finally:
+        workbook.close()
+
+def iter_spooled_rows(path: str, extension: str) -> Iterator[Tuple[int, Dict]]:
+    """Like iter_file_rows, but deletes the spooled file once iteration ends."""
+    try:
+        yield from iter_file_rows(path, extension)
+    finally:
+        os.remove(path)
+
+# ---------------------------------------------
+# Helper: Map spreadsheet headers onto model fields
+# ---------------------------------------------
+def normalize_row(raw: Dict, aliases: Optional[Dict[str, str]] = None) -> Dict:
+    """Lower-case/underscore headers, apply aliases and drop empty cells."""
+    aliases = aliases or {}
+    row = {}
+    for key, value in raw.items():
+        if key is None:
+            continue
+        field = str(key).strip().lower().replace(" ", "_")
+        field = aliases.get(field, field)
+        if value is None or str(value).strip() == "":
+            continue
+        row[field] = str(value).strip()
+    return row
+
+def describe_validation_error(error) -> str:
+    """Flatten a pydantic ValidationError into one readable line."""
+    return "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in error.errors())
@@ -5,9 +5,12 @@ from langchain_core.output_parsers import PydanticOutputParser
 from langchain_openai import ChatOpenAI  # or your custom LLM wrapper
 from pydantic import BaseModel, Field
 from typing import Optional, List
+from datetime import datetime
+from zoneinfo import ZoneInfo
 
 from models import EventSlots  # 👈 Pydantic model to structure extracted data
 from llm_config import get_llm  # 👈 Reusable LLM initialization
+from slot_extractor import extract_event_slots, EVENT_SLOT_CONFIDENCE, DEFAULT_TIMEZONE
 
 # -----------------------------------------
 # Prompt: Convert free-text into event data
@@ -15,6 +18,10 @@ from llm_config import get_llm  # 👈 Reusable LLM initialization
 prompt = PromptTemplate.from_template(
     """You are an assistant that extracts structured event‐creation parameters
     from a human request. Output must be strict JSON matching the Pydantic model.
+    Give start and end as ISO 8601 local times; list what is still needed in missing_fields.
+
+    Current date and time: {now}
+    {format_instructions}
 
     Human: "{input}"
     """
@@ -24,6 +31,7 @@ prompt = PromptTemplate.from_template(
 # Parser: Enforce structured Pydantic output
 # -----------------------------------------
 parser = PydanticOutputParser(pydantic_object=EventSlots)
+prompt = prompt.partial(format_instructions=parser.get_format_instructions())
 
 # -----------------------------------------
 # LLM: Load chat model (e.g., OpenAI, Azure)
@@ -34,3 +42,18 @@ llm = get_llm()
 # Chain: Prompt → LLM → JSON Parser
 # -----------------------------------------
 chain = prompt | llm | parser
+
+# -----------------------------------------
+# Extraction: local rules first, chain when unsure
+# -----------------------------------------
+async def extract_event(text: str) -> EventSlots:
+    """
+    Fill EventSlots for an event request. The rule-based extractor answers
+    standard date/time phrasing locally; the LLM chain only runs when its
+    confidence is below EVENT_SLOT_CONFIDENCE.
+    """
+    slots, confidence = extract_event_slots(text)
+    if confidence >= EVENT_SLOT_CONFIDENCE:
+        return slots
+    now = datetime.now(ZoneInfo(DEFAULT_TIMEZONE)).strftime("%A %Y-%m-%d %H:%M")
+    return await chain.ainvoke({"input": text, "now": now})
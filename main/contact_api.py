@@ -1,9 +1,17 @@
 # contacts_api_router.py
 
-from fastapi import APIRouter
-from pydantic import BaseModel, EmailStr
-from typing import Optional
+import json
+from collections import deque
+from fastapi import APIRouter, UploadFile, File
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, EmailStr, ValidationError
+from typing import Dict, Iterator, List, Optional, Tuple
 from contacts_helper import add_contact, get_contacts
+from graph_tools.contact_directory import contact_directory
+from graph_tools.batch import batch_request, iter_graph_batch
+from graph_tools.graph_client import graph_get, graph_post
+from graph_tools.pagination import ndjson_lines
+from bulk_import import spool_upload, iter_spooled_rows, normalize_row, describe_validation_error
 
 # Initialize router
 router = APIRouter()
@@ -18,6 +26,24 @@ class Contact(BaseModel):
     birthday: Optional[str] = None  # Format: "YYYY-MM-DD"
     company_name: Optional[str] = None
 
+# ---------------------------------------------
+# Helper: Contact model -> Graph contact payload
+# ---------------------------------------------
+def build_contact_payload(contact: Contact) -> dict:
+    """Convert a validated Contact into the Microsoft Graph contact format."""
+    contact_data = {
+        "displayName": contact.name,
+        "emailAddresses": [{"address": contact.email}],
+        "businessPhones": [contact.mobile],
+    }
+
+    if contact.birthday:
+        contact_data["birthday"] = contact.birthday
+    if contact.company_name:
+        contact_data["companyName"] = contact.company_name
+
+    return contact_data
+
 # ---------------------------------------------
 # Endpoint: Add new contact to Microsoft Graph
 # ---------------------------------------------
@@ -32,18 +58,7 @@ async def create_contact(contact: Contact):
     Returns:
         dict: Status message from the Graph API tool.
     """
-    contact_data = {
-        "displayName": contact.name,
-        "emailAddresses": [{"address": contact.email}],
-        "businessPhones": [contact.mobile],
-    }
-
-    if contact.birthday:
-        contact_data["birthday"] = contact.birthday
-    if contact.company_name:
-        contact_data["companyName"] = contact.company_name
-
-    status_message = add_contact(contact_data)
+    status_message = add_contact(build_contact_payload(contact))
     return {"message": status_message}
 
 # ---------------------------------------------
@@ -62,3 +77,156 @@ async def fetch_contacts():
         "contacts": contacts.get('value', []),
         "contact_count": len(contacts.get('value', []))
     }
+
+# ---------------------------------------------
+# Endpoint: Fuzzy search the contact directory
+# ---------------------------------------------
+@router.get("/contacts/search", summary="Search contacts by name, email or company", response_model=dict)
+async def search_contacts(q: str, limit: int = 5):
+    """
+    Search contacts and frequent people by name, email or company.
+
+    Args:
+        q (str): Search text (prefixes and small typos are tolerated).
+        limit (int): Maximum number of matches (default 5).
+
+    Returns:
+        dict: Ranked matches and their count.
+    """
+    matches = contact_directory.search(q, limit)
+    return {"matches": matches, "match_count": len(matches)}
+
+# ---------------------------------------------
+# Bulk import: column mapping
+# ---------------------------------------------
+IMPORT_MAX_CONCURRENCY = 4
+IMPORT_COLUMN_ALIASES = {
+    "display_name": "name",
+    "full_name": "name",
+    "email_address": "email",
+    "phone": "mobile",
+    "mobile_phone": "mobile",
+    "business_phone": "mobile",
+    "company": "company_name",
+}
+
+def _create_after_server_error(request: Dict) -> Dict:
+    """
+    Settle a create that failed with a 5xx. Graph may have created the
+    contact anyway, so look its email up before posting it once more.
+
+    Returns:
+        dict: Response-like dict with "status" (201 when the contact exists now) and "body".
+    """
+    email = request["body"]["emailAddresses"][0]["address"].replace("'", "''")
+    existing = graph_get(f"me/contacts?$filter=emailAddresses/any(a:a/address eq '{email}')&$top=1").get("value")
+    if existing:
+        return {"status": 201, "body": existing[0]}
+
+    response = graph_post("me/contacts", request["body"])
+    return {"status": response.status_code, "body": response.json() if response.content else None}
+
+# ---------------------------------------------
+# Bulk import: validate, dedupe and write via $batch
+# ---------------------------------------------
+def _import_contacts(rows: Iterator[Tuple[int, Dict]]) -> Iterator[Dict]:
+    """
+    Validate rows with the Contact model, skip emails that already exist (in
+    the directory or earlier in the file) and create the rest through Graph
+    $batch. Yields one result per row as soon as it is known, then a summary.
+    """
+    immediate = deque()
+    pending = {}
+    seen = set()
+    created = []
+    summary = {"created": 0, "duplicate": 0, "invalid": 0, "failed": 0}
+
+    def requests():
+        for row_number, raw in rows:
+            try:
+                contact = Contact(**normalize_row(raw, IMPORT_COLUMN_ALIASES))
+            except ValidationError as e:
+                immediate.append({"row": row_number, "status": "invalid", "detail": describe_validation_error(e)})
+                continue
+
+            email = contact.email.lower()
+            if email in seen or contact_directory.find_by_email(email):
+                immediate.append({"row": row_number, "email": contact.email, "status": "duplicate"})
+                continue
+
+            seen.add(email)
+            pending[str(row_number)] = contact.email
+            yield batch_request(str(row_number), "POST", "/me/contacts", build_contact_payload(contact))
+
+    def drain():
+        while immediate:
+            result = immediate.popleft()
+            summary[result["status"]] += 1
+            yield result
+
+    # Creates aren't retried blindly on a 5xx: a repeated POST would add the contact twice
+    batches = iter_graph_batch(
+        requests(),
+        max_concurrency=IMPORT_MAX_CONCURRENCY,
+        safe_to_retry=lambda request: request["method"] != "POST"
+    )
+    for request, response in batches:
+        yield from drain()
+
+        email = pending.pop(request["id"])
+        if response.get("status", 500) >= 500:
+            try:
+                response = _create_after_server_error(request)
+            except Exception as e:
+                response = {"status": 503, "body": str(e)}
+        if response.get("status") == 201:
+            created.append(response.get("body") or request["body"])
+            summary["created"] += 1
+            yield {"row": int(request["id"]), "email": email, "status": "created"}
+        else:
+            summary["failed"] += 1
+            yield {
+                "row": int(request["id"]),
+                "email": email,
+                "status": "failed",
+                "detail": f"{response.get('status')}: {json.dumps(response.get('body'), default=str)}"
+            }
+
+    yield from drain()
+
+    if created:
+        contact_directory.add_contacts(created)
+    yield {"summary": summary}
+
+# ---------------------------------------------
+# Endpoint: Bulk import contacts from CSV / XLSX
+# ---------------------------------------------
+@router.post("/contacts/import", summary="Bulk import contacts from a CSV or Excel file")
+async def import_contacts_file(file: UploadFile = File(...)):
+    """
+    Import contacts from an uploaded CSV or XLSX address book.
+
+    Expected columns: name, email, mobile, and optionally birthday and
+    company_name (common aliases like "Company" or "Phone" are accepted).
+
+    Returns:
+        StreamingResponse: NDJSON with one result per row
+        (created / duplicate / invalid / failed) and a final summary line.
+    """
+    temp_file_path, extension = await spool_upload(file, "contacts")
+    rows = iter_spooled_rows(temp_file_path, extension)
+    return StreamingResponse(ndjson_lines(_import_contacts(rows)), media_type="application/x-ndjson")
+
+# ---------------------------------------------
+# Endpoint: Bulk import contacts from JSON
+# ---------------------------------------------
+@router.post("/contacts/import_json", summary="Bulk import contacts from a JSON array")
+async def import_contacts_json(contacts: List[Dict]):
+    """
+    Import contacts from a JSON array of objects using the Contact fields.
+
+    Returns:
+        StreamingResponse: NDJSON with one result per row and a final summary line.
+    """
+    rows = ((row_number, raw) for row_number, raw in enumerate(contacts, start=1))
+    return StreamingResponse(ndjson_lines(_import_contacts(rows)), media_type="application/x-ndjson")
@@ -1,6 +1,7 @@
 # contacts_helper.py
 
-from graph_tools.graph_client import graph_get, graph_post
+from graph_tools.graph_client import graph_post
+from graph_tools.contact_directory import contact_directory
 
 # ----------------------------------------------------
 # Function: Add a new contact using Microsoft Graph API
@@ -18,6 +19,7 @@ def add_contact(contact_details: dict) -> str:
     response = graph_post("me/contacts", contact_details)
 
     if response.status_code == 201:
+        contact_directory.add_contacts([response.json()])
         return "✅ Contact added successfully!"
     else:
         return f"❌ Failed to add contact. Status Code: {response.status_code} - {response.text}"
@@ -29,7 +31,10 @@ def get_contacts() -> dict:
     """
     Retrieve all contacts from the signed-in user's Microsoft 365 account.
 
+    Served from the in-memory contact directory, which loads every page of
+    me/contacts once and refreshes in the background.
+
     Returns:
-        dict: Raw response data from Graph API (typically includes 'value' key with contacts).
+        dict: Contacts in Graph format under the 'value' key.
     """
-    return graph_get("me/contacts")
+    return {"value": contact_directory.list_contacts()}
@@ -1,45 +1,90 @@
 # email_team_api.py
 
-from fastapi import APIRouter
-from graph_tools.graph_client import graph_get, graph_post
-from typing import List
+from fastapi import APIRouter, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from graph_tools.graph_client import GRAPH_API, graph_get, graph_post
+from graph_tools.outbox import get_delivery_status, list_outbox
+from graph_tools.pagination import encode_cursor, decode_cursor, iter_graph_pages, ndjson_lines
+from graph_tools.teams_sync import sync_teams_messages, iter_cached_messages, normalize_timestamp
+from itertools import islice
+from typing import List, Dict, Optional
 
 # Initialize API router
 router = APIRouter()
 
+# Graph page sizes and field selections (keeps each page small on the wire)
+EMAIL_SELECT = "id,subject,from,receivedDateTime,bodyPreview,isRead"
+EMAIL_EXPORT_PAGE_SIZE = 100
+INBOX_MESSAGES = "me/mailFolders/Inbox/messages"
+
+# ---------------------------------------------------------------------
+# Helper: Flatten Graph message objects for the UI
+# ---------------------------------------------------------------------
+def _format_email(email: Dict) -> Dict:
+    """Convert a Graph message into the email metadata returned by the API."""
+    return {
+        "email_id": email.get("id"),
+        "subject": email.get("subject"),
+        "sender_name": email.get("from", {}).get("emailAddress", {}).get("name", ""),
+        "sender_email": email.get("from", {}).get("emailAddress", {}).get("address", ""),
+        "received_datetime": email.get("receivedDateTime"),
+        "body_preview": email.get("bodyPreview"),
+        "is_read": email.get("isRead", False)
+    }
+
+def _decode_or_400(cursor: str) -> Dict:
+    """Decode a client cursor, mapping malformed input to HTTP 400."""
+    try:
+        return decode_cursor(cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 # ---------------------------------------------------------------------
 # Endpoint: /emails
 # Description: Get recent emails from the signed-in user's inbox
 # ---------------------------------------------------------------------
 @router.get("/emails", summary="Get recent emails in JSON format")
-async def get_recent_emails(max_results: int = 12):
+async def get_recent_emails(max_results: int = 12, cursor: Optional[str] = None, stream: bool = False):
     """
     Fetch recent emails from Microsoft Outlook inbox using Microsoft Graph.
 
     Args:
-        max_results (int): Number of emails to retrieve (default 12).
+        max_results (int): Page size (default 12).
+        cursor (str): Opaque cursor from a previous page's "next_cursor".
+        stream (bool): Stream the whole inbox as NDJSON instead of one page.
 
     Returns:
-        dict: List of formatted email metadata and count.
+        dict: List of formatted email metadata, count and the next page cursor.
     """
-    response = graph_get(f"me/mailFolders/Inbox/messages?$top={max_results}&$orderby=receivedDateTime DESC")
-    emails = response.get('value', [])
-
-    email_list = []
-    for email in emails:
-        email_list.append({
-            "email_id": email.get("id"),
-            "subject": email.get("subject"),
-            "sender_name": email.get("from", {}).get("emailAddress", {}).get("name", ""),
-            "sender_email": email.get("from", {}).get("emailAddress", {}).get("address", ""),
-            "received_datetime": email.get("receivedDateTime"),
-            "body_preview": email.get("bodyPreview"),
-            "is_read": email.get("isRead", False)
-        })
+    if cursor:
+        first_page = _decode_or_400(cursor).get("next_link")
+        # Only ever page through the inbox listing, whatever the cursor says
+        if not isinstance(first_page, str) or not first_page.startswith(f"{GRAPH_API}/{INBOX_MESSAGES}?"):
+            raise HTTPException(status_code=400, detail="Invalid cursor.")
+    else:
+        page_size = EMAIL_EXPORT_PAGE_SIZE if stream else max_results
+        first_page = (
+            f"{INBOX_MESSAGES}?$top={page_size}"
+            f"&$orderby=receivedDateTime DESC&$select={EMAIL_SELECT}"
+        )
+
+    if stream:
+        emails = (
+            _format_email(email)
+            for page in iter_graph_pages(first_page)
+            for email in page.get('value', [])
+        )
+        return StreamingResponse(ndjson_lines(emails), media_type="application/x-ndjson")
+
+    response = graph_get(first_page)
+    email_list = [_format_email(email) for email in response.get('value', [])]
+    next_link = response.get("@odata.nextLink")
 
     return {
         "emails": email_list,
-        "email_count": len(email_list)
+        "email_count": len(email_list),
+        "next_cursor": encode_cursor({"next_link": next_link} if next_link else None)
     }
 
 # ---------------------------------------------------------------------
@@ -47,38 +92,94 @@ async def get_recent_emails(max_results: int = 12):
 # Description: Get 1:1 Teams messages from recent chats
 # ---------------------------------------------------------------------
 @router.get("/teams_messages", summary="List recent Teams chat messages (1:1)")
-async def list_recent_teams_messages():
+async def list_recent_teams_messages(
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    stream: bool = False,
+    since: Optional[str] = None,
+    refresh: bool = False,
+    skip_inactive: bool = True
+):
     """
     Retrieve chat messages from recent 1:1 Microsoft Teams conversations.
 
+    Messages are served from the local Teams cache, which a background thread
+    keeps up to date incrementally (only chats with new activity, only newer
+    messages). With refresh, a sync runs first, off the event loop.
+
+    Args:
+        limit (int): Number of messages per page (default 50).
+        cursor (str): Opaque cursor from a previous page's "next_cursor".
+        stream (bool): Stream every matching message as NDJSON instead of one page.
+        since (str): Only messages created after this ISO 8601 timestamp.
+        refresh (bool): Wait for a sync with Graph before reading (ignored when paging with a cursor).
+        skip_inactive (bool): During sync, skip chats whose lastMessagePreview is unchanged.
+
     Returns:
-        dict: List of chat messages across direct chats and message count.
+        dict: List of chat messages across direct chats, count and the next page cursor.
     """
-    response = graph_get("me/chats?$filter=chatType eq 'oneOnOne'")
-    chats = response.get('value', [])
-
-    messages_list = []
-
-    for chat in chats:
-        chat_id = chat.get('id')
-        if not chat_id:
-            continue
-
-        # Fetch messages from each 1:1 chat
-        chat_messages_response = graph_get(f"chats/{chat_id}/messages")
-        messages = chat_messages_response.get('value', [])
-
-        for message in messages:
-            messages_list.append({
-                "chat_id": chat_id,
-                "message_id": message.get('id'),
-                "from_user": message.get('from', {}).get('user', {}).get('displayName', ""),
-                "from_user_id": message.get('from', {}).get('user', {}).get('id', ""),
-                "created_datetime": message.get('createdDateTime'),
-                "message_content": message.get('body', {}).get('content', "")
-            })
+    position = _decode_or_400(cursor) if cursor else {}
+    before = tuple(position["before"]) if position.get("before") else None
+    since = position.get("since", since)
+
+    try:
+        since_filter = normalize_timestamp(since)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid 'since' timestamp.")
+
+    sync_stats = await run_in_threadpool(sync_teams_messages, skip_inactive) if refresh and not cursor else None
+    messages = iter_cached_messages(since=since_filter, before=before)
+
+    if stream:
+        return StreamingResponse(ndjson_lines(messages), media_type="application/x-ndjson")
+
+    messages_list = await run_in_threadpool(lambda: list(islice(messages, limit + 1)))
+    has_more = len(messages_list) > limit
+    messages_list = messages_list[:limit]
+
+    next_position = None
+    if has_more:
+        last = messages_list[-1]
+        next_position = {"before": [last["created_datetime"], last["message_id"]], "since": since_filter}
 
     return {
         "teams_messages": messages_list,
-        "message_count": len(messages_list)
+        "message_count": len(messages_list),
+        "next_cursor": encode_cursor(next_position),
+        "sync": sync_stats
     }
+
+# ---------------------------------------------------------------------
+# Endpoint: /outbox
+# Description: Delivery state of emails queued by the agent
+# ---------------------------------------------------------------------
+@router.get("/outbox", summary="List queued / sent emails from the outbox")
+async def get_outbox(status: Optional[str] = None, limit: int = 50):
+    """
+    List recent outbox entries, optionally filtered by delivery status.
+
+    Args:
+        status (str): One of 'queued', 'sending', 'retrying', 'sent', 'failed'.
+        limit (int): Maximum number of entries (default 50).
+
+    Returns:
+        dict: Outbox entries and count.
+    """
+    entries = list_outbox(status, limit)
+    return {"outbox": entries, "count": len(entries)}
+
+@router.get("/outbox/{tracking_id}", summary="Get delivery status of a queued email")
+async def get_outbox_status(tracking_id: str):
+    """
+    Return the delivery state of one queued email.
+
+    Args:
+        tracking_id (str): Tracking ID returned when the email was queued.
+
+    Returns:
+        dict: Status, attempt count and last error.
+    """
+    status = get_delivery_status(tracking_id)
+    if not status:
+        raise HTTPException(status_code=404, detail="Tracking ID not found.")
+    return status
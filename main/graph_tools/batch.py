@@ -0,0 +1,188 @@
+# batch.py
+
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, as_completed, wait
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from graph_tools.graph_client import graph_post
+from graph_tools.tracing import in_context
+
+# Microsoft Graph accepts at most 20 sub-requests per $batch call
+MAX_BATCH_SIZE = 20
+
+# Shared pause (epoch seconds) set when Graph throttles a concurrent batch
+_throttled_until = 0.0
+_throttle_lock = threading.Lock()
+
+# -----------------------------------------------------
+# Helper: Build one $batch sub-request
+# -----------------------------------------------------
+def batch_request(request_id: str, method: str, url: str, body: Optional[Dict] = None) -> Dict:
+    """
+    Build a JSON $batch sub-request.
+
+    Args:
+        request_id (str): Caller-chosen ID used to match the response.
+        method (str): HTTP method (e.g. "POST").
+        url (str): Relative Graph URL (e.g. "/me/sendMail").
+        body (dict): Optional JSON body.
+
+    Returns:
+        dict: Sub-request in Graph $batch format.
+    """
+    request = {"id": request_id, "method": method, "url": url}
+    if body is not None:
+        request["body"] = body
+        request["headers"] = {"Content-Type": "application/json"}
+    return request
+
+# -----------------------------------------------------
+# Internal: Send one $batch call (at most 20 sub-requests)
+# -----------------------------------------------------
+def _send_chunk(chunk: List[Dict]) -> Dict[str, Dict]:
+    """Send one $batch call; a failed call is reported against every sub-request."""
+    try:
+        response = graph_post("$batch", {"requests": chunk})
+    except Exception as e:
+        return {r["id"]: {"id": r["id"], "status": 503, "headers": {}, "body": str(e)} for r in chunk}
+
+    if response.status_code != 200:
+        return {
+            r["id"]: {"id": r["id"], "status": response.status_code, "headers": dict(response.headers), "body": response.text}
+            for r in chunk
+        }
+
+    return {item["id"]: item for item in response.json().get("responses", [])}
+
+# -----------------------------------------------------
+# Function: Send sub-requests through Graph $batch
+# -----------------------------------------------------
+def graph_batch(batch_requests: List[Dict]) -> Dict[str, Dict]:
+    """
+    Send sub-requests through the Graph $batch endpoint, 20 at a time.
+
+    If a whole $batch call fails, every sub-request in it gets that call's
+    status so callers can treat it like any other per-item failure.
+
+    Args:
+        batch_requests (List[dict]): Sub-requests built with batch_request().
+
+    Returns:
+        dict: Sub-request ID -> response dict ("status", "headers", "body").
+    """
+    results = {}
+    for start in range(0, len(batch_requests), MAX_BATCH_SIZE):
+        results.update(_send_chunk(batch_requests[start:start + MAX_BATCH_SIZE]))
+    return results
+
+# -----------------------------------------------------
+# Internal: One chunk with retries, honouring a shared throttle
+# -----------------------------------------------------
+def _send_chunk_with_retry(
+    chunk: List[Dict],
+    max_attempts: int,
+    safe_to_retry: Optional[Callable[[Dict], bool]] = None
+) -> List[Tuple[Dict, Dict]]:
+    global _throttled_until
+    pending = list(chunk)
+    results = []
+
+    for attempt in range(max_attempts):
+        # When Graph throttles one worker, every worker waits out the Retry-After
+        wait_for = _throttled_until - time.time()
+        if wait_for > 0:
+            time.sleep(wait_for)
+
+        responses = _send_chunk(pending)
+        retry, delay = [], 0.0
+        for request in pending:
+            response = responses.get(request["id"]) or {"status": 500, "headers": {}, "body": "No response in $batch reply."}
+            status = response.get("status", 500)
+            # A 429 was rejected before running; after a 5xx the request may have taken effect
+            retryable = status == 429 or (is_retryable(status) and (safe_to_retry is None or safe_to_retry(request)))
+            if retryable and attempt + 1 < max_attempts:
+                retry.append(request)
+                delay = max(delay, retry_delay_seconds(response, attempt, base=1.0, cap=60.0))
+            else:
+                results.append((request, response))
+
+        if not retry:
+            break
+        with _throttle_lock:
+            _throttled_until = max(_throttled_until, time.time() + delay)
+        pending = retry
+
+    return results
+
+# -----------------------------------------------------
+# Generator: Concurrent $batch with per-item results
+# -----------------------------------------------------
+def iter_graph_batch(
+    batch_requests: Iterable[Dict],
+    max_concurrency: int = 4,
+    max_attempts: int = 4,
+    safe_to_retry: Optional[Callable[[Dict], bool]] = None
+) -> Iterator[Tuple[Dict, Dict]]:
+    """
+    Send sub-requests through $batch with bounded concurrency and yield
+    (sub-request, response) pairs as each chunk completes.
+
+    Requests are consumed lazily, so at most `max_concurrency` chunks of 20
+    are in flight or buffered. Throttled (429) and 5xx sub-requests are
+    retried with backoff; a 429 pauses every worker for the Retry-After.
+
+    Args:
+        batch_requests (Iterable[dict]): Sub-requests built with batch_request().
+        max_concurrency (int): Maximum $batch calls in flight.
+        max_attempts (int): Attempts per sub-request before giving up.
+        safe_to_retry (callable): Returns False for sub-requests that must not
+            be repeated blindly after a 5xx (e.g. creates); those come back
+            with the 5xx for the caller to check. Defaults to retrying all.
+
+    Yields:
+        tuple: (sub-request, final response dict)
+    """
+    def chunks():
+        chunk = []
+        for request in batch_requests:
+            chunk.append(request)
+            if len(chunk) == MAX_BATCH_SIZE:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    with ThreadPoolExecutor(max_workers=max_concurrency) as pool:
+        in_flight = set()
+        for chunk in chunks():
+            if len(in_flight) >= max_concurrency:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from future.result()
+            in_flight.add(pool.submit(in_context(_send_chunk_with_retry), chunk, max_attempts, safe_to_retry))
+
+        for future in as_completed(in_flight):
+            yield from future.result()
+
+# -----------------------------------------------------
+# Helpers: Throttling / transient failure handling
+# -----------------------------------------------------
+def is_retryable(status: int) -> bool:
+    """Return True for statuses worth retrying (throttling and server errors)."""
+    return status == 429 or status >= 500
+
+def retry_delay_seconds(response: Dict, attempt: int, base: float = 2.0, cap: float = 300.0) -> float:
+    """
+    Work out how long to wait before retrying a sub-request.
+
+    Honours Graph's Retry-After header when present, otherwise uses
+    exponential backoff (base * 2^attempt) capped at `cap` seconds.
+    """
+    headers = {k.lower(): v for k, v in (response.get("headers") or {}).items()}
+    retry_after = headers.get("retry-after")
+    if retry_after:
+        try:
+            return min(float(retry_after), cap)
+        except ValueError:
+            pass
+    return min(base * (2 ** attempt), cap)
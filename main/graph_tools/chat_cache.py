@@ -0,0 +1,90 @@
+# chat_cache.py
+
+import time
+import threading
+from typing import Dict, Optional
+from graph_tools.graph_client import graph_get
+from graph_tools.local_db import open_db
+from graph_tools.pagination import iter_graph_pages
+from graph_tools.teams_sync import TEAMS_CACHE_DB_PATH
+
+# ---------------------------------------------
+# 1:1 chat lookup cache (user_id -> chat_id)
+# ---------------------------------------------
+CHAT_CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS one_on_one_chats (
+    user_id TEXT PRIMARY KEY,
+    chat_id TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+ONE_ON_ONE_CHATS_WITH_MEMBERS = "me/chats?$filter=chatType eq 'oneOnOne'&$expand=members&$top=50"
+
+_chat_ids = {}
+_loaded = False
+_lock = threading.Lock()
+
+def _db():
+    return open_db(TEAMS_CACHE_DB_PATH, CHAT_CACHE_SCHEMA)
+
+def _load_from_disk():
+    global _loaded
+    with _lock:
+        if _loaded:
+            return
+        with _db() as conn:
+            for row in conn.execute("SELECT user_id, chat_id FROM one_on_one_chats"):
+                _chat_ids.setdefault(row["user_id"], row["chat_id"])
+        _loaded = True
+
+# ---------------------------------------------
+# Function: Fill the cache from the user's existing 1:1 chats
+# ---------------------------------------------
+def warm_chat_cache() -> int:
+    """
+    Map every existing 1:1 chat to the other member's user ID.
+
+    Returns:
+        int: Number of chats cached.
+    """
+    _load_from_disk()
+    my_id = graph_get("me?$select=id").get("id")
+    mappings = {}
+
+    for page in iter_graph_pages(ONE_ON_ONE_CHATS_WITH_MEMBERS):
+        for chat in page.get('value', []):
+            for member in chat.get('members', []):
+                user_id = member.get('userId')
+                if user_id and user_id != my_id:
+                    mappings[user_id] = chat['id']
+
+    remember_chats(mappings)
+    return len(mappings)
+
+# ---------------------------------------------
+# Functions: Read / update cached chat IDs
+# ---------------------------------------------
+def get_cached_chat_id(user_id: str) -> Optional[str]:
+    """Return the known 1:1 chat ID for a user, or None."""
+    _load_from_disk()
+    return _chat_ids.get(user_id)
+
+def remember_chats(mappings: Dict[str, str]):
+    """Persist user_id -> chat_id mappings."""
+    if not mappings:
+        return
+    now = time.time()
+    with _lock:
+        _chat_ids.update(mappings)
+    with _db() as conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO one_on_one_chats (user_id, chat_id, updated_at) VALUES (?, ?, ?)",
+            [(user_id, chat_id, now) for user_id, chat_id in mappings.items()]
+        )
+
+def forget_chat(user_id: str):
+    """Drop a cached chat (e.g. after Graph reports it no longer exists)."""
+    with _lock:
+        _chat_ids.pop(user_id, None)
+    with _db() as conn:
+        conn.execute("DELETE FROM one_on_one_chats WHERE user_id = ?", (user_id,))
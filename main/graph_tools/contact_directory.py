@@ -0,0 +1,275 @@
+# contact_directory.py
+
+import re
+import time
+import threading
+import unicodedata
+from collections import defaultdict
+from typing import Dict, List, Optional, Set
+from graph_tools.graph_client import graph_get
+from graph_tools.pagination import iter_graph_pages
+
+# ---------------------------------------------
+# Directory configuration
+# ---------------------------------------------
+CONTACTS_ENDPOINT = (
+    "me/contacts?$top=200"
+    "&$select=id,displayName,emailAddresses,companyName,businessPhones,mobilePhone,birthday"
+)
+PEOPLE_ENDPOINT = "me/people?$top=200&$select=id,displayName,scoredEmailAddresses,companyName"
+ME_ENDPOINT = "me?$select=mail,userPrincipalName,otherMails"
+REFRESH_INTERVAL_SECONDS = 900
+MAX_PREFIX_LENGTH = 12
+
+EMAIL_PATTERN = re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+")
+# A closing ("Best regards,", "Thanks!") or "--" delimiter starting a line or
+# sentence, followed by the sender's name, title or nothing
+CLOSING = re.compile(
+    r"(?:^|(?<=[.!?])\s+)(?:--|(?:(?:best|kind|warm|warmest)\s+)?regards|best wishes|all the best|many thanks|"
+    r"thanks|thank you|cheers|sincerely|yours (?:truly|sincerely)|best)\s*[,.!]?(?=\s*(?:$|(?-i:[A-Z])))",
+    re.IGNORECASE | re.MULTILINE
+)
+MAX_SIGNATURE_LENGTH = 200
+
+def _normalize(text: Optional[str]) -> str:
+    """Lowercase and strip accents so 'José' matches 'jose'."""
+    decomposed = unicodedata.normalize("NFKD", text or "")
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+def _tokens(text: Optional[str]) -> List[str]:
+    return re.findall(r"[a-z0-9]+", _normalize(text))
+
+def _strip_signature(text: str) -> str:
+    """Drop the closing and signature block, which names the sender, not the recipient."""
+    for closing in CLOSING.finditer(text):
+        if len(text) - closing.end() <= MAX_SIGNATURE_LENGTH:
+            return text[:closing.start()]
+    return text
+
+def _trigrams(text: str) -> Set[str]:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+# ---------------------------------------------
+# Index: immutable snapshot, swapped atomically on refresh
+# ---------------------------------------------
+class _ContactIndex:
+    """Prefix and trigram indexes over name, email and company."""
+
+    def __init__(self, entries: List[Dict], raw_contacts: List[Dict]):
+        self.entries = entries
+        self.raw_contacts = raw_contacts
+        self.by_token = defaultdict(set)
+        self.by_prefix = defaultdict(set)
+        self.by_trigram = defaultdict(set)
+        self.by_email = {}
+
+        for i, entry in enumerate(entries):
+            self.by_email.setdefault(entry["email"].lower(), i)
+            for field in ("name", "email", "company"):
+                for token in _tokens(entry[field]):
+                    self.by_token[token].add(i)
+                    for end in range(1, min(len(token), MAX_PREFIX_LENGTH) + 1):
+                        self.by_prefix[token[:end]].add(i)
+                    for gram in _trigrams(token):
+                        self.by_trigram[gram].add(i)
+
+# ---------------------------------------------
+# Service: contact directory loaded from Graph
+# ---------------------------------------------
+class ContactDirectory:
+    """
+    In-memory directory of the user's contacts (me/contacts, all pages) and
+    relevant people (me/people), kept fresh by a background thread.
+
+    Lookups only touch the in-memory index; the network is used for the
+    initial load and periodic refreshes.
+    """
+
+    def __init__(self, refresh_interval: int = REFRESH_INTERVAL_SECONDS):
+        self.refresh_interval = refresh_interval
+        self._index = None
+        self._own_emails = set()  # Signed-in user's addresses, never a recipient
+        self._loaded_at = None
+        self._load_lock = threading.Lock()
+        self._refresher = None
+
+    # -------- loading --------
+    def refresh(self):
+        """Reload contacts and people from Graph and swap in a new index."""
+        raw_contacts = []
+        entries = []
+        seen = set()
+
+        for page in iter_graph_pages(CONTACTS_ENDPOINT):
+            for contact in page.get('value', []):
+                raw_contacts.append(contact)
+                for address in contact.get('emailAddresses', []):
+                    email = (address.get('address') or "").strip()
+                    if email and email.lower() not in seen:
+                        seen.add(email.lower())
+                        entries.append(self._entry(contact, email, "contact"))
+
+        for page in iter_graph_pages(PEOPLE_ENDPOINT):
+            for person in page.get('value', []):
+                for address in person.get('scoredEmailAddresses', []):
+                    email = (address.get('address') or "").strip()
+                    if email and email.lower() not in seen:
+                        seen.add(email.lower())
+                        entries.append(self._entry(person, email, "people"))
+
+        me = graph_get(ME_ENDPOINT)
+        own_emails = {me.get("mail"), me.get("userPrincipalName"), *(me.get("otherMails") or [])}
+
+        self._index = _ContactIndex(entries, raw_contacts)
+        self._own_emails = {email.lower() for email in own_emails if email}
+        self._loaded_at = time.time()
+
+    def _entry(self, item: Dict, email: str, source: str) -> Dict:
+        return {
+            "id": item.get("id"),
+            "name": item.get("displayName") or email.split("@")[0],
+            "email": email,
+            "company": item.get("companyName") or "",
+            "source": source
+        }
+
+    def ensure_loaded(self) -> _ContactIndex:
+        """Load the directory on first use; later calls return the cached index."""
+        if self._index is None:
+            with self._load_lock:
+                if self._index is None:
+                    self.refresh()
+        return self._index
+
+    def start_background_refresh(self):
+        """Load now (if needed) and refresh periodically in a daemon thread."""
+        if self._refresher and self._refresher.is_alive():
+            return
+
+        def loop():
+            while True:
+                try:
+                    if self._index is None or time.time() - self._loaded_at >= self.refresh_interval:
+                        self.refresh()
+                except Exception as e:
+                    print(f"❌ [DEBUG] Contact directory refresh failed: {e}")
+                time.sleep(self.refresh_interval)
+
+        self._refresher = threading.Thread(target=loop, name="contact-directory", daemon=True)
+        self._refresher.start()
+
+    def add_contacts(self, contacts: List[Dict]):
+        """Add newly created Graph contacts without waiting for the next refresh."""
+        index = self.ensure_loaded()
+        entries = list(index.entries)
+        known = set(index.by_email)
+        for contact in contacts:
+            for address in contact.get('emailAddresses', []):
+                email = (address.get('address') or "").strip()
+                if email and email.lower() not in known:
+                    known.add(email.lower())
+                    entries.append(self._entry(contact, email, "contact"))
+        self._index = _ContactIndex(entries, index.raw_contacts + list(contacts))
+
+    # -------- lookups --------
+    def list_contacts(self) -> List[Dict]:
+        """Return the raw Graph contact objects from me/contacts."""
+        return self.ensure_loaded().raw_contacts
+
+    def find_by_email(self, email: str) -> Optional[Dict]:
+        index = self.ensure_loaded()
+        position = index.by_email.get(email.strip().lower())
+        return index.entries[position] if position is not None else None
+
+    def search(self, query: str, limit: int = 5) -> List[Dict]:
+        """
+        Fuzzy search on name, email and company.
+
+        Every query token must prefix-match some token of the entry; if nothing
+        matches that way, fall back to trigram similarity to tolerate typos.
+
+        Args:
+            query (str): Free text such as "alex", "alex@contoso" or "contoso".
+            limit (int): Maximum number of matches.
+
+        Returns:
+            List[dict]: Matches with a "score" between 0 and 1, best first.
+        """
+        index = self.ensure_loaded()
+        query_tokens = _tokens(query)
+        if not query_tokens:
+            return []
+
+        candidates = None
+        for token in query_tokens:
+            ids = index.by_prefix.get(token[:MAX_PREFIX_LENGTH], set())
+            candidates = ids if candidates is None else candidates & ids
+            if not candidates:
+                break
+
+        scores = {}
+        if candidates:
+            for i in candidates:
+                exact = sum(1 for t in query_tokens if i in index.by_token.get(t, ()))
+                scores[i] = 0.5 + 0.5 * exact / len(query_tokens)
+        else:
+            query_grams = set()
+            for token in query_tokens:
+                query_grams |= _trigrams(token)
+            hits = defaultdict(int)
+            for gram in query_grams:
+                for i in index.by_trigram.get(gram, ()):
+                    hits[i] += 1
+            for i, shared in hits.items():
+                score = 0.5 * shared / len(query_grams)
+                if score >= 0.2:
+                    scores[i] = score
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], index.entries[item[0]]["name"]))[:limit]
+        return [dict(index.entries[i], score=round(score, 3)) for i, score in ranked]
+
+    def resolve_recipient(self, text: str) -> Optional[Dict]:
+        """
+        Pick the contact a free-text request refers to.
+
+        An explicit email address wins; otherwise the contact whose full name
+        (or, if unambiguous, first name) appears in the text. The closing and
+        signature are ignored and the signed-in user is never picked, so a
+        drafted email doesn't resolve to its own sender.
+
+        Args:
+            text (str): e.g. "Send email to Alex Smith about the report".
+
+        Returns:
+            dict | None: Matching directory entry.
+        """
+        text = _strip_signature(text)
+        explicit = EMAIL_PATTERN.search(text)
+        if explicit:
+            email = explicit.group(0)
+            return self.find_by_email(email) or {"name": email.split("@")[0], "email": email, "company": "", "source": "text"}
+
+        index = self.ensure_loaded()
+        text_tokens = set(_tokens(text))
+        full_matches, first_name_matches = [], []
+
+        for token in text_tokens:
+            for i in index.by_token.get(token, ()):
+                if index.entries[i]["email"].lower() in self._own_emails:
+                    continue
+                name_tokens = _tokens(index.entries[i]["name"])
+                if name_tokens and all(t in text_tokens for t in name_tokens):
+                    full_matches.append(i)
+                elif name_tokens and name_tokens[0] == token:
+                    first_name_matches.append(i)
+
+        if full_matches:
+            best = max(set(full_matches), key=lambda i: len(index.entries[i]["name"]))
+            return index.entries[best]
+        if len(set(first_name_matches)) == 1:
+            return index.entries[first_name_matches[0]]
+        return None
+
+# Shared directory instance used by the agent, tools and API
+contact_directory = ContactDirectory()
@@ -1,20 +1,26 @@
 # contacts_tools.py
 
-from graph_tools.graph_client import graph_get, graph_post
+from graph_tools.graph_client import graph_post
+from graph_tools.contact_directory import contact_directory
 from langchain.tools import tool
 
 # ------------------------------------------
 # Tool: Fetch user's Microsoft contact list
 # ------------------------------------------
 @tool
-def get_user_contacts() -> dict:
+def get_user_contacts(query: str = "") -> dict:
     """
-    Fetch the signed-in user's contacts from Microsoft Graph.
+    Look up the signed-in user's contacts (and frequent people) by name, email or company.
+
+    Args:
+        query: Optional search text, e.g. "Alex" or "contoso". Leave empty to list all contacts.
 
     Returns:
-        A dictionary containing contact details.
+        A dictionary with the best "matches" for the query, or all contacts under "value".
     """
-    return graph_get("me/contacts")
+    if query:
+        return {"matches": contact_directory.search(query)}
+    return {"value": contact_directory.list_contacts()}
 
 
 # --------------------------------------------------
@@ -41,6 +47,7 @@ def add_user_contact(contact_details: dict) -> str:
     response = graph_post("me/contacts", contact_details)
 
     if response.status_code == 201:
+        contact_directory.add_contacts([response.json()])
         return "✅ Contact added successfully!"
     else:
         return f"❌ Failed to add contact. Status Code: {response.status_code} - {response.text}"
@@ -0,0 +1,82 @@
+# data_versions.py
+
+import threading
+from typing import Dict, Optional
+
+# ---------------------------------------------
+# Per-domain version counters for Graph data
+# ---------------------------------------------
+# Every write made through graph_client bumps the version of the data domain
+# it touches, so caches can tell whether what they hold is still current.
+DOMAINS = ("tasks", "calendar", "email", "contacts", "users", "teams", "presence")
+
+# POST endpoints that only read data
+READ_ONLY_POSTS = ("communications/getPresencesByUserId", "me/findMeetingTimes", "me/calendar/getSchedule")
+
+# Read-only agent tools and the domain they read (everything else may write)
+READ_TOOL_DOMAINS = {
+    "list_all_tasks_tool": "tasks",
+    "list_tasks_today_tool": "tasks",
+    "get_events": "calendar",
+    "find_available_meeting_times": "calendar",
+    "list_emails": "email",
+    "get_email_delivery_status": "email",
+    "get_user_contacts": "contacts",
+    "get_signed_in_user_profile": "users",
+    "list_all_users": "users",
+    "search_directory_users": "users",
+    "list_joined_teams": "teams",
+    "get_user_presence": "presence",
+    "get_team_presence": "presence",
+}
+
+_versions = {domain: 0 for domain in DOMAINS}
+_lock = threading.Lock()
+
+def domain_for_endpoint(endpoint: str) -> Optional[str]:
+    """Map a Graph endpoint (e.g. "me/todo/lists/1/tasks") to its data domain."""
+    path = endpoint.split("?", 1)[0].strip("/").lower()
+    if "presence" in path or path.startswith("communications"):
+        return "presence"
+    if "chats" in path or "teams" in path:
+        return "teams"
+    if "/todo" in path or path.startswith("todo"):
+        return "tasks"
+    if "events" in path or "calendar" in path or "findmeetingtimes" in path:
+        return "calendar"
+    if "sendmail" in path or "messages" in path or "mailfolders" in path:
+        return "email"
+    if "contacts" in path:
+        return "contacts"
+    if path.startswith("users"):
+        return "users"
+    return None
+
+def bump(domain: str):
+    """Mark a domain's data as changed."""
+    with _lock:
+        _versions[domain] = _versions.get(domain, 0) + 1
+
+def record_write(method: str, endpoint: str, payload=None):
+    """
+    Bump the domain touched by a Graph write. $batch payloads bump the domain
+    of every non-GET request they contain.
+    """
+    if endpoint.strip("/") == "$batch" and isinstance(payload, dict):
+        for request in payload.get("requests", []):
+            if request.get("method", "GET").upper() != "GET":
+                record_write(request["method"], request.get("url", ""))
+        return
+    if method.upper() == "POST" and endpoint.strip("/").startswith(READ_ONLY_POSTS):
+        return
+    domain = domain_for_endpoint(endpoint)
+    if domain:
+        bump(domain)
+
+def version(domain: str) -> int:
+    return _versions.get(domain, 0)
+
+def snapshot() -> Dict[str, int]:
+    """Current version of every domain."""
+    with _lock:
+        return dict(_versions)
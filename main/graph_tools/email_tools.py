@@ -1,8 +1,9 @@
 # email_tools.py
 
-from graph_tools.graph_client import graph_get, graph_post
+from graph_tools.graph_client import graph_get
 from langchain.tools import tool
-from typing import List, Dict
+from graph_tools.outbox import enqueue_email, get_delivery_status
+from typing import List, Dict, Optional
 
 # --------------------------------------------------
 # Tool: Retrieve a list of recent emails from inbox
@@ -28,45 +29,49 @@ def list_emails(max_results: int = 10) -> dict:
 # Tool: Send a new email using Microsoft Graph
 # ----------------------------------------------
 @tool
-def send_email(recipient_email: str, subject: str, body: str) -> str:
+def send_email(recipient_email: str, subject: str, body: str, idempotency_key: Optional[str] = None) -> str:
     """
     Send an email to a specified recipient.
 
+    The email is written to the durable outbox and delivered in the background,
+    so this returns immediately with a tracking ID. Repeating the same call does
+    not send the email twice.
+
     Args:
         recipient_email (str): Email address of the recipient.
         subject (str): Subject of the email.
         body (str): Plain text body content of the email.
+        idempotency_key (str): Optional key to deduplicate repeated sends.
+
+    Returns:
+        str: Status message including the outbox tracking ID.
+    """
+    try:
+        queued = enqueue_email(recipient_email, subject, body, idempotency_key)
+    except Exception as e:
+        return f"❌ Failed to queue email: {e}"
+
+    if queued["status"] == "failed":
+        return f"❌ Email previously failed to send. Tracking ID: {queued['tracking_id']} - {queued['last_error']}"
+    return f"✅ Email queued for delivery. Tracking ID: {queued['tracking_id']}"
+
+
+# ----------------------------------------------
+# Tool: Check delivery state of a queued email
+# ----------------------------------------------
+@tool
+def get_email_delivery_status(tracking_id: str) -> dict:
+    """
+    Check whether a queued email has been delivered.
+
+    Args:
+        tracking_id (str): Tracking ID returned by send_email.
 
     Returns:
-        str: Status message indicating success or failure.
+        dict: Delivery status ('queued', 'sending', 'retrying', 'sent' or 'failed').
     """
-    # Construct payload in required Microsoft Graph format
-    payload = {
-        "message": {
-            "subject": subject,
-            "body": {
-                "contentType": "Text",
-                "content": body
-            },
-            "toRecipients": [
-                {
-                    "emailAddress": {
-                        "address": recipient_email
-                    }
-                }
-            ]
-        },
-        "saveToSentItems": "true"
-    }
-
-    # Send email using POST request
-    response = graph_post("me/sendMail", payload)
-
-    # Handle response based on HTTP status
-    if response.status_code == 202:
-        return "✅ Email sent successfully!"
-    else:
-        return f"❌ Failed to send email. Status Code: {response.status_code} - {response.text}"
+    status = get_delivery_status(tracking_id)
+    return status or {"error": f"No queued email found with tracking ID {tracking_id}."}
 
 
 # ----------------------------------------------
@@ -74,5 +79,6 @@ def send_email(recipient_email: str, subject: str, body: str) -> str:
 # ----------------------------------------------
 tools = [
     list_emails,
-    send_email
+    send_email,
+    get_email_delivery_status
 ]
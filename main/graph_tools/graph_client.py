@@ -2,10 +2,39 @@
 
 import requests
 from graph_tools.auth import get_token
+from graph_tools.data_versions import record_write
+from graph_tools.tracing import span
 
 # Base URL for Microsoft Graph API
 GRAPH_API = "https://graph.microsoft.com/v1.0"
 
+# -----------------------------------------------------
+# Function: Resolve an endpoint or nextLink to a full URL
+# -----------------------------------------------------
+def graph_url(endpoint: str) -> str:
+    """
+    Build the absolute Graph URL for an endpoint.
+
+    Absolute URLs (e.g. "@odata.nextLink" values) are accepted as long as they
+    point at Microsoft Graph, so paging links can be followed directly without
+    ever sending the bearer token to another host.
+
+    Args:
+        endpoint (str): Relative endpoint or absolute Graph URL.
+
+    Returns:
+        str: Absolute URL under GRAPH_API.
+    """
+    if endpoint.startswith(("http://", "https://")):
+        if not endpoint.startswith(f"{GRAPH_API}/"):
+            raise ValueError(f"Refusing to call non-Graph URL: {endpoint}")
+        return endpoint
+    return f"{GRAPH_API}/{endpoint}"
+
+def _span_path(endpoint: str) -> str:
+    """Endpoint path without the query string or Graph base URL, for span names."""
+    return endpoint.split("?", 1)[0].replace(f"{GRAPH_API}/", "")
+
 # -----------------------------------------------------
 # Function: Perform GET request to Microsoft Graph API
 # -----------------------------------------------------
@@ -14,14 +43,17 @@ def graph_get(endpoint: str) -> dict:
     Perform a GET request to the Microsoft Graph API.
 
     Args:
-        endpoint (str): The API endpoint (e.g., "me/messages").
+        endpoint (str): The API endpoint (e.g., "me/messages") or an absolute
+            Graph URL such as an "@odata.nextLink" returned by a previous page.
 
     Returns:
         dict: Parsed JSON response from the API.
     """
     token = get_token()
     headers = {"Authorization": f"Bearer {token}"}
-    response = requests.get(f"{GRAPH_API}/{endpoint}", headers=headers)
+    with span(f"GET {_span_path(endpoint)}", kind="graph", endpoint=endpoint) as graph_span:
+        response = requests.get(graph_url(endpoint), headers=headers)
+        graph_span.set(status=response.status_code)
     return response.json()
 
 # -----------------------------------------------------
@@ -43,7 +75,11 @@ def graph_post(endpoint: str, payload: dict) -> requests.Response:
         "Authorization": f"Bearer {token}",
         "Content-Type": "application/json"
     }
-    return requests.post(f"{GRAPH_API}/{endpoint}", headers=headers, json=payload)
+    with span(f"POST {_span_path(endpoint)}", kind="graph", endpoint=endpoint) as graph_span:
+        response = requests.post(f"{GRAPH_API}/{endpoint}", headers=headers, json=payload)
+        graph_span.set(status=response.status_code)
+    record_write("POST", endpoint, payload)
+    return response
 
 # -----------------------------------------------------
 # Function: Perform PATCH request to update Graph data
@@ -64,7 +100,11 @@ def graph_patch(endpoint: str, payload: dict) -> requests.Response:
         "Authorization": f"Bearer {token}",
         "Content-Type": "application/json"
     }
-    return requests.patch(f"{GRAPH_API}/{endpoint}", headers=headers, json=payload)
+    with span(f"PATCH {_span_path(endpoint)}", kind="graph", endpoint=endpoint) as graph_span:
+        response = requests.patch(f"{GRAPH_API}/{endpoint}", headers=headers, json=payload)
+        graph_span.set(status=response.status_code)
+    record_write("PATCH", endpoint)
+    return response
 
 # -----------------------------------------------------
 # Function: Perform DELETE request to remove data
@@ -81,7 +121,11 @@ def graph_delete(endpoint: str) -> requests.Response:
     """
     token = get_token()
     headers = {"Authorization": f"Bearer {token}"}
-    return requests.delete(f"{GRAPH_API}/{endpoint}", headers=headers)
+    with span(f"DELETE {_span_path(endpoint)}", kind="graph", endpoint=endpoint) as graph_span:
+        response = requests.delete(f"{GRAPH_API}/{endpoint}", headers=headers)
+        graph_span.set(status=response.status_code)
+    record_write("DELETE", endpoint)
+    return response
 
 # -----------------------------------------------------
 # Function: Perform PUT request (e.g., for file uploads)
@@ -102,4 +146,8 @@ def graph_put(endpoint: str, payload: str) -> requests.Response:
         "Authorization": f"Bearer {token}",
         "Content-Type": "text/plain"
     }
-    return requests.put(f"{GRAPH_API}/{endpoint}", headers=headers, data=payload)
+    with span(f"PUT {_span_path(endpoint)}", kind="graph", endpoint=endpoint) as graph_span:
+        response = requests.put(f"{GRAPH_API}/{endpoint}", headers=headers, data=payload)
+        graph_span.set(status=response.status_code)
+    record_write("PUT", endpoint)
+    return response
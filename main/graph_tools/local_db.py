@@ -0,0 +1,43 @@
+# local_db.py
+
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Iterator
+
+# (path, schema) pairs already applied in this process
+_initialized = set()
+_init_lock = threading.Lock()
+
+# -----------------------------------------------------
+# Context manager: Short-lived SQLite connection
+# -----------------------------------------------------
+@contextmanager
+def open_db(path: str, schema: str) -> Iterator[sqlite3.Connection]:
+    """
+    Open a SQLite database used for local caches and queues.
+
+    Each schema script runs once per path per process, so several modules
+    can keep their own tables in the same file. The connection uses WAL
+    mode so several worker processes can read while one writes; it commits on
+    success, rolls back on error and is always closed.
+
+    Args:
+        path (str): Database file path.
+        schema (str): Idempotent "CREATE ... IF NOT EXISTS" script.
+
+    Yields:
+        sqlite3.Connection: Connection with sqlite3.Row row factory.
+    """
+    conn = sqlite3.connect(path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    try:
+        with _init_lock:
+            if (path, schema) not in _initialized:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.executescript(schema)
+                _initialized.add((path, schema))
+        with conn:
+            yield conn
+    finally:
+        conn.close()
@@ -0,0 +1,233 @@
+# outbox.py
+
+import os
+import json
+import time
+import uuid
+import sqlite3
+import hashlib
+import threading
+from typing import Dict, List, Optional
+from graph_tools.local_db import open_db
+from graph_tools.batch import batch_request, graph_batch, is_retryable, retry_delay_seconds
+
+# ---------------------------------------------
+# Outbox configuration
+# ---------------------------------------------
+OUTBOX_DB_PATH = os.getenv("OUTBOX_DB_PATH", "outbox.db")
+OUTBOX_MAX_ATTEMPTS = 6
+OUTBOX_POLL_SECONDS = 5
+OUTBOX_BATCH_SIZE = 20
+# An email identical to one enqueued less than this long ago is treated as the same send
+OUTBOX_DEDUPE_WINDOW_SECONDS = 600
+# Rows stuck in 'sending' longer than this are assumed orphaned by a crash
+OUTBOX_STALE_SENDING_SECONDS = 300
+
+_lock = threading.Lock()
+_wakeup = threading.Event()
+_sender_thread = None
+
+# ---------------------------------------------
+# Storage: SQLite schema
+# ---------------------------------------------
+OUTBOX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id TEXT PRIMARY KEY,
+    idempotency_key TEXT UNIQUE NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt_at);
+"""
+
+def _db():
+    return open_db(OUTBOX_DB_PATH, OUTBOX_SCHEMA)
+
+def _row_to_status(row: sqlite3.Row) -> Dict:
+    payload = json.loads(row["payload"])
+    return {
+        "tracking_id": row["id"],
+        "status": row["status"],
+        "attempts": row["attempts"],
+        "recipient": payload["message"]["toRecipients"][0]["emailAddress"]["address"],
+        "subject": payload["message"]["subject"],
+        "last_error": row["last_error"],
+        "created_at": row["created_at"],
+        "updated_at": row["updated_at"]
+    }
+
+# ---------------------------------------------
+# Function: Queue an email for background delivery
+# ---------------------------------------------
+def enqueue_email(recipient_email: str, subject: str, body: str, idempotency_key: Optional[str] = None) -> Dict:
+    """
+    Store an email in the durable outbox and wake the background sender.
+
+    Without an explicit idempotency key, one is derived from the message
+    content, so an identical send repeated within the dedupe window (e.g. an
+    agent retrying a tool call) returns the original tracking ID instead of
+    sending twice.
+
+    Args:
+        recipient_email (str): Email address of the recipient.
+        subject (str): Subject of the email.
+        body (str): Plain text body content of the email.
+        idempotency_key (str): Optional caller-supplied deduplication key.
+
+    Returns:
+        dict: Delivery status of the queued (or previously queued) email.
+    """
+    payload = {
+        "message": {
+            "subject": subject,
+            "body": {"contentType": "Text", "content": body},
+            "toRecipients": [{"emailAddress": {"address": recipient_email}}]
+        },
+        "saveToSentItems": "true"
+    }
+
+    now = time.time()
+    with _lock, _db() as conn:
+        # Take the write lock up front so another worker can't enqueue the same email in between
+        conn.execute("BEGIN IMMEDIATE")
+        row = None
+        if not idempotency_key:
+            # Auto keys are "auto:<content digest>:<unique suffix>"; the range scan over the
+            # key's unique index finds the latest send of the same content
+            digest = hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+            row = conn.execute(
+                "SELECT * FROM outbox WHERE idempotency_key > ? AND idempotency_key < ? AND created_at > ? "
+                "ORDER BY created_at DESC LIMIT 1",
+                (f"auto:{digest}:", f"auto:{digest};", now - OUTBOX_DEDUPE_WINDOW_SECONDS)
+            ).fetchone()
+            idempotency_key = f"auto:{digest}:{uuid.uuid4().hex}"
+
+        if row is None:
+            conn.execute(
+                "INSERT OR IGNORE INTO outbox (id, idempotency_key, payload, status, attempts, next_attempt_at, created_at, updated_at) "
+                "VALUES (?, ?, ?, 'queued', 0, ?, ?, ?)",
+                (str(uuid.uuid4()), idempotency_key, json.dumps(payload), now, now, now)
+            )
+            row = conn.execute("SELECT * FROM outbox WHERE idempotency_key = ?", (idempotency_key,)).fetchone()
+
+    start_sender()
+    _wakeup.set()
+    return _row_to_status(row)
+
+# ---------------------------------------------
+# Function: Look up delivery state of queued emails
+# ---------------------------------------------
+def get_delivery_status(tracking_id: str) -> Optional[Dict]:
+    """Return the delivery status for a tracking ID, or None if unknown."""
+    with _db() as conn:
+        row = conn.execute("SELECT * FROM outbox WHERE id = ?", (tracking_id,)).fetchone()
+    return _row_to_status(row) if row else None
+
+def list_outbox(status: Optional[str] = None, limit: int = 50) -> List[Dict]:
+    """Return the most recent outbox entries, optionally filtered by status."""
+    with _db() as conn:
+        if status:
+            rows = conn.execute(
+                "SELECT * FROM outbox WHERE status = ? ORDER BY created_at DESC LIMIT ?", (status, limit)
+            ).fetchall()
+        else:
+            rows = conn.execute("SELECT * FROM outbox ORDER BY created_at DESC LIMIT ?", (limit,)).fetchall()
+    return [_row_to_status(row) for row in rows]
+
+# ---------------------------------------------
+# Background sender: claim due rows, send via $batch
+# ---------------------------------------------
+def _claim_due() -> List[sqlite3.Row]:
+    now = time.time()
+    with _lock, _db() as conn:
+        # Take the write lock up front so other worker processes can't claim the same rows
+        conn.execute("BEGIN IMMEDIATE")
+        rows = conn.execute(
+            "SELECT * FROM outbox WHERE status IN ('queued', 'retrying') AND next_attempt_at <= ? "
+            "ORDER BY next_attempt_at LIMIT ?",
+            (now, OUTBOX_BATCH_SIZE)
+        ).fetchall()
+        conn.executemany(
+            "UPDATE outbox SET status = 'sending', updated_at = ? WHERE id = ?",
+            [(now, row["id"]) for row in rows]
+        )
+    return rows
+
+def _record_results(rows: List[sqlite3.Row], results: Dict[str, Dict]):
+    now = time.time()
+    updates = []
+
+    for row in rows:
+        result = results.get(row["id"], {"status": 500, "body": "No response in $batch reply."})
+        status_code = result.get("status", 500)
+        attempts = row["attempts"] + 1
+
+        if status_code == 202:
+            updates.append(("sent", attempts, now, None, now, row["id"]))
+        elif is_retryable(status_code) and attempts < OUTBOX_MAX_ATTEMPTS:
+            delay = retry_delay_seconds(result, attempts)
+            updates.append(("retrying", attempts, now + delay, f"{status_code}: {result.get('body')}", now, row["id"]))
+        else:
+            updates.append(("failed", attempts, now, f"{status_code}: {result.get('body')}", now, row["id"]))
+
+    with _lock, _db() as conn:
+        conn.executemany(
+            "UPDATE outbox SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ?, updated_at = ? WHERE id = ?",
+            updates
+        )
+
+def flush_outbox() -> int:
+    """
+    Send every due outbox entry once.
+
+    Returns:
+        int: Number of entries attempted.
+    """
+    attempted = 0
+    while True:
+        rows = _claim_due()
+        if not rows:
+            return attempted
+
+        requests_batch = [
+            batch_request(row["id"], "POST", "/me/sendMail", json.loads(row["payload"]))
+            for row in rows
+        ]
+        try:
+            results = graph_batch(requests_batch)
+        except Exception as e:
+            results = {row["id"]: {"status": 503, "body": str(e)} for row in rows}
+
+        _record_results(rows, results)
+        attempted += len(rows)
+
+def _sender_loop():
+    while True:
+        try:
+            flush_outbox()
+        except Exception as e:
+            print(f"❌ [DEBUG] Outbox sender error: {e}")
+        _wakeup.wait(OUTBOX_POLL_SECONDS)
+        _wakeup.clear()
+
+def start_sender():
+    """Start the background sender thread once per process."""
+    global _sender_thread
+    with _lock:
+        if _sender_thread and _sender_thread.is_alive():
+            return
+
+        # Rows left in 'sending' by a crashed process are retried (at-least-once)
+        with _db() as conn:
+            conn.execute(
+                "UPDATE outbox SET status = 'retrying' WHERE status = 'sending' AND updated_at < ?",
+                (time.time() - OUTBOX_STALE_SENDING_SECONDS,)
+            )
+
+        _sender_thread = threading.Thread(target=_sender_loop, name="outbox-sender", daemon=True)
+        _sender_thread.start()
@@ -0,0 +1,120 @@
+# pagination.py
+
+import os
+import hmac
+import json
+import base64
+import hashlib
+import secrets
+from typing import Dict, Iterator, Iterable, Optional
+from graph_tools.graph_client import graph_get
+
+# Key signing cursors so clients can't forge paging positions (e.g. an arbitrary
+# Graph URL as nextLink). Set it when several workers serve the same clients;
+# the per-process default invalidates cursors on restart.
+CURSOR_SECRET = (os.getenv("CURSOR_SECRET") or secrets.token_hex(32)).encode("utf-8")
+
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode((text + "=" * (-len(text) % 4)).encode("ascii"))
+
+def _signature(raw: bytes) -> bytes:
+    return hmac.new(CURSOR_SECRET, raw, hashlib.sha256).digest()
+
+# -----------------------------------------------------
+# Function: Encode a paging position as an opaque cursor
+# -----------------------------------------------------
+def encode_cursor(position: Optional[Dict]) -> Optional[str]:
+    """
+    Turn a paging position into an opaque, URL-safe cursor string signed
+    with CURSOR_SECRET.
+
+    Args:
+        position (dict | None): Paging state (e.g. a Graph "@odata.nextLink").
+
+    Returns:
+        str | None: Cursor for the client, or None when there are no more pages.
+    """
+    if not position:
+        return None
+    raw = json.dumps(position, separators=(",", ":")).encode("utf-8")
+    return f"{_b64encode(raw)}.{_b64encode(_signature(raw))}"
+
+# -----------------------------------------------------
+# Function: Decode a cursor previously issued by encode_cursor
+# -----------------------------------------------------
+def decode_cursor(cursor: str) -> Dict:
+    """
+    Decode an opaque cursor back into its paging position, checking that
+    this service issued it.
+
+    Args:
+        cursor (str): Cursor string returned by a previous page.
+
+    Returns:
+        dict: Paging state.
+
+    Raises:
+        ValueError: If the cursor is malformed or its signature doesn't match.
+    """
+    try:
+        payload, signature = cursor.split(".")
+        raw = _b64decode(payload)
+        if not hmac.compare_digest(_b64decode(signature), _signature(raw)):
+            raise ValueError("Bad signature.")
+        position = json.loads(raw)
+    except Exception:
+        raise ValueError("Invalid cursor.")
+
+    if not isinstance(position, dict):
+        raise ValueError("Invalid cursor.")
+    return position
+
+# -----------------------------------------------------
+# Generator: Walk every page of a Graph collection
+# -----------------------------------------------------
+def iter_graph_pages(endpoint: str) -> Iterator[Dict]:
+    """
+    Yield each page of a Graph collection, following "@odata.nextLink".
+
+    Only one page is held in memory at a time.
+
+    Args:
+        endpoint (str): Relative endpoint or absolute Graph URL of the first page.
+
+    Yields:
+        dict: Raw page response (with 'value' and optional '@odata.nextLink').
+    """
+    next_url = endpoint
+    while next_url:
+        page = graph_get(next_url)
+        yield page
+        next_url = page.get("@odata.nextLink")
+
+# -----------------------------------------------------
+# Generator: Serialize items as newline-delimited JSON
+# -----------------------------------------------------
+def ndjson_lines(items: Iterable[Dict]) -> Iterator[bytes]:
+    """
+    Serialize items one per line for NDJSON streaming responses.
+
+    Args:
+        items (Iterable[dict]): Items to serialize (consumed lazily).
+
+    Yields:
+        bytes: One JSON document followed by a newline.
+    """
+    for item in items:
+        yield (json.dumps(item, default=str) + "\n").encode("utf-8")
+
+# -----------------------------------------------------
+# Function: Serialize one Server-Sent Event
+# -----------------------------------------------------
+def sse_event(event: Dict) -> bytes:
+    """
+    Format an event dict as a Server-Sent Event, using its "event" key as
+    the SSE event name and the whole dict as the JSON data line.
+    """
+    return f"event: {event.get('event', 'message')}\ndata: {json.dumps(event, default=str)}\n\n".encode("utf-8")
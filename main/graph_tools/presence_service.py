@@ -0,0 +1,173 @@
+# presence_service.py
+
+import os
+import re
+import time
+import threading
+from uuid import uuid4
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+from graph_tools.graph_client import graph_post, graph_patch
+from graph_tools.pagination import iter_graph_pages
+
+# ---------------------------------------------
+# Presence service configuration
+# ---------------------------------------------
+PRESENCE_BATCH_LIMIT = 650  # max IDs per getPresencesByUserId call
+PRESENCE_TTL_SECONDS = int(os.getenv("PRESENCE_TTL_SECONDS", "60"))
+# Public HTTPS URL of /api/presence/notifications; subscriptions are off when unset
+PRESENCE_NOTIFICATION_URL = os.getenv("PRESENCE_NOTIFICATION_URL")
+PRESENCE_SUBSCRIPTION_MINUTES = 55  # Graph caps presence subscriptions at 1 hour
+SUBSCRIPTION_FILTER_LIMIT = 650
+# Echoed back by Graph in every notification so forged calls can be ignored
+PRESENCE_CLIENT_STATE = os.getenv("PRESENCE_CLIENT_STATE") or uuid4().hex
+
+_cache = {}  # user_id -> (fetched_at, presence)
+_cache_lock = threading.Lock()
+_subscriptions = {}  # subscription_id -> user_ids
+_renewer = None
+
+def _compact_presence(presence: Dict) -> Dict:
+    return {
+        "user_id": presence.get("id"),
+        "availability": presence.get("availability"),
+        "activity": presence.get("activity")
+    }
+
+# ---------------------------------------------
+# Function: Presence for many users in few requests
+# ---------------------------------------------
+def get_presences(user_ids: List[str], max_age: Optional[int] = None) -> Dict[str, Dict]:
+    """
+    Return presence for many users, serving fresh entries from the TTL cache
+    and fetching the rest with communications/getPresencesByUserId (up to 650
+    users per request).
+
+    Args:
+        user_ids (List[str]): Azure AD user IDs.
+        max_age (int): Override the cache TTL in seconds (0 forces a refresh).
+
+    Returns:
+        dict: user_id -> {"user_id", "availability", "activity"}.
+    """
+    ttl = PRESENCE_TTL_SECONDS if max_age is None else max_age
+    now = time.time()
+    result, missing = {}, []
+
+    with _cache_lock:
+        for user_id in dict.fromkeys(user_ids):
+            cached = _cache.get(user_id)
+            if cached and now - cached[0] < ttl:
+                result[user_id] = cached[1]
+            else:
+                missing.append(user_id)
+
+    for start in range(0, len(missing), PRESENCE_BATCH_LIMIT):
+        chunk = missing[start:start + PRESENCE_BATCH_LIMIT]
+        response = graph_post("communications/getPresencesByUserId", {"ids": chunk})
+        if response.status_code != 200:
+            raise RuntimeError(f"Presence lookup failed. Status Code: {response.status_code} - {response.text}")
+
+        fetched_at = time.time()
+        with _cache_lock:
+            for presence in response.json().get("value", []):
+                compact = _compact_presence(presence)
+                _cache[compact["user_id"]] = (fetched_at, compact)
+                result[compact["user_id"]] = compact
+
+    return result
+
+def get_team_member_ids(team_id: str) -> List[str]:
+    """Return the user IDs of every member of a Team."""
+    return [
+        member["userId"]
+        for page in iter_graph_pages(f"teams/{team_id}/members")
+        for member in page.get("value", [])
+        if member.get("userId")
+    ]
+
+def invalidate(user_ids: List[str]):
+    """Drop cached presence so the next lookup refetches it."""
+    with _cache_lock:
+        for user_id in user_ids:
+            _cache.pop(user_id, None)
+
+# ---------------------------------------------
+# Subscriptions: keep watched users current via change notifications
+# ---------------------------------------------
+def _expiration() -> str:
+    expires = datetime.now(timezone.utc) + timedelta(minutes=PRESENCE_SUBSCRIPTION_MINUTES)
+    return expires.strftime("%Y-%m-%dT%H:%M:%S.0000000Z")
+
+def subscribe(user_ids: List[str]) -> List[str]:
+    """
+    Subscribe to presence changes for users so cached entries are refreshed
+    as soon as Graph notifies a change (instead of waiting for the TTL).
+
+    Requires PRESENCE_NOTIFICATION_URL. Subscriptions are renewed in the
+    background until the process exits.
+
+    Returns:
+        List[str]: IDs of the created subscriptions.
+    """
+    if not PRESENCE_NOTIFICATION_URL:
+        raise RuntimeError("PRESENCE_NOTIFICATION_URL is not configured.")
+
+    watched = {uid for ids in _subscriptions.values() for uid in ids}
+    new_ids = [uid for uid in dict.fromkeys(user_ids) if uid not in watched]
+    created = []
+
+    for start in range(0, len(new_ids), SUBSCRIPTION_FILTER_LIMIT):
+        chunk = new_ids[start:start + SUBSCRIPTION_FILTER_LIMIT]
+        id_list = ",".join(f"'{uid}'" for uid in chunk)
+        response = graph_post("subscriptions", {
+            "changeType": "updated",
+            "notificationUrl": PRESENCE_NOTIFICATION_URL,
+            "resource": f"/communications/presences?$filter=id in ({id_list})",
+            "expirationDateTime": _expiration(),
+            "clientState": PRESENCE_CLIENT_STATE
+        })
+        if response.status_code != 201:
+            raise RuntimeError(f"Presence subscription failed. Status Code: {response.status_code} - {response.text}")
+        subscription_id = response.json()["id"]
+        _subscriptions[subscription_id] = chunk
+        created.append(subscription_id)
+
+    _start_renewer()
+    return created
+
+def handle_notifications(notifications: List[Dict]) -> int:
+    """
+    Apply Graph change notifications by invalidating the affected users.
+
+    Returns:
+        int: Number of users invalidated.
+    """
+    changed = []
+    for notification in notifications:
+        if notification.get("clientState") != PRESENCE_CLIENT_STATE:
+            continue
+        if notification.get("subscriptionId") not in _subscriptions:
+            continue
+        match = re.search(r"presences\('([^']+)'\)", notification.get("resource", ""))
+        if match:
+            changed.append(match.group(1))
+    invalidate(changed)
+    return len(changed)
+
+def _start_renewer():
+    global _renewer
+    if _renewer and _renewer.is_alive():
+        return
+
+    def loop():
+        while _subscriptions:
+            time.sleep((PRESENCE_SUBSCRIPTION_MINUTES - 10) * 60)
+            for subscription_id in list(_subscriptions):
+                response = graph_patch(f"subscriptions/{subscription_id}", {"expirationDateTime": _expiration()})
+                if response.status_code != 200:
+                    print(f"❌ [DEBUG] Presence subscription renewal failed: {response.status_code} - {response.text}")
+                    _subscriptions.pop(subscription_id, None)
+
+    _renewer = threading.Thread(target=loop, name="presence-subscriptions", daemon=True)
+    _renewer.start()
@@ -1,7 +1,10 @@
 # presence_tools.py
 
 from graph_tools.graph_client import graph_get, graph_post
+from graph_tools.presence_service import get_presences, get_team_member_ids
 from langchain.tools import tool
+from collections import Counter
+from typing import List, Optional
 import os
 
 # ---------------------------------------------
@@ -55,10 +58,40 @@ def set_user_presence(activity: str, availability: str, expiration_minutes: int
     else:
         return f"❌ Failed to update presence. Status Code: {response.status_code} - {response.text}"
 
+# ----------------------------------------------------------
+# Tool: Presence for many users (or a whole Team) at once
+# ----------------------------------------------------------
+@tool
+def get_team_presence(user_ids: Optional[List[str]] = None, team_id: str = "") -> dict:
+    """
+    Check who is available right now for a list of users or every member of a Team.
+
+    Args:
+        user_ids (List[str], optional): Azure AD user IDs to check.
+        team_id (str): Optional Team ID; all of its members are checked.
+
+    Returns:
+        dict: Per-user availability/activity and a count per availability state.
+    """
+    ids = list(user_ids or [])
+    if team_id:
+        ids += get_team_member_ids(team_id)
+    if not ids:
+        return {"error": "Provide user_ids or a team_id."}
+
+    try:
+        presences = get_presences(ids)
+    except RuntimeError as e:
+        return {"error": f"❌ {e}"}
+
+    summary = Counter(p["availability"] for p in presences.values())
+    return {"presences": list(presences.values()), "summary": dict(summary)}
+
 # ------------------------------------------
 # Export presence tools for agent inclusion
 # ------------------------------------------
 tools = [
     get_user_presence,
-    set_user_presence
+    set_user_presence,
+    get_team_presence
 ]
@@ -0,0 +1,236 @@
+# teams_sync.py
+
+import os
+import time
+import threading
+from datetime import timezone
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+from graph_tools.local_db import open_db
+from graph_tools.pagination import iter_graph_pages
+from graph_tools.utils import safe_parse_datetime
+from graph_tools.tracing import in_context
+
+# ---------------------------------------------
+# Teams sync configuration
+# ---------------------------------------------
+TEAMS_CACHE_DB_PATH = os.getenv("TEAMS_CACHE_DB_PATH", "teams_cache.db")
+TEAMS_SYNC_MAX_WORKERS = 8
+TEAMS_SYNC_PAGE_SIZE = 50
+# Pages fetched the first time a chat is seen (older history is not backfilled)
+TEAMS_SYNC_BACKFILL_PAGES = 1
+# Seconds between background syncs; reads are served from the cache meanwhile
+TEAMS_SYNC_INTERVAL_SECONDS = int(os.getenv("TEAMS_SYNC_INTERVAL_SECONDS", "60"))
+ONE_ON_ONE_CHATS = "me/chats?$filter=chatType eq 'oneOnOne'&$expand=lastMessagePreview&$top=50"
+
+TEAMS_CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS chats (
+    chat_id TEXT PRIMARY KEY,
+    last_message_at TEXT,
+    high_water_mark TEXT,
+    synced_at REAL
+);
+CREATE TABLE IF NOT EXISTS messages (
+    chat_id TEXT NOT NULL,
+    message_id TEXT NOT NULL,
+    created_datetime TEXT NOT NULL,
+    from_user TEXT,
+    from_user_id TEXT,
+    message_content TEXT,
+    PRIMARY KEY (chat_id, message_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS messages_by_time ON messages (created_datetime DESC, message_id DESC);
+"""
+
+def _db():
+    return open_db(TEAMS_CACHE_DB_PATH, TEAMS_CACHE_SCHEMA)
+
+def normalize_timestamp(value: Optional[str]) -> Optional[str]:
+    """
+    Normalize a Graph timestamp to a fixed-width UTC string
+    ("YYYY-MM-DDTHH:MM:SS.ffffffZ") so timestamps compare correctly as text.
+    """
+    if not value:
+        return None
+    parsed = safe_parse_datetime(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+# ---------------------------------------------
+# Sync: fetch only messages newer than each chat's cursor
+# ---------------------------------------------
+def _fetch_new_messages(chat_id: str, high_water_mark: Optional[str]) -> Tuple[List[Dict], Optional[str]]:
+    """
+    Fetch messages modified after the chat's high-water mark.
+
+    Returns:
+        tuple: (compact message rows, new high-water mark)
+    """
+    endpoint = f"chats/{chat_id}/messages?$top={TEAMS_SYNC_PAGE_SIZE}&$orderby=lastModifiedDateTime desc"
+    if high_water_mark:
+        endpoint += f"&$filter=lastModifiedDateTime gt {high_water_mark}"
+
+    rows = []
+    new_mark = high_water_mark
+    for page_number, page in enumerate(iter_graph_pages(endpoint)):
+        if "error" in page:
+            raise RuntimeError(page["error"].get("message", "Graph error"))
+        for message in page.get('value', []):
+            modified = normalize_timestamp(message.get('lastModifiedDateTime') or message.get('createdDateTime'))
+            if modified and (not new_mark or modified > new_mark):
+                new_mark = modified
+            rows.append({
+                "chat_id": chat_id,
+                "message_id": message.get('id'),
+                "created_datetime": normalize_timestamp(message.get('createdDateTime')),
+                "from_user": ((message.get('from') or {}).get('user') or {}).get('displayName', ""),
+                "from_user_id": ((message.get('from') or {}).get('user') or {}).get('id', ""),
+                "message_content": (message.get('body') or {}).get('content', ""),
+                "deleted": bool(message.get('deletedDateTime'))
+            })
+        if not high_water_mark and page_number + 1 >= TEAMS_SYNC_BACKFILL_PAGES:
+            break
+
+    return rows, new_mark
+
+_sync_lock = threading.Lock()
+_refresher = None
+
+def sync_teams_messages(skip_inactive: bool = True) -> Dict:
+    """
+    Bring the local 1:1 chat message cache up to date.
+
+    Each chat keeps a high-water mark (latest lastModifiedDateTime seen), so
+    only newer messages are requested. With skip_inactive, chats whose
+    lastMessagePreview hasn't changed since the last sync are skipped without
+    any request. Chats are fetched concurrently.
+
+    Args:
+        skip_inactive (bool): Skip chats with no new activity.
+
+    Returns:
+        dict: Sync statistics (chats seen, chats fetched, messages stored).
+    """
+    # The background refresher and on-demand syncs never run at the same time
+    with _sync_lock:
+        return _sync(skip_inactive)
+
+def _sync(skip_inactive: bool) -> Dict:
+    with _db() as conn:
+        known = {row["chat_id"]: row for row in conn.execute("SELECT * FROM chats")}
+
+    to_fetch = []
+    previews = {}
+    chats_seen = 0
+
+    for page in iter_graph_pages(ONE_ON_ONE_CHATS):
+        for chat in page.get('value', []):
+            chat_id = chat.get('id')
+            if not chat_id:
+                continue
+            chats_seen += 1
+            preview_at = normalize_timestamp((chat.get('lastMessagePreview') or {}).get('createdDateTime'))
+            previews[chat_id] = preview_at
+
+            state = known.get(chat_id)
+            if skip_inactive and state and state["synced_at"] and preview_at and state["last_message_at"] == preview_at:
+                continue
+            to_fetch.append((chat_id, state["high_water_mark"] if state else None))
+
+    results = []
+    if to_fetch:
+        with ThreadPoolExecutor(max_workers=TEAMS_SYNC_MAX_WORKERS) as pool:
+            futures = [(chat_id, pool.submit(in_context(_fetch_new_messages), chat_id, mark)) for chat_id, mark in to_fetch]
+            for chat_id, future in futures:
+                try:
+                    results.append((chat_id, *future.result()))
+                except Exception as e:
+                    print(f"❌ [DEBUG] Teams sync failed for chat {chat_id}: {e}")
+
+    stored = 0
+    now = time.time()
+    with _db() as conn:
+        for chat_id, rows, new_mark in results:
+            live = [r for r in rows if not r["deleted"] and r["created_datetime"]]
+            conn.executemany(
+                "INSERT OR REPLACE INTO messages (chat_id, message_id, created_datetime, from_user, from_user_id, message_content) "
+                "VALUES (:chat_id, :message_id, :created_datetime, :from_user, :from_user_id, :message_content)",
+                live
+            )
+            conn.executemany(
+                "DELETE FROM messages WHERE chat_id = ? AND message_id = ?",
+                [(chat_id, r["message_id"]) for r in rows if r["deleted"]]
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO chats (chat_id, last_message_at, high_water_mark, synced_at) VALUES (?, ?, ?, ?)",
+                (chat_id, previews.get(chat_id), new_mark, now)
+            )
+            stored += len(live)
+
+    return {"chats_seen": chats_seen, "chats_fetched": len(results), "messages_stored": stored}
+
+def start_background_refresh(interval: int = TEAMS_SYNC_INTERVAL_SECONDS):
+    """Sync now and then every `interval` seconds in a daemon thread."""
+    global _refresher
+    if _refresher and _refresher.is_alive():
+        return
+
+    def loop():
+        while True:
+            try:
+                sync_teams_messages()
+            except Exception as e:
+                print(f"❌ [DEBUG] Teams message sync failed: {e}")
+            time.sleep(interval)
+
+    _refresher = threading.Thread(target=loop, name="teams-sync", daemon=True)
+    _refresher.start()
+
+# ---------------------------------------------
+# Query: read messages from the local cache
+# ---------------------------------------------
+def iter_cached_messages(
+    since: Optional[str] = None,
+    before: Optional[Tuple[str, str]] = None,
+    chat_id: Optional[str] = None,
+    batch_size: int = 200
+) -> Iterator[Dict]:
+    """
+    Yield cached messages newest first, reading the cache in small batches.
+
+    Args:
+        since (str): Only messages created after this ISO timestamp.
+        before (tuple): Keyset position (created_datetime, message_id) to resume after.
+        chat_id (str): Restrict to one chat.
+        batch_size (int): Rows read from SQLite per query.
+
+    Yields:
+        dict: Message in the /api/teams_messages shape.
+    """
+    since = normalize_timestamp(since)
+
+    while True:
+        clauses, params = [], []
+        if since:
+            clauses.append("created_datetime > ?")
+            params.append(since)
+        if before:
+            clauses.append("(created_datetime < ? OR (created_datetime = ? AND message_id < ?))")
+            params.extend([before[0], before[0], before[1]])
+        if chat_id:
+            clauses.append("chat_id = ?")
+            params.append(chat_id)
+
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with _db() as conn:
+            rows = conn.execute(
+                f"SELECT * FROM messages {where} ORDER BY created_datetime DESC, message_id DESC LIMIT ?",
+                (*params, batch_size)
+            ).fetchall()
+
+        for row in rows:
+            yield dict(row)
+        if len(rows) < batch_size:
+            return
+        before = (rows[-1]["created_datetime"], rows[-1]["message_id"])
@@ -1,7 +1,16 @@
 # teams_tools.py
 
 from graph_tools.graph_client import graph_get, graph_post
+from graph_tools.chat_cache import get_cached_chat_id, remember_chats, forget_chat
+from graph_tools.utils import RateLimiter
+from graph_tools.tracing import in_context
+from concurrent.futures import ThreadPoolExecutor
 from langchain.tools import tool
+from typing import List
+
+# Broadcast fan-out limits (Teams throttles chat message posts per user)
+BROADCAST_MAX_WORKERS = 8
+broadcast_rate_limiter = RateLimiter(rate=5)
 
 # --------------------------------------------------
 # Tool: List all Teams the user has joined
@@ -42,21 +51,17 @@ def join_team(join_code: str) -> str:
         return f"❌ Failed to join team. Status Code: {response.status_code} - {response.text}"
 
 # --------------------------------------------------
-# Tool: Send a private 1:1 message to a user via chat
+# Helper: Resolve (or create) the 1:1 chat with a user
 # --------------------------------------------------
-@tool
-def send_private_message_to_user(user_id: str, message: str) -> str:
+def _get_or_create_chat_id(user_id: str):
     """
-    Send a direct (1:1) message to a Microsoft Teams user.
-
-    Args:
-        user_id (str): User ID of the recipient.
-        message (str): Message text content.
-
-    Returns:
-        str: Status message indicating result.
+    Return (chat_id, error). Known chats come from the chat cache; otherwise
+    the oneOnOne chat is created (or looked up) once and remembered.
     """
-    # Step 1: Create 1:1 chat if not already exists
+    chat_id = get_cached_chat_id(user_id)
+    if chat_id:
+        return chat_id, None
+
     payload_create_chat = {
         "chatType": "oneOnOne",
         "members": [
@@ -71,13 +76,21 @@ def send_private_message_to_user(user_id: str, message: str) -> str:
     create_chat_response = graph_post("chats", payload_create_chat)
 
     if create_chat_response.status_code not in (200, 201):
-        return f"❌ Failed to create chat: {create_chat_response.text}"
+        return None, f"❌ Failed to create chat: {create_chat_response.text}"
 
     chat_id = create_chat_response.json().get("id")
     if not chat_id:
-        return "❌ Chat ID not found after creation."
+        return None, "❌ Chat ID not found after creation."
+
+    remember_chats({user_id: chat_id})
+    return chat_id, None
+
+def _send_private_message(user_id: str, message: str) -> str:
+    """Send one 1:1 message, skipping chat creation when the chat is cached."""
+    chat_id, error = _get_or_create_chat_id(user_id)
+    if error:
+        return error
 
-    # Step 2: Send message to the chat
     payload_send_message = {
         "body": {
             "content": message
@@ -86,16 +99,68 @@ def send_private_message_to_user(user_id: str, message: str) -> str:
 
     send_message_response = graph_post(f"chats/{chat_id}/messages", payload_send_message)
 
+    # A cached chat that no longer exists: forget it and go through creation once
+    if send_message_response.status_code in (403, 404) and get_cached_chat_id(user_id) == chat_id:
+        forget_chat(user_id)
+        chat_id, error = _get_or_create_chat_id(user_id)
+        if error:
+            return error
+        send_message_response = graph_post(f"chats/{chat_id}/messages", payload_send_message)
+
     if send_message_response.status_code == 201:
         return "✅ Private message sent successfully!"
     else:
         return f"❌ Failed to send private message. Status Code: {send_message_response.status_code} - {send_message_response.text}"
 
+# --------------------------------------------------
+# Tool: Send a private 1:1 message to a user via chat
+# --------------------------------------------------
+@tool
+def send_private_message_to_user(user_id: str, message: str) -> str:
+    """
+    Send a direct (1:1) message to a Microsoft Teams user.
+
+    Args:
+        user_id (str): User ID of the recipient.
+        message (str): Message text content.
+
+    Returns:
+        str: Status message indicating result.
+    """
+    return _send_private_message(user_id, message)
+
+# --------------------------------------------------
+# Tool: Send the same 1:1 message to many users
+# --------------------------------------------------
+@tool
+def broadcast_private_message(user_ids: List[str], message: str) -> dict:
+    """
+    Send the same direct (1:1) message to several Microsoft Teams users at once.
+
+    Args:
+        user_ids (List[str]): User IDs of the recipients.
+        message (str): Message text content.
+
+    Returns:
+        dict: Per-user status messages and counts of sent / failed.
+    """
+    def send(user_id):
+        broadcast_rate_limiter.acquire()
+        return _send_private_message(user_id, message)
+
+    unique_ids = list(dict.fromkeys(user_ids))
+    with ThreadPoolExecutor(max_workers=BROADCAST_MAX_WORKERS) as pool:
+        statuses = dict(zip(unique_ids, pool.map(in_context(send), unique_ids)))
+
+    sent = sum(1 for status in statuses.values() if status.startswith("✅"))
+    return {"results": statuses, "sent": sent, "failed": len(statuses) - sent}
+
 # --------------------------------------------------
 # Export tools for use in agent or UI integration
 # --------------------------------------------------
 tools = [
     list_joined_teams,
     join_team,
-    send_private_message_to_user
+    send_private_message_to_user,
+    broadcast_private_message
 ]
@@ -0,0 +1,288 @@
+# tracing.py
+
+import os
+import json
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from typing import Callable, Dict, Iterator, List, Optional
+
+# ---------------------------------------------
+# Exporter configuration
+# ---------------------------------------------
+# Finished spans are appended here, one JSON object per line ("" disables the file)
+TRACE_FILE_PATH = os.getenv("TRACE_FILE_PATH", "traces.jsonl")
+# The file is rotated to "<path>.1", "<path>.2", ... at this size; older files are deleted
+TRACE_FILE_MAX_BYTES = int(os.getenv("TRACE_FILE_MAX_BYTES", str(20 * 1024 * 1024)))
+TRACE_FILE_BACKUPS = int(os.getenv("TRACE_FILE_BACKUPS", "2"))
+# Recent traces kept in memory for /debug/traces
+TRACE_MAX_TRACES = int(os.getenv("TRACE_MAX_TRACES", "200"))
+MAX_ATTRIBUTE_LENGTH = 300
+
+# ---------------------------------------------
+# Spans
+# ---------------------------------------------
+class Span:
+    """One timed operation in a trace (a stage, LLM call, tool call or HTTP call)."""
+
+    def __init__(self, trace_id: str, name: str, kind: str, parent_id: Optional[str], attributes: Dict):
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.attributes = {}
+        self.start = time.time()
+        self._started = time.perf_counter()
+        self.duration_ms = None
+        self.status = "ok"
+        self.set(**attributes)
+
+    def set(self, **attributes):
+        """Add attributes; long values are truncated."""
+        for key, value in attributes.items():
+            if value is not None and not isinstance(value, (int, float, bool)):
+                value = str(value)[:MAX_ATTRIBUTE_LENGTH]
+            self.attributes[key] = value
+        return self
+
+    def end(self, error: Optional[BaseException] = None):
+        if self.duration_ms is not None:
+            return
+        self.duration_ms = round((time.perf_counter() - self._started) * 1000, 2)
+        if error is not None:
+            self.status = "error"
+            self.attributes["error"] = f"{type(error).__name__}: {error}"[:MAX_ATTRIBUTE_LENGTH]
+        _exporter.export(self)
+
+    def to_dict(self) -> Dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start": self.start,
+            "duration_ms": self.duration_ms,
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+# Current trace and span of this context. Copied into asyncio tasks
+# automatically; use in_context() when handing work to threads.
+_current_trace: ContextVar[Optional[str]] = ContextVar("trace_id", default=None)
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+# The running stage span of a turn (see enter_stage)
+_current_stage: ContextVar[Optional[tuple]] = ContextVar("current_stage", default=None)
+
+def current_trace_id() -> Optional[str]:
+    return _current_trace.get()
+
+def start_span(name: str, kind: str = "internal", **attributes) -> Optional[Span]:
+    """
+    Start a span under the current one without making it current (for
+    operations that end in a callback). Returns None outside a trace.
+    """
+    trace_id = _current_trace.get()
+    if trace_id is None:
+        return None
+    parent = _current_span.get()
+    return Span(trace_id, name, kind, parent.span_id if parent else None, attributes)
+
+class _NoSpan:
+    """Stands in for a span outside a trace, so callers can always call set()."""
+
+    def set(self, **attributes):
+        return self
+
+@contextmanager
+def span(name: str, kind: str = "internal", **attributes) -> Iterator:
+    """Time the block as a span, current for everything it calls."""
+    new_span = start_span(name, kind, **attributes)
+    if new_span is None:
+        yield _NoSpan()
+        return
+    token = _current_span.set(new_span)
+    try:
+        yield new_span
+    except BaseException as e:
+        new_span.end(error=e)
+        raise
+    finally:
+        _current_span.reset(token)
+        new_span.end()
+
+@contextmanager
+def trace(name: str, trace_id: Optional[str] = None, **attributes) -> Iterator:
+    """Start a new trace whose root span covers the block."""
+    trace_token = _current_trace.set(trace_id or uuid.uuid4().hex)
+    stage_token = _current_stage.set(None)
+    try:
+        with span(name, kind="request", **attributes) as root:
+            yield root
+    finally:
+        _current_stage.reset(stage_token)
+        _current_trace.reset(trace_token)
+
+def enter_stage(name: str, **attributes):
+    """
+    End the running stage span (if any) and start `name` as the current
+    stage, for code that moves through stages without nesting blocks.
+    """
+    end_stage()
+    new_span = start_span(name, kind="stage", **attributes)
+    if new_span is not None:
+        _current_stage.set((new_span, _current_span.set(new_span)))
+
+def annotate(**attributes):
+    """Add attributes to the current span (no-op outside a trace)."""
+    current = _current_span.get()
+    if current is not None:
+        current.set(**attributes)
+
+def end_stage(error: Optional[BaseException] = None):
+    """End the running stage span, restoring its parent as current."""
+    stage = _current_stage.get()
+    if stage:
+        stage_span, token = stage
+        _current_span.reset(token)
+        _current_stage.set(None)
+        stage_span.end(error=error)
+
+def in_context(fn: Callable) -> Callable:
+    """
+    Wrap `fn` to run in (a copy of) the caller's context, so spans started
+    in worker threads join the caller's trace.
+    """
+    context = copy_context()
+
+    def run(*args, **kwargs):
+        return context.copy().run(fn, *args, **kwargs)
+    return run
+
+# ---------------------------------------------
+# Exporter: JSON lines file + recent traces in memory
+# ---------------------------------------------
+class TraceExporter:
+    def __init__(
+        self,
+        path: str = TRACE_FILE_PATH,
+        max_traces: int = TRACE_MAX_TRACES,
+        max_bytes: int = TRACE_FILE_MAX_BYTES,
+        backups: int = TRACE_FILE_BACKUPS
+    ):
+        self.path = path
+        self.max_traces = max_traces
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._traces = OrderedDict()  # trace_id -> [span dicts]
+        self._lock = threading.Lock()
+        self._file = None
+
+    def export(self, finished: Span):
+        record = finished.to_dict()
+        with self._lock:
+            self._traces.setdefault(finished.trace_id, []).append(record)
+            self._traces.move_to_end(finished.trace_id)
+            while len(self._traces) > self.max_traces:
+                self._traces.popitem(last=False)
+            if self.path:
+                try:
+                    if self._file is None:
+                        self._file = open(self.path, "a", encoding="utf-8")
+                    self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    self._file.flush()
+                    # In append mode tell() is the file's size, other workers' spans included
+                    if self.max_bytes and self._file.tell() >= self.max_bytes:
+                        self._rotate()
+                except OSError as e:
+                    print(f"❌ [DEBUG] Could not write trace span: {e}")
+
+    def _rotate(self):
+        """Shift <path> to <path>.1 (and so on), unless another worker already did."""
+        try:
+            rotated = os.stat(self.path).st_ino != os.fstat(self._file.fileno()).st_ino
+        except FileNotFoundError:
+            rotated = True
+        self._file.close()
+        self._file = None
+        if rotated:
+            return
+        if self.backups < 1:
+            os.remove(self.path)
+            return
+        for number in range(self.backups, 1, -1):
+            if os.path.exists(f"{self.path}.{number - 1}"):
+                os.replace(f"{self.path}.{number - 1}", f"{self.path}.{number}")
+        os.replace(self.path, f"{self.path}.1")
+
+    def spans(self, trace_id: str) -> List[Dict]:
+        """
+        Spans of a trace, from memory or (for older traces and other workers)
+        the trace files, newest first. Rotation bounds each file, and the scan
+        stops at the first file holding the trace.
+        """
+        with self._lock:
+            spans = list(self._traces.get(trace_id, []))
+        if spans or not self.path:
+            return spans
+        for path in [self.path] + [f"{self.path}.{number}" for number in range(1, self.backups + 1)]:
+            try:
+                with open(path, encoding="utf-8") as f:
+                    for line in f:
+                        if trace_id in line:
+                            record = json.loads(line)
+                            if record["trace_id"] == trace_id:
+                                spans.append(record)
+            except FileNotFoundError:
+                continue
+            if spans:
+                break
+        return spans
+
+    def recent(self, limit: int = 50) -> List[Dict]:
+        """Root span of the most recent traces, newest first."""
+        with self._lock:
+            trace_ids = list(self._traces)[-limit:]
+            traces = [(trace_id, self._traces[trace_id]) for trace_id in reversed(trace_ids)]
+        summaries = []
+        for trace_id, spans in traces:
+            root = next((s for s in spans if s["parent_id"] is None), None)
+            summaries.append({
+                "trace_id": trace_id,
+                "name": root["name"] if root else None,
+                "start": min(s["start"] for s in spans),
+                "duration_ms": root["duration_ms"] if root else None,
+                "spans": len(spans),
+            })
+        return summaries
+
+_exporter = TraceExporter()
+
+def get_trace(trace_id: str) -> Optional[Dict]:
+    """
+    A trace as a span tree (children ordered by start time) plus time spent
+    per span kind.
+    """
+    spans = _exporter.spans(trace_id)
+    if not spans:
+        return None
+
+    nodes = {s["span_id"]: dict(s, offset_ms=0.0, children=[]) for s in spans}
+    started = min(s["start"] for s in spans)
+    roots = []
+    for node in sorted(nodes.values(), key=lambda n: n["start"]):
+        node["offset_ms"] = round((node["start"] - started) * 1000, 2)
+        parent = nodes.get(node["parent_id"])
+        (parent["children"] if parent else roots).append(node)
+
+    by_kind = {}
+    for s in spans:
+        by_kind[s["kind"]] = round(by_kind.get(s["kind"], 0) + (s["duration_ms"] or 0), 2)
+    return {"trace_id": trace_id, "spans": len(spans), "time_by_kind_ms": by_kind, "tree": roots}
+
+def recent_traces(limit: int = 50) -> List[Dict]:
+    return _exporter.recent(limit)
@@ -0,0 +1,243 @@
+# user_directory.py
+
+import os
+import re
+import time
+import threading
+from typing import Dict, List, Optional
+from graph_tools.graph_client import graph_get
+from graph_tools.local_db import open_db
+
+# ---------------------------------------------
+# Directory configuration
+# ---------------------------------------------
+USER_DIRECTORY_DB_PATH = os.getenv("USER_DIRECTORY_DB_PATH", "user_directory.db")
+USER_FIELDS = {
+    "displayName": "display_name",
+    "userPrincipalName": "upn",
+    "mail": "mail",
+    "department": "department",
+    "jobTitle": "job_title",
+    "officeLocation": "office",
+    "accountEnabled": "account_enabled",
+}
+# Columns returned to callers (row_id is internal to the search index)
+USER_COLUMNS = ", ".join(["id", *USER_FIELDS.values()])
+USERS_DELTA_ENDPOINT = f"users/delta?$select=id,{','.join(USER_FIELDS)}"
+REFRESH_INTERVAL_SECONDS = 900
+# Graph error codes meaning the stored deltaLink can't be resumed (410 Gone)
+RESYNC_ERRORS = {"resyncRequired", "syncStateNotFound", "syncStateInvalid"}
+
+# The search index is an external-content FTS table over directory_users,
+# keyed by its integer row_id and kept in step by triggers, so updates and
+# deletes touch one index row instead of scanning it.
+USER_DIRECTORY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS directory_users (
+    row_id INTEGER PRIMARY KEY,
+    id TEXT NOT NULL UNIQUE,
+    display_name TEXT,
+    upn TEXT,
+    mail TEXT,
+    department TEXT,
+    job_title TEXT,
+    office TEXT,
+    account_enabled INTEGER
+);
+CREATE INDEX IF NOT EXISTS directory_users_upn ON directory_users (upn COLLATE NOCASE);
+CREATE VIRTUAL TABLE IF NOT EXISTS directory_users_fts USING fts5(
+    display_name, upn, mail, department, job_title,
+    content = 'directory_users', content_rowid = 'row_id',
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS directory_users_ai AFTER INSERT ON directory_users BEGIN
+    INSERT INTO directory_users_fts (rowid, display_name, upn, mail, department, job_title)
+    VALUES (new.row_id, new.display_name, new.upn, new.mail, new.department, new.job_title);
+END;
+CREATE TRIGGER IF NOT EXISTS directory_users_ad AFTER DELETE ON directory_users BEGIN
+    INSERT INTO directory_users_fts (directory_users_fts, rowid, display_name, upn, mail, department, job_title)
+    VALUES ('delete', old.row_id, old.display_name, old.upn, old.mail, old.department, old.job_title);
+END;
+CREATE TRIGGER IF NOT EXISTS directory_users_au AFTER UPDATE ON directory_users BEGIN
+    INSERT INTO directory_users_fts (directory_users_fts, rowid, display_name, upn, mail, department, job_title)
+    VALUES ('delete', old.row_id, old.display_name, old.upn, old.mail, old.department, old.job_title);
+    INSERT INTO directory_users_fts (rowid, display_name, upn, mail, department, job_title)
+    VALUES (new.row_id, new.display_name, new.upn, new.mail, new.department, new.job_title);
+END;
+CREATE TABLE IF NOT EXISTS sync_state (
+    name TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+_sync_lock = threading.Lock()
+_refresher = None
+
+def _db():
+    return open_db(USER_DIRECTORY_DB_PATH, USER_DIRECTORY_SCHEMA)
+
+# ---------------------------------------------
+# Sync: users/delta with a stored deltaLink
+# ---------------------------------------------
+def _apply_page(conn, items: List[Dict]):
+    """Merge one delta page into the users table and its search index."""
+    removed = [item["id"] for item in items if "@removed" in item]
+    changed = [item for item in items if "@removed" not in item]
+
+    ids = [item["id"] for item in changed]
+    existing = {}
+    if ids:
+        placeholders = ",".join("?" * len(ids))
+        existing = {row["id"]: dict(row) for row in conn.execute(f"SELECT * FROM directory_users WHERE id IN ({placeholders})", ids)}
+
+    rows = []
+    for item in changed:
+        # Delta pages only carry the properties that changed, so merge onto what we have
+        row = existing.get(item["id"], {"id": item["id"]})
+        for graph_field, column in USER_FIELDS.items():
+            if graph_field in item:
+                row[column] = item[graph_field]
+        rows.append({column: row.get(column) for column in ["id", *USER_FIELDS.values()]})
+
+    # The triggers update the search index; an upsert keeps the row_id it is keyed on
+    conn.executemany("DELETE FROM directory_users WHERE id = ?", [(i,) for i in removed])
+    conn.executemany(
+        "INSERT INTO directory_users (id, display_name, upn, mail, department, job_title, office, account_enabled) "
+        "VALUES (:id, :display_name, :upn, :mail, :department, :job_title, :office, :account_enabled) "
+        "ON CONFLICT (id) DO UPDATE SET display_name = excluded.display_name, upn = excluded.upn, "
+        "mail = excluded.mail, department = excluded.department, job_title = excluded.job_title, "
+        "office = excluded.office, account_enabled = excluded.account_enabled",
+        rows
+    )
+
+def sync_user_directory() -> Dict:
+    """
+    Bring the local directory up to date through users/delta.
+
+    The first run walks every page of the tenant; later runs resume from the
+    stored deltaLink and only receive users that changed. If Graph no longer
+    accepts that link (expired sync state), the cache is cleared and
+    rebuilt with a full sync.
+
+    Returns:
+        dict: Number of changes applied and total users cached.
+    """
+    with _sync_lock:
+        with _db() as conn:
+            state = conn.execute("SELECT value FROM sync_state WHERE name = 'users_delta_link'").fetchone()
+        next_url = state["value"] if state else USERS_DELTA_ENDPOINT
+        full_sync = state is None
+        changes = 0
+
+        while next_url:
+            page = graph_get(next_url)
+            if "error" in page:
+                if page["error"].get("code") in RESYNC_ERRORS and not full_sync:
+                    print(f"❌ [DEBUG] User directory deltaLink expired ({page['error']['code']}), running a full sync")
+                    with _db() as conn:
+                        # A full sync doesn't report deletions, so start from an empty cache
+                        conn.execute("DELETE FROM directory_users")
+                        conn.execute("DELETE FROM sync_state WHERE name = 'users_delta_link'")
+                    next_url, full_sync, changes = USERS_DELTA_ENDPOINT, True, 0
+                    continue
+                raise RuntimeError(page["error"].get("message", "Graph error"))
+
+            items = page.get('value', [])
+            delta_link = page.get("@odata.deltaLink")
+            with _db() as conn:
+                _apply_page(conn, items)
+                if delta_link:
+                    conn.execute("INSERT OR REPLACE INTO sync_state (name, value) VALUES ('users_delta_link', ?)", (delta_link,))
+            changes += len(items)
+            next_url = page.get("@odata.nextLink")
+
+        with _db() as conn:
+            total = conn.execute("SELECT COUNT(*) FROM directory_users").fetchone()[0]
+            conn.execute("INSERT OR REPLACE INTO sync_state (name, value) VALUES ('users_synced_at', ?)", (str(time.time()),))
+
+    return {"changes": changes, "user_count": total}
+
+def ensure_synced():
+    """Run the initial sync if the directory has never been synced."""
+    with _db() as conn:
+        synced = conn.execute("SELECT 1 FROM sync_state WHERE name = 'users_synced_at'").fetchone()
+    if not synced:
+        sync_user_directory()
+
+def start_background_refresh(interval: int = REFRESH_INTERVAL_SECONDS):
+    """Sync now and then every `interval` seconds in a daemon thread."""
+    global _refresher
+    if _refresher and _refresher.is_alive():
+        return
+
+    def loop():
+        while True:
+            try:
+                sync_user_directory()
+            except Exception as e:
+                print(f"❌ [DEBUG] User directory sync failed: {e}")
+            time.sleep(interval)
+
+    _refresher = threading.Thread(target=loop, name="user-directory", daemon=True)
+    _refresher.start()
+
+# ---------------------------------------------
+# Query: top-k search and filtered listing
+# ---------------------------------------------
+def _compact(row) -> Dict:
+    """Drop empty fields so results stay small in agent prompts."""
+    return {key: value for key, value in dict(row).items() if value}
+
+def search_users(query: str, top_k: int = 5) -> List[Dict]:
+    """
+    Search cached users by name, UPN/mail, department or job title.
+
+    Every word must prefix-match some field; results are ranked by relevance.
+
+    Args:
+        query (str): e.g. "priya finance" or "alex@contoso".
+        top_k (int): Maximum number of users to return.
+
+    Returns:
+        List[dict]: Compact user records.
+    """
+    ensure_synced()
+    words = re.findall(r"\w+", query)
+    if not words:
+        return []
+
+    match = " AND ".join(f'"{word}"*' for word in words)
+    with _db() as conn:
+        rows = conn.execute(
+            "SELECT u.id, u.display_name, u.upn, u.mail, u.department, u.job_title, u.office, u.account_enabled "
+            "FROM directory_users_fts f JOIN directory_users u ON u.row_id = f.rowid "
+            "WHERE directory_users_fts MATCH ? ORDER BY bm25(directory_users_fts) LIMIT ?",
+            (match, top_k)
+        ).fetchall()
+    return [_compact(row) for row in rows]
+
+def find_user(upn_or_mail: str) -> Optional[Dict]:
+    """Return the cached user whose UPN or mail matches (case-insensitive), or None."""
+    ensure_synced()
+    with _db() as conn:
+        row = conn.execute(
+            f"SELECT {USER_COLUMNS} FROM directory_users WHERE upn = ? COLLATE NOCASE OR mail = ? COLLATE NOCASE LIMIT 1",
+            (upn_or_mail, upn_or_mail)
+        ).fetchone()
+    return dict(row) if row else None
+
+def list_users(department: Optional[str] = None, limit: int = 25, offset: int = 0) -> Dict:
+    """
+    List cached users, optionally filtered by department.
+
+    Returns:
+        dict: Compact users and the total number matching.
+    """
+    ensure_synced()
+    where, params = ("WHERE department = ? COLLATE NOCASE", [department]) if department else ("", [])
+    with _db() as conn:
+        total = conn.execute(f"SELECT COUNT(*) FROM directory_users {where}", params).fetchone()[0]
+        rows = conn.execute(
+            f"SELECT {USER_COLUMNS} FROM directory_users {where} ORDER BY display_name LIMIT ? OFFSET ?",
+            (*params, limit, offset)
+        ).fetchall()
+    return {"users": [_compact(row) for row in rows], "total": total}
@@ -1,6 +1,7 @@
 # user_management_tools.py
 
 from graph_tools.graph_client import graph_get, graph_post, graph_patch, graph_delete
+from graph_tools.user_directory import list_users, search_users
 from langchain.tools import tool
 
 # ------------------------------------------------------
@@ -20,14 +21,39 @@ def get_signed_in_user_profile() -> dict:
 # Tool: List all users in the organization directory
 # ------------------------------------------------------
 @tool
-def list_all_users() -> dict:
+def list_all_users(department: str = "", limit: int = 25, offset: int = 0) -> dict:
     """
-    List all users in the Microsoft 365 organization.
+    List users in the Microsoft 365 organization (compact fields only).
+
+    Served from the local directory cache, which syncs every user via
+    users/delta. Use search_directory_users to find specific people.
+
+    Args:
+        department (str): Optional department filter.
+        limit (int): Page size (default 25).
+        offset (int): Number of users to skip.
+
+    Returns:
+        dict: Users (id, name, UPN, mail, department, job title, office) and total count.
+    """
+    return list_users(department or None, limit, offset)
+
+# ------------------------------------------------------
+# Tool: Search the organization directory
+# ------------------------------------------------------
+@tool
+def search_directory_users(query: str, top_k: int = 5) -> dict:
+    """
+    Find users in the organization by name, email/UPN, department or job title.
+
+    Args:
+        query (str): Search words, e.g. "priya", "finance manager", "alex@contoso.com".
+        top_k (int): Maximum number of matches (default 5).
 
     Returns:
-        dict: A list of user profiles.
+        dict: Best matching users with id, name, UPN, mail, department and job title.
     """
-    return graph_get("users")
+    return {"users": search_users(query, top_k)}
 
 # ------------------------------------------------------
 # Tool: Create a new user in the Microsoft tenant
@@ -105,6 +131,7 @@ def delete_user(user_id: str) -> str:
 tools = [
     get_signed_in_user_profile,
     list_all_users,
+    search_directory_users,
     create_new_user,
     update_user_display_name,
     delete_user
@@ -1,5 +1,7 @@
 # utils.py
 
+import time
+import threading
 from datetime import datetime
 
 def safe_parse_datetime(date_str: str) -> datetime:
@@ -21,3 +23,25 @@ def safe_parse_datetime(date_str: str) -> datetime:
         date_str = f"{date_part}.{fractional}"
     
     return datetime.fromisoformat(date_str)
+
+
+class RateLimiter:
+    """
+    Thread-safe limiter that spaces calls to at most `rate` per second.
+
+    Used to keep concurrent Graph fan-outs under service throttling limits.
+    """
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until the caller may make its next call."""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(self._next_slot, now)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
@@ -0,0 +1,197 @@
+# intent_router.py
+
+import re
+import time
+import threading
+from typing import Dict, List, Optional
+
+from models import AgentResult
+from llm_observer import interpret_tool_output
+
+# ---------------------------------------------
+# Read-only intents that can skip the LLM entirely
+# ---------------------------------------------
+# Checked in order, so more specific intents come first. "domain" groups
+# intents that touch the same data; a request matching two domains
+# ("emails about my meetings") is ambiguous and goes to the agent.
+READ_INTENTS = [
+    {"intent": "tasks_today", "domain": "tasks", "tool": "list_tasks_today_tool",
+     "pattern": r"\b(tasks?|to-?dos?)\b.*\b(today|due)\b|\b(today'?s|due today)\b.*\b(tasks?|to-?dos?)\b"},
+    {"intent": "tasks", "domain": "tasks", "tool": "list_all_tasks_tool",
+     "pattern": r"\b(tasks?|to-?dos?)\b"},
+    {"intent": "events", "domain": "calendar", "tool": "get_events",
+     "pattern": r"\b(calendar|events?|meetings?|agenda|appointments?)\b"},
+    {"intent": "emails", "domain": "email", "tool": "list_emails",
+     "pattern": r"\b(inbox|e-?mails?|mails?)\b"},
+    {"intent": "presence", "domain": "presence", "tool": "get_user_presence",
+     "pattern": r"\bmy (presence|status|availability)\b"},
+    {"intent": "teams", "domain": "teams", "tool": "list_joined_teams",
+     "pattern": r"\b(my|joined) teams\b|\bteams (i'?m|i am) (in|a member of)\b"},
+    {"intent": "profile", "domain": "profile", "tool": "get_signed_in_user_profile",
+     "pattern": r"\bmy (user )?profile\b|\bwho am i\b"},
+    {"intent": "contacts", "domain": "contacts", "tool": "get_user_contacts",
+     "pattern": r"\bmy contacts\b|\bcontact list\b|\b(list|show)( all)? contacts\b"},
+]
+
+# Lightweight classifier cues: a fast path needs a read cue and no write cue
+READ_CUES = re.compile(
+    r"^\s*(show|list|what|what's|whats|which|who|get|display|see|view|check|any|give me|tell me|do i have|how many|fetch)\b"
+    r"|\?\s*$",
+    re.IGNORECASE
+)
+WRITE_CUES = re.compile(
+    r"\b(add|create|send|schedule|book|set|delete|remove|cancel|update|change|edit|move|reschedule|"
+    r"join|invite|reply|forward|mark|complete|finish|write|draft|remind|message|assign|rename)\b",
+    re.IGNORECASE
+)
+# Anything that narrows a read ("from Alex", "unread", "next Friday", a name) needs
+# the agent to filter: the fast-path tools only list everything
+QUALIFIERS = re.compile(
+    r"\b(from|with|for|about|regarding|by|since|before|after|between|containing|titled|named|called|except|without|"
+    r"unread|flagged|important|urgent|starred|attachments?|overdue|completed|done|pending|priority)\b"
+    r"|\b(today|tonight|tomorrow|yesterday|weekend|(this|next|last|past|coming) (week|month|year)|"
+    r"(mon|tues|wednes|thurs|fri|satur|sun)day|january|february|march|april|june|july|august|september|october|november|december)\b"
+    r"|\d",
+    re.IGNORECASE
+)
+EMAIL_COUNT = re.compile(r"\b(?:last|latest|recent|top|first)?\s*(\d{1,2})\s+(?:e-?mails?|mails?|messages)\b", re.IGNORECASE)
+# "today" is the whole point of tasks_today; a count is the whole point of "last 5 emails"
+ROUTE_WORDS = {
+    "tasks_today": re.compile(r"\b(today'?s?|due)\b", re.IGNORECASE),
+    "emails": EMAIL_COUNT,
+}
+# Capitalized words that aren't names of people or projects
+NOT_A_NAME = {"i", "i'm", "i've", "teams", "microsoft", "outlook", "to-do", "todo"}
+
+# Estimated LLM round trips of the full chain for a read: polish + agent tool call + agent answer
+LLM_CALLS_PER_FULL_TURN = 3
+
+# ---------------------------------------------
+# Turn and latency accounting
+# ---------------------------------------------
+class RoutingStats:
+    """Per-intent fast-path counters, compared against full-chain latency."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.fast = {}  # intent -> {"turns", "seconds"}
+        self.full_turns = 0
+        self.full_seconds = 0.0
+
+    def record_fast(self, intent: str, seconds: float):
+        with self._lock:
+            entry = self.fast.setdefault(intent, {"turns": 0, "seconds": 0.0})
+            entry["turns"] += 1
+            entry["seconds"] += seconds
+
+    def record_full(self, seconds: float):
+        with self._lock:
+            self.full_turns += 1
+            self.full_seconds += seconds
+
+    def report(self) -> Dict:
+        """Turns, average latency and estimated latency saved per intent."""
+        with self._lock:
+            full_avg = self.full_seconds / self.full_turns if self.full_turns else None
+            intents = {}
+            for intent, entry in self.fast.items():
+                fast_avg = entry["seconds"] / entry["turns"]
+                intents[intent] = {
+                    "turns": entry["turns"],
+                    "avg_ms": round(fast_avg * 1000, 1),
+                    "llm_calls_saved": entry["turns"] * LLM_CALLS_PER_FULL_TURN,
+                    "latency_saved_ms": round((full_avg - fast_avg) * entry["turns"] * 1000, 1) if full_avg else None
+                }
+            return {
+                "fast_path": intents,
+                "full_chain": {
+                    "turns": self.full_turns,
+                    "avg_ms": round(full_avg * 1000, 1) if full_avg else None
+                }
+            }
+
+# ---------------------------------------------
+# Router
+# ---------------------------------------------
+class IntentRouter:
+    """
+    Sends clear read-only requests straight to their tool, skipping the
+    polish LLM call, the agent loop and the observer.
+
+    Built from the agent's tools and the `context` behavior rules: any tool
+    named in a context rule needs the full chain (confirmation, missing time),
+    so it is never fast-pathed. `has_time` comes from contains_time(); reads
+    scoped to a time like "tomorrow" need the agent to filter results.
+    """
+
+    def __init__(self, tools: List, context: Dict):
+        write_tools = {name.strip() for rule in context.values() for name in rule["tool"].split(",")}
+        tools_by_name = {t.name: t for t in tools}
+        self.routes = [
+            dict(route, pattern=re.compile(route["pattern"], re.IGNORECASE), tool=tools_by_name[route["tool"]])
+            for route in READ_INTENTS
+            if route["tool"] in tools_by_name and route["tool"] not in write_tools
+        ]
+        self.stats = RoutingStats()
+
+    def classify(self, text: str, has_time: bool = False) -> Optional[Dict]:
+        """Return the matching read-only route, or None when the agent should decide."""
+        if not READ_CUES.search(text) or WRITE_CUES.search(text):
+            return None
+
+        matches = [route for route in self.routes if route["pattern"].search(text)]
+        if not matches or len({route["domain"] for route in matches}) > 1:
+            return None
+
+        route = matches[0]
+        if has_time and route["intent"] != "tasks_today":
+            return None
+        if self._qualified(route, text):
+            return None
+        return route
+
+    @staticmethod
+    def _qualified(route: Dict, text: str) -> bool:
+        """True when the request narrows the read beyond the route's own keyword."""
+        if route["intent"] in ROUTE_WORDS:
+            text = ROUTE_WORDS[route["intent"]].sub(" ", text)
+        if QUALIFIERS.search(text):
+            return True
+        # A capitalized word after the first one is most likely a person or project
+        words = re.findall(r"[\w'-]+", text)[1:]
+        return any(word[0].isupper() and word.lower() not in NOT_A_NAME for word in words)
+
+    @staticmethod
+    def _arguments(route: Dict, text: str) -> Dict:
+        if route["intent"] == "emails":
+            count = EMAIL_COUNT.search(text)
+            return {"max_results": int(count.group(1))} if count else {}
+        return {}
+
+    async def try_fast_path(self, text: str, has_time: bool = False) -> Optional[AgentResult]:
+        """
+        Answer a read-only request directly from its tool.
+
+        Returns:
+            AgentResult, or None when the request is not a clear read or the
+            tool failed (the caller then runs the full chain).
+        """
+        route = self.classify(text, has_time)
+        if not route:
+            return None
+
+        started = time.perf_counter()
+        try:
+            output = await route["tool"].ainvoke(self._arguments(route, text))
+            if isinstance(output, dict) and "error" in output:
+                return None
+            # Same per-tool templates the observer uses after agent tool calls
+            reply = interpret_tool_output(route["tool"].name, output)
+            if reply is None:
+                return None
+        except Exception as e:
+            print(f"❌ [DEBUG] Fast path '{route['intent']}' failed, using full chain: {e}")
+            return None
+
+        self.stats.record_fast(route["intent"], time.perf_counter() - started)
+        return AgentResult(output=reply, tool_used=route["tool"].name, tools_called=[route["tool"].name])
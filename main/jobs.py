@@ -0,0 +1,224 @@
+# jobs.py
+
+import os
+import time
+import asyncio
+import contextvars
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+from uuid import uuid4
+
+from session_store import session_store
+from agent_setup import run_agent_turn
+from graph_tools.tracing import trace
+
+# ---------------------------------------------
+# Job limits
+# ---------------------------------------------
+# Background /ask turns that run at the same time (the rest wait in the queue)
+AGENT_JOB_WORKERS = int(os.getenv("AGENT_JOB_WORKERS", "4"))
+# Jobs waiting for a worker before new submissions are refused
+AGENT_JOB_QUEUE_LIMIT = int(os.getenv("AGENT_JOB_QUEUE_LIMIT", "100"))
+# Finished jobs kept in memory for /jobs/{id} (older ones are read from the session store)
+AGENT_JOB_HISTORY = int(os.getenv("AGENT_JOB_HISTORY", "500"))
+
+FINISHED = ("succeeded", "failed", "cancelled")
+# Progress events kept in the job's tool trace; answer tokens are only streamed live
+TRACE_EVENTS = ("stage", "tool_start", "tool_end", "tool_cache_hit", "tool_step")
+
+class JobQueueFull(Exception):
+    """Raised when AGENT_JOB_QUEUE_LIMIT jobs are already waiting."""
+
+# ---------------------------------------------
+# One background turn
+# ---------------------------------------------
+class Job:
+    """
+    An /ask turn running in the background: status, the progress events seen
+    so far (stages and tool calls) and, once finished, the result or error.
+    Live listeners (the SSE endpoint) get every event as it happens.
+    """
+
+    def __init__(self, session_id: str, query: str):
+        self.id = uuid4().hex
+        self.session_id = session_id
+        self.query = query
+        self.status = "queued"
+        self.events: List[Dict] = []
+        self.result: Optional[Dict] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.task: Optional[asyncio.Task] = None
+        self._listeners: List[asyncio.Queue] = []
+
+    @property
+    def done(self) -> bool:
+        return self.status in FINISHED
+
+    def emit(self, event: Dict):
+        """Progress callback passed to run_agent_turn."""
+        if event.get("event") in TRACE_EVENTS:
+            self.events.append(event)
+            self.save()
+        for listener in self._listeners:
+            listener.put_nowait(event)
+
+    def finish(self, status: str, result: Optional[Dict] = None, error: Optional[str] = None):
+        self.status, self.result, self.error = status, result, error
+        self.finished_at = time.time()
+        self.save()
+        for listener in self._listeners:
+            listener.put_nowait(self.final_event())
+            listener.put_nowait(None)
+        self._listeners.clear()
+
+    def final_event(self) -> Dict:
+        """Last event of a finished job: "final" with the result, or "failed"/"cancelled"."""
+        if self.result:
+            return {"event": "final", **self.result}
+        return {"event": self.status, "detail": self.error}
+
+    def listen(self) -> asyncio.Queue:
+        """Queue receiving the job's events from now on (None after the last)."""
+        listener = asyncio.Queue()
+        self._listeners.append(listener)
+        return listener
+
+    def unlisten(self, listener: asyncio.Queue):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def save(self):
+        """Queue the job's state for the session store, so other workers can report it."""
+        session_store.put(f"job:{self.id}", self.to_dict())
+
+    def to_dict(self) -> Dict:
+        return {
+            "job_id": self.id,
+            "session_id": self.session_id,
+            "query": self.query,
+            "status": self.status,
+            "events": self.events,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+# ---------------------------------------------
+# Bounded worker pool
+# ---------------------------------------------
+class JobRunner:
+    """
+    Runs submitted turns on a fixed number of asyncio workers. Jobs don't
+    depend on the request that created them, so they finish even if the
+    client disconnects; they stop only when cancelled.
+    """
+
+    def __init__(self, run_turn: Callable, workers: int = AGENT_JOB_WORKERS, queue_limit: int = AGENT_JOB_QUEUE_LIMIT):
+        self.run_turn = run_turn
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._jobs = OrderedDict()  # job id -> Job, oldest first
+        self.stats = {"submitted": 0, "rejected": 0, "succeeded": 0, "failed": 0, "cancelled": 0}
+
+    def start(self):
+        """Start the workers on the running event loop (idempotent)."""
+        if self._workers:
+            return
+        self._queue = asyncio.Queue()
+        for number in range(self.workers):
+            # A fresh context, so workers don't inherit the trace of whichever request started them
+            task = asyncio.get_running_loop().create_task(
+                self._work(), name=f"agent-job-{number}", context=contextvars.Context()
+            )
+            self._workers.append(task)
+
+    async def stop(self):
+        """Cancel running and queued jobs and stop the workers."""
+        for job in list(self._jobs.values()):
+            self.cancel(job.id)
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def submit(self, session_id: str, query: str) -> Job:
+        """Queue a turn; raises JobQueueFull when too many jobs are waiting."""
+        self.start()
+        if self._queue.qsize() >= self.queue_limit:
+            self.stats["rejected"] += 1
+            raise JobQueueFull(f"{self._queue.qsize()} jobs are already waiting.")
+
+        job = Job(session_id, query)
+        self._jobs[job.id] = job
+        self._forget_old()
+        self.stats["submitted"] += 1
+        job.save()
+        self._queue.put_nowait(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def status(self, job_id: str) -> Optional[Dict]:
+        """Job state from this worker, or as last stored by whichever worker ran it."""
+        job = self._jobs.get(job_id)
+        return job.to_dict() if job else session_store.get(f"job:{job_id}")
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """Cancel a queued or running job of this worker; None if it isn't here."""
+        job = self._jobs.get(job_id)
+        if job is None or job.done:
+            return job
+        if job.task is None:
+            self._finish(job, "cancelled", error="Cancelled before it started.")  # Skipped when dequeued
+        else:
+            job.task.cancel()
+        return job
+
+    async def _work(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                if not job.done:
+                    job.task = asyncio.create_task(self._run(job))
+                    await asyncio.wait([job.task])
+                    if not job.done:  # Cancelled before its first step
+                        self._finish(job, "cancelled", error="Cancelled before it started.")
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: Job):
+        job.status, job.started_at = "running", time.time()
+        job.save()
+        try:
+            with trace("agent job", trace_id=job.id, session_id=job.session_id):
+                agent_result = await self.run_turn(job.session_id, job.query, emit=job.emit)
+        except asyncio.CancelledError:
+            self._finish(job, "cancelled", error="Cancelled while running.")
+            raise
+        except Exception as e:
+            self._finish(job, "failed", error=f"❌ Failed: {str(e)}")
+        else:
+            self._finish(job, "succeeded", result={"tool_used": agent_result.tool_used, "response": agent_result.output})
+
+    def _finish(self, job: Job, status: str, result: Optional[Dict] = None, error: Optional[str] = None):
+        job.finish(status, result=result, error=error)
+        self.stats[status] += 1
+
+    def _forget_old(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.done]
+        for job_id in finished[:max(0, len(finished) - AGENT_JOB_HISTORY)]:
+            del self._jobs[job_id]
+
+    def report(self) -> Dict:
+        running = sum(1 for job in self._jobs.values() if job.status == "running")
+        return dict(self.stats, workers=self.workers, running=running, queued=self._queue.qsize() if self._queue else 0)
+
+job_runner = JobRunner(run_agent_turn)
@@ -1,8 +1,11 @@
 # llm_config.py
 
 import os
+from typing import Optional
 from dotenv import load_dotenv
 from langchain_openai import AzureChatOpenAI
+from token_accounting import token_usage_callback
+from llm_registry import llm_registry
 
 # Load environment variables from .env file
 load_dotenv()
@@ -13,26 +16,37 @@ load_dotenv()
 AZURE_OPENAI_API_KEY = os.getenv("AZURE_OPENAI_API_KEY")
 AZURE_OPENAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT")
 AZURE_OPENAI_DEPLOYMENT_NAME = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME")
+AZURE_OPENAI_API_VERSION = os.getenv("AZURE_OPENAI_API_VERSION") or "2024-05-01-preview"
 
 # ------------------------------
-# Return initialized LLM client
+# Return shared LLM client
 # ------------------------------
-def get_llm():
+def get_llm(temperature: Optional[float] = 0.0, deployment: Optional[str] = None):
     """
-    Return an instance of AzureChatOpenAI model 
-    configured for deterministic tool invocation.
-    
+    Return the process-wide AzureChatOpenAI client for a deployment and
+    temperature. Clients are built once by the LLM registry and share its
+    pooled HTTP connections and per-deployment rate limits.
+
+    Args:
+        temperature (float, optional): Sampling temperature; 0.0 (default)
+            keeps tool usage predictable, None uses the service default.
+        deployment (str, optional): Azure deployment; defaults to
+            AZURE_OPENAI_DEPLOYMENT_NAME.
+
     Returns:
         AzureChatOpenAI: Ready-to-use LLM client
     """
-    llm = AzureChatOpenAI(
-        azure_deployment=AZURE_OPENAI_DEPLOYMENT_NAME,
+    deployment = deployment or AZURE_OPENAI_DEPLOYMENT_NAME
+    return llm_registry.client(("azure_chat", deployment, temperature), lambda: AzureChatOpenAI(
+        azure_deployment=deployment,
         azure_endpoint=AZURE_OPENAI_ENDPOINT,
-        openai_api_version="2024-05-01-preview",
+        openai_api_version=AZURE_OPENAI_API_VERSION,
         api_key=AZURE_OPENAI_API_KEY,
-        temperature=0.0  # Ensures predictable tool usage
-    )
-    return llm
+        temperature=temperature,
+        callbacks=[token_usage_callback],  # Per-stage token accounting
+        http_client=llm_registry.http_client,
+        http_async_client=llm_registry.http_async_client
+    ))
 
 # Make this function accessible when imported with *
 __all__ = ["get_llm"]
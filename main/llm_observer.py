@@ -1,5 +1,9 @@
 # llm_observer.py
 
+import re
+import json
+import threading
+from typing import Callable, Dict, List, Optional
 from langchain_core.prompts import PromptTemplate
 from llm_config import get_llm
 
@@ -29,21 +33,243 @@ observation_prompt = PromptTemplate.from_template(
     """
 )
 
+# ------------------------------------------
+# Templates: Render list-shaped tool results
+# ------------------------------------------
+def _lines(items: List, line: Callable[[Dict], str], heading: str, empty: str, limit: int = 20) -> str:
+    if not items:
+        return empty
+    text = "\n".join(f"- {line(item)}" for item in items[:limit])
+    more = f"\n…and {len(items) - limit} more." if len(items) > limit else ""
+    return f"{heading}\n{text}{more}"
+
+def _task_line(task: Dict) -> str:
+    due = f" (due {task['due_date'][:10]})" if task.get("due_date") else ""
+    return f"{task.get('title')}{due} — {task.get('status')} [{task.get('task_list_name')}]"
+
+def _event_line(event: Dict) -> str:
+    start = (event.get("start") or {}).get("dateTime", "")[:16].replace("T", " ")
+    return f"{event.get('subject') or '(no subject)'} — {start}"
+
+def _email_line(email: Dict) -> str:
+    sender = ((email.get("from") or {}).get("emailAddress") or {}).get("name", "unknown sender")
+    return f"{email.get('subject') or '(no subject)'} — from {sender}"
+
+def _contact_line(contact: Dict) -> str:
+    if "emailAddresses" in contact:
+        addresses = contact.get("emailAddresses") or [{}]
+        return f"{contact.get('displayName')} <{addresses[0].get('address', 'no email')}>"
+    return f"{contact.get('name')} <{contact.get('email')}>"
+
+def _user_line(user: Dict) -> str:
+    details = ", ".join(v for v in (user.get("job_title"), user.get("department")) if v)
+    return f"{user.get('display_name')} <{user.get('mail') or user.get('upn')}>" + (f" — {details}" if details else "")
+
+def _slot_line(slot: Dict) -> str:
+    return f"{slot['start'][:16].replace('T', ' ')} – {slot['end'][11:16]}"
+
+def _presence_summary(out: Dict) -> str:
+    counts = ", ".join(f"{count} {state}" for state, count in sorted(out.get("summary", {}).items()))
+    return f"Team presence: {counts}." if counts else "No presence information found."
+
+def _broadcast_summary(out: Dict) -> str:
+    failed = [user_id for user_id, status in out.get("results", {}).items() if not status.startswith("✅")]
+    text = f"✅ Message sent to {out.get('sent', 0)} of {out.get('sent', 0) + out.get('failed', 0)} users."
+    return text + (f"\n❌ Failed for: {', '.join(failed)}" if failed else "")
+
+def _delivery_status(out: Dict) -> str:
+    text = f"Email to {out['recipient']} (\"{out['subject']}\") is {out['status']} after {out['attempts']} attempt(s)."
+    return text + (f" Last error: {out['last_error']}" if out.get("last_error") else "")
+
+# ------------------------------------------
+# Schemas: Expected result shape per tool
+# ------------------------------------------
+# "status":      "✅ ..." / "❌ ..." strings
+# "status_code": "<Action> Status: <code>" strings, successful for `success` codes
+# "template":    dicts rendered by `render` once `requires` keys are present
+TOOL_RESULT_SCHEMAS = {
+    # Tasks
+    "list_all_tasks_tool": {"kind": "template", "requires": ["tasks"],
+                            "render": lambda out: _lines(out["tasks"], _task_line, "Your tasks:", "You have no tasks.")},
+    "list_tasks_today_tool": {"kind": "template", "requires": ["tasks_due_today"],
+                              "render": lambda out: _lines(out["tasks_due_today"], _task_line, "Tasks due today:", "You have no tasks due today.")},
+    "create_task": {"kind": "status_code", "success": {201}, "message": "✅ Task created successfully!"},
+    "delete_task": {"kind": "status_code", "success": {204}, "message": "✅ Task deleted successfully!"},
+    # Calendar
+    "get_events": {"kind": "template", "requires": ["value"],
+                   "render": lambda out: _lines(out["value"], _event_line, "Your calendar:", "You have no upcoming events.")},
+    "add_calendar_event_with_availability_check": {"kind": "status"},
+    "delete_calendar_event": {"kind": "status"},
+    "update_calendar_event": {"kind": "status"},
+    "find_available_meeting_times": {"kind": "template", "requires": ["available_slots"],
+                                     "render": lambda out: _lines(out["available_slots"], _slot_line, "Available meeting times:", "❌ No available meeting times found.")},
+    # Email
+    "list_emails": {"kind": "template", "requires": ["emails"],
+                    "render": lambda out: _lines(out["emails"], _email_line, "Recent emails:", "Your inbox is empty.")},
+    "send_email": {"kind": "status"},
+    "get_email_delivery_status": {"kind": "template", "requires": ["status", "recipient"], "render": _delivery_status},
+    # Contacts & users
+    "get_user_contacts": {"kind": "template", "requires": ["value"],
+                          "render": lambda out: _lines(out["value"], _contact_line, "Your contacts:", "You have no contacts.")},
+    "add_user_contact": {"kind": "status"},
+    "get_signed_in_user_profile": {"kind": "template", "requires": ["displayName"],
+                                   "render": lambda out: f"You are {out['displayName']} ({out.get('mail') or out.get('userPrincipalName')})"
+                                                         + (f", {out['jobTitle']}" if out.get("jobTitle") else "") + "."},
+    "list_all_users": {"kind": "template", "requires": ["users"],
+                       "render": lambda out: _lines(out["users"], _user_line, f"Users ({out.get('total', len(out['users']))} total):", "No users found.")},
+    "search_directory_users": {"kind": "template", "requires": ["users"],
+                               "render": lambda out: _lines(out["users"], _user_line, "Matching users:", "No matching users found.")},
+    "create_new_user": {"kind": "status"},
+    "update_user_display_name": {"kind": "status"},
+    "delete_user": {"kind": "status"},
+    # Teams & presence
+    "list_joined_teams": {"kind": "template", "requires": ["value"],
+                          "render": lambda out: _lines(out["value"], lambda t: t.get("displayName"), "Your teams:", "You haven't joined any teams.")},
+    "join_team": {"kind": "status"},
+    "send_private_message_to_user": {"kind": "status"},
+    "broadcast_private_message": {"kind": "template", "requires": ["results", "sent"], "render": _broadcast_summary},
+    "get_user_presence": {"kind": "template", "requires": ["availability"],
+                          "render": lambda out: f"You are currently {out['availability']} ({out.get('activity')})."},
+    "set_user_presence": {"kind": "status"},
+    "get_team_presence": {"kind": "template", "requires": ["presences", "summary"], "render": _presence_summary},
+}
+
+STATUS_PATTERN = re.compile(r"^\s*(✅|❌)\s*(.+)$", re.DOTALL)
+STATUS_CODE_PATTERN = re.compile(r"Status(?: Code)?:\s*(\d{3})")
+
+def _graph_error_message(text: str) -> str:
+    """Shorten '... Status Code: 409 - {graph error json}' to its readable message."""
+    head, sep, body = text.partition(" - {")
+    if not sep:
+        return text
+    try:
+        error = json.loads("{" + body).get("error", {})
+        return f"{head} - {error.get('message') or error.get('code')}" if error else head
+    except ValueError:
+        return head
+
+# ------------------------------------------------
+# Rule-based observer: Interpret known result shapes
+# ------------------------------------------------
+def interpret_tool_output(tool_used: str, tool_output) -> Optional[str]:
+    """
+    Turn a tool result into a user message without calling the LLM.
+
+    Args:
+        tool_used (str): Name of the tool that produced the output.
+        tool_output: Raw tool output (status string or dict).
+
+    Returns:
+        str: Final message for the user, or None when the output does not
+        match the tool's known result shapes.
+    """
+    schema = TOOL_RESULT_SCHEMAS.get(tool_used)
+    if not schema:
+        return None
+
+    if isinstance(tool_output, dict) and "error" in tool_output:
+        error = tool_output["error"]
+        if isinstance(error, dict):
+            error = error.get("message") or error.get("code")
+        if not error:
+            return None
+        return f"❌ Sorry, that didn't work: {_graph_error_message(str(error)).lstrip('❌ ')}"
+
+    if isinstance(tool_output, dict) and "message" in tool_output and str(tool_output["message"]).startswith(("✅", "❌")):
+        return tool_output["message"]
+
+    if schema["kind"] == "template":
+        if not isinstance(tool_output, dict) or not all(key in tool_output for key in schema["requires"]):
+            return None
+        try:
+            return schema["render"](tool_output)
+        except (KeyError, TypeError, AttributeError):
+            return None
+
+    if not isinstance(tool_output, str):
+        return None
+
+    if schema["kind"] == "status":
+        match = STATUS_PATTERN.match(tool_output)
+        if not match:
+            return None
+        icon, message = match.groups()
+        return f"✅ {message}" if icon == "✅" else f"❌ {_graph_error_message(message)}"
+
+    if schema["kind"] == "status_code":
+        match = STATUS_CODE_PATTERN.search(tool_output)
+        if not match:
+            return None
+        status_code = int(match.group(1))
+        if status_code in schema["success"]:
+            return schema["message"]
+        return f"❌ {tool_output} — the request was not completed."
+
+    return None
+
+# ------------------------------------------
+# Fallback accounting
+# ------------------------------------------
+class ObserverStats:
+    """Counts how often tool outputs needed the LLM observer."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.rule_based = {}  # tool -> count
+        self.llm_fallback = {}  # tool -> count
+
+    def record(self, tool_used: str, used_llm: bool):
+        counts = self.llm_fallback if used_llm else self.rule_based
+        with self._lock:
+            counts[tool_used] = counts.get(tool_used, 0) + 1
+
+    def report(self) -> Dict:
+        with self._lock:
+            rule_based = sum(self.rule_based.values())
+            fallbacks = sum(self.llm_fallback.values())
+            total = rule_based + fallbacks
+            return {
+                "observations": total,
+                "rule_based": rule_based,
+                "llm_fallback": fallbacks,
+                "fallback_rate": round(fallbacks / total, 3) if total else None,
+                "fallback_by_tool": dict(self.llm_fallback)
+            }
+
+observer_stats = ObserverStats()
+
 # -------------------------------------------------------
 # Observer Function: Uses LLM to validate tool response
 # -------------------------------------------------------
-async def observe_tool_output(user_input: str, tool_used: str, tool_output: str) -> str:
+async def observe_tool_output(
+    user_input: str,
+    tool_used: str,
+    tool_output: str,
+    on_token: Optional[Callable[[str], None]] = None
+) -> str:
     """
     Determine whether a tool output is complete and valid.
 
+    Known result shapes are handled by interpret_tool_output(); the LLM is
+    only asked about outputs the rules cannot interpret.
+
     Args:
         user_input (str): Original query from the user.
         tool_used (str): Name of the tool that was triggered.
         tool_output (str): Raw output returned by the tool.
+        on_token (Callable): Optional callback receiving the message as it is
+            produced (streamed token by token when the LLM is used).
 
     Returns:
         str: Cleaned up response for the user or "NOT COMPLETE" if invalid.
     """
+    message = interpret_tool_output(tool_used, tool_output)
+    observer_stats.record(tool_used, used_llm=message is None)
+    if message is not None:
+        if on_token:
+            on_token(message)
+        return message
+
     # Format prompt with actual values
     formatted_prompt = observation_prompt.format(
         user_input=user_input,
@@ -52,8 +278,27 @@ async def observe_tool_output(user_input: str, tool_used: str, tool_output: str)
     )
 
     try:
-        response = await llm.ainvoke(formatted_prompt)
-        return response.content.strip()
+        if not on_token:
+            response = await llm.ainvoke(formatted_prompt)
+            return response.content.strip()
+
+        # Hold tokens back while the reply could still be "NOT COMPLETE", which
+        # the caller replaces; once it can't, stream the rest as it arrives
+        chunks, streaming = [], False
+        async for chunk in llm.astream(formatted_prompt):
+            if not chunk.content:
+                continue
+            chunks.append(chunk.content)
+            if streaming:
+                on_token(chunk.content)
+            elif not "NOT COMPLETE".startswith("".join(chunks).strip()):
+                streaming = True
+                on_token("".join(chunks))
+
+        reply = "".join(chunks).strip()
+        if not streaming and reply != "NOT COMPLETE" and reply:
+            on_token(reply)
+        return reply
     except Exception as e:
         print(f"❌ [DEBUG] LLM Observation Error: {e}")
         return "NOT COMPLETE"
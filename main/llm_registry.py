@@ -0,0 +1,427 @@
+# llm_registry.py
+
+import os
+import re
+import json
+import time
+import heapq
+import asyncio
+import itertools
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Optional
+import httpx
+
+from token_accounting import count_tokens
+from graph_tools.tracing import start_span
+
+# ---------------------------------------------
+# Limits per Azure OpenAI deployment
+# ---------------------------------------------
+# Requests in flight per deployment; further requests wait in a priority queue
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+# Token budget per deployment and minute (match the deployment's TPM quota; 0 disables)
+LLM_TOKENS_PER_MINUTE = int(os.getenv("LLM_TOKENS_PER_MINUTE", "80000"))
+# Per-deployment overrides, e.g. {"gpt-4o": {"concurrency": 4, "tokens_per_minute": 30000}}
+LLM_DEPLOYMENT_LIMITS = json.loads(os.getenv("LLM_DEPLOYMENT_LIMITS") or "{}")
+# Pooled HTTP connections shared by every LLM client
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+LLM_HTTP_TIMEOUT_SECONDS = 120
+# Completion tokens assumed when a request doesn't set max_tokens
+DEFAULT_COMPLETION_TOKENS = 500
+
+LIMITED_PATHS = ("/chat/completions", "/completions", "/embeddings")
+DEPLOYMENT_IN_PATH = re.compile(r"/deployments/([^/]+)/")
+
+# ---------------------------------------------
+# Priorities
+# ---------------------------------------------
+# Lower runs first when requests queue: user-facing turns before document
+# Q&A before background work such as conversation summaries.
+PRIORITIES = {"interactive": 0, "documents": 1, "background": 2}
+_priority: ContextVar[int] = ContextVar("llm_priority", default=PRIORITIES["interactive"])
+
+@contextmanager
+def llm_priority(name: str):
+    """Queue LLM requests made inside the block with the given priority."""
+    token = _priority.set(PRIORITIES[name])
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+# ---------------------------------------------
+# Limiter: concurrency + token bucket + priority queue
+# ---------------------------------------------
+class _Waiter:
+    """A queued request, woken from whichever thread frees capacity."""
+
+    def __init__(self, tokens: int, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.tokens = tokens
+        self.granted = False
+        self._loop = loop
+        self._event = None if loop else threading.Event()
+        self._future = loop.create_future() if loop else None
+
+    def grant(self):
+        self.granted = True
+        if self._event:
+            self._event.set()
+        else:
+            self._loop.call_soon_threadsafe(self._resolve)
+
+    def _resolve(self):
+        if not self._future.done():
+            self._future.set_result(True)
+
+class DeploymentLimiter:
+    """
+    Admits requests to one deployment while fewer than `max_concurrency`
+    are in flight and the token bucket (refilled at `tokens_per_minute`)
+    holds the request's estimated tokens. Waiting requests are admitted in
+    priority order, then arrival order. Works for both threads and asyncio
+    tasks, since the sync and async LLM clients share the limits.
+    """
+
+    def __init__(self, deployment: str, max_concurrency: int, tokens_per_minute: int):
+        self.deployment = deployment
+        self.max_concurrency = max_concurrency
+        self.tokens_per_minute = tokens_per_minute
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._bucket = float(tokens_per_minute)
+        self._refilled_at = time.monotonic()
+        self._queue = []  # heap of (priority, arrival, _Waiter)
+        self._arrivals = itertools.count()
+        self.stats = {
+            "requests": 0, "queued": 0, "wait_seconds": 0.0, "max_wait_seconds": 0.0,
+            "estimated_tokens": 0, "actual_tokens": 0, "throttled": 0, "errors": 0,
+            "by_priority": {}
+        }
+
+    # Called with self._lock held
+    def _refill(self):
+        if self.tokens_per_minute:
+            now = time.monotonic()
+            self._bucket = min(self.tokens_per_minute, self._bucket + (now - self._refilled_at) * self.tokens_per_minute / 60)
+            self._refilled_at = now
+
+    def _fits(self, tokens: int) -> bool:
+        return self._in_flight < self.max_concurrency and (not self.tokens_per_minute or self._bucket >= tokens)
+
+    def _take(self, tokens: int):
+        self._in_flight += 1
+        if self.tokens_per_minute:
+            self._bucket -= tokens
+
+    def _admit_waiting(self):
+        self._refill()
+        while self._queue and self._fits(self._queue[0][2].tokens):
+            _, _, waiter = heapq.heappop(self._queue)
+            self._take(waiter.tokens)
+            waiter.grant()
+
+    def _retry_after(self, tokens: int) -> float:
+        """Seconds until the bucket could hold `tokens` (re-checked at least every second)."""
+        if self.tokens_per_minute and self._bucket < tokens:
+            return min(1.0, max(0.05, (tokens - self._bucket) * 60 / self.tokens_per_minute))
+        return 1.0
+
+    def _cost(self, tokens: int) -> int:
+        # A request larger than the whole bucket still has to be able to run
+        return min(tokens, self.tokens_per_minute) if self.tokens_per_minute else tokens
+
+    def _enqueue(self, tokens: int, priority: int, loop=None) -> Optional[_Waiter]:
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats["estimated_tokens"] += tokens
+            self.stats["by_priority"][priority] = self.stats["by_priority"].get(priority, 0) + 1
+            self._refill()
+            if not self._queue and self._fits(tokens):
+                self._take(tokens)
+                return None
+            waiter = _Waiter(tokens, loop)
+            heapq.heappush(self._queue, (priority, next(self._arrivals), waiter))
+            self.stats["queued"] += 1
+            return waiter
+
+    def _record_wait(self, started: float):
+        waited = time.monotonic() - started
+        with self._lock:
+            self.stats["wait_seconds"] += waited
+            self.stats["max_wait_seconds"] = max(self.stats["max_wait_seconds"], waited)
+
+    def acquire(self, tokens: int, priority: int) -> int:
+        """Block the calling thread until the request may start. Returns the tokens taken."""
+        tokens, started = self._cost(tokens), time.monotonic()
+        waiter = self._enqueue(tokens, priority)
+        while waiter and not waiter.granted:
+            waiter._event.wait(self._retry_after(tokens))
+            with self._lock:
+                self._admit_waiting()
+        if waiter:
+            self._record_wait(started)
+        return tokens
+
+    async def acquire_async(self, tokens: int, priority: int) -> int:
+        """Wait (without blocking the event loop) until the request may start."""
+        tokens, started = self._cost(tokens), time.monotonic()
+        waiter = self._enqueue(tokens, priority, asyncio.get_running_loop())
+        try:
+            while waiter and not waiter.granted:
+                try:
+                    await asyncio.wait_for(asyncio.shield(waiter._future), self._retry_after(tokens))
+                except asyncio.TimeoutError:
+                    with self._lock:
+                        self._admit_waiting()
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter.granted:
+                    self._in_flight -= 1
+                    self._bucket += tokens if self.tokens_per_minute else 0
+                    self._admit_waiting()
+                else:
+                    self._queue = [entry for entry in self._queue if entry[2] is not waiter]
+                    heapq.heapify(self._queue)
+            raise
+        if waiter:
+            self._record_wait(started)
+        return tokens
+
+    def release(self, taken: int, actual: Optional[int] = None, status_code: Optional[int] = None):
+        """Free the request's slot; correct the bucket once actual usage is known."""
+        with self._lock:
+            self._in_flight -= 1
+            if actual is not None:
+                self.stats["actual_tokens"] += actual
+                if self.tokens_per_minute:
+                    self._bucket = min(self.tokens_per_minute, self._bucket + taken - actual)
+            if status_code == 429:
+                # Azure says the quota is used up: stop admitting until the bucket refills
+                self.stats["throttled"] += 1
+                self._bucket = min(self._bucket, 0.0)
+            elif status_code is None or status_code >= 500:
+                self.stats["errors"] += 1
+            self._admit_waiting()
+
+    def report(self) -> Dict:
+        with self._lock:
+            self._refill()
+            return dict(
+                self.stats,
+                wait_seconds=round(self.stats["wait_seconds"], 3),
+                max_wait_seconds=round(self.stats["max_wait_seconds"], 3),
+                by_priority={name: self.stats["by_priority"].get(level, 0) for name, level in PRIORITIES.items()},
+                in_flight=self._in_flight,
+                waiting=len(self._queue),
+                bucket_tokens=round(self._bucket) if self.tokens_per_minute else None,
+                max_concurrency=self.max_concurrency,
+                tokens_per_minute=self.tokens_per_minute or None
+            )
+
+# ---------------------------------------------
+# HTTP transport: every LLM request passes the limiter
+# ---------------------------------------------
+def _estimate_tokens(request: httpx.Request) -> int:
+    """Prompt tokens of the request body plus the completion tokens it may use."""
+    try:
+        body = request.content.decode("utf-8")
+        payload = json.loads(body)
+    except Exception:
+        return DEFAULT_COMPLETION_TOKENS
+    completion = payload.get("max_tokens") or payload.get("max_completion_tokens") or DEFAULT_COMPLETION_TOKENS
+    return count_tokens(body) + completion
+
+def _usage(content: bytes) -> Optional[int]:
+    try:
+        return json.loads(content).get("usage", {}).get("total_tokens")
+    except Exception:
+        return None
+
+def _is_stream(response: httpx.Response) -> bool:
+    return "text/event-stream" in response.headers.get("content-type", "")
+
+class _ReleasingStream(httpx.SyncByteStream, httpx.AsyncByteStream):
+    """Response body that frees the limiter slot once the stream is closed."""
+
+    def __init__(self, stream, on_close: Callable[[], None]):
+        self._stream = stream
+        self._on_close = on_close
+        self._closed = False
+
+    def __iter__(self):
+        yield from self._stream
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    def _release(self):
+        if not self._closed:
+            self._closed = True
+            self._on_close()
+
+    def close(self):
+        try:
+            self._stream.close()
+        finally:
+            self._release()
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            self._release()
+
+def _span_queued(http_span, taken: int):
+    """Note how long the request waited for the limiter."""
+    if http_span is not None:
+        http_span.set(queued_ms=round((time.perf_counter() - http_span._started) * 1000, 2), estimated_tokens=taken)
+
+def _span_end(http_span, error: Optional[BaseException] = None, **attributes):
+    if http_span is not None:
+        http_span.set(**attributes).end(error=error)
+
+class LimitedTransport(httpx.BaseTransport, httpx.AsyncBaseTransport):
+    """Wraps an httpx transport so completion requests wait for their deployment's limiter."""
+
+    def __init__(self, registry: "LLMRegistry", inner):
+        self.registry = registry
+        self.inner = inner
+
+    def _limiter_for(self, request: httpx.Request) -> Optional[DeploymentLimiter]:
+        path = request.url.path
+        if not path.endswith(LIMITED_PATHS):
+            return None
+        match = DEPLOYMENT_IN_PATH.search(path)
+        return self.registry.limiter(match.group(1) if match else "default")
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        limiter = self._limiter_for(request)
+        if limiter is None:
+            return self.inner.handle_request(request)
+
+        http_span = start_span(f"POST {limiter.deployment}", kind="llm_http")
+        taken = limiter.acquire(_estimate_tokens(request), _priority.get())
+        _span_queued(http_span, taken)
+        try:
+            response = self.inner.handle_request(request)
+        except Exception as e:
+            limiter.release(taken)
+            _span_end(http_span, error=e)
+            raise
+        if _is_stream(response):
+            response.stream = _ReleasingStream(response.stream, lambda: self._finish_stream(limiter, taken, response, http_span))
+            return response
+        try:
+            response.read()
+        finally:
+            limiter.release(taken, _usage(response.content), response.status_code)
+            _span_end(http_span, status=response.status_code)
+        return response
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        limiter = self._limiter_for(request)
+        if limiter is None:
+            return await self.inner.handle_async_request(request)
+
+        http_span = start_span(f"POST {limiter.deployment}", kind="llm_http")
+        try:
+            taken = await limiter.acquire_async(_estimate_tokens(request), _priority.get())
+        except BaseException as e:
+            _span_end(http_span, error=e)
+            raise
+        _span_queued(http_span, taken)
+        try:
+            response = await self.inner.handle_async_request(request)
+        except BaseException as e:
+            limiter.release(taken)
+            _span_end(http_span, error=e)
+            raise
+        if _is_stream(response):
+            response.stream = _ReleasingStream(response.stream, lambda: self._finish_stream(limiter, taken, response, http_span))
+            return response
+        try:
+            await response.aread()
+        finally:
+            limiter.release(taken, _usage(response.content), response.status_code)
+            _span_end(http_span, status=response.status_code)
+        return response
+
+    def _finish_stream(self, limiter: DeploymentLimiter, taken: int, response: httpx.Response, http_span):
+        limiter.release(taken, status_code=response.status_code)
+        _span_end(http_span, status=response.status_code)
+
+    def close(self):
+        self.inner.close()
+
+    async def aclose(self):
+        await self.inner.aclose()
+
+# ---------------------------------------------
+# Registry: one pooled HTTP client pair and limiter per deployment
+# ---------------------------------------------
+class LLMRegistry:
+    """
+    Holds the LLM clients of the process. Clients are built once per
+    configuration and share one pooled sync and one pooled async HTTP
+    client, whose transport applies the per-deployment limits.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._limiters = {}
+        self._clients = {}
+        self._http_client = None
+        self._http_async_client = None
+
+    def limiter(self, deployment: str) -> DeploymentLimiter:
+        with self._lock:
+            if deployment not in self._limiters:
+                limits = LLM_DEPLOYMENT_LIMITS.get(deployment, {})
+                self._limiters[deployment] = DeploymentLimiter(
+                    deployment,
+                    limits.get("concurrency", LLM_MAX_CONCURRENCY),
+                    limits.get("tokens_per_minute", LLM_TOKENS_PER_MINUTE)
+                )
+            return self._limiters[deployment]
+
+    @property
+    def http_client(self) -> httpx.Client:
+        with self._lock:
+            if self._http_client is None:
+                limits = httpx.Limits(max_connections=LLM_MAX_CONNECTIONS, max_keepalive_connections=LLM_MAX_CONNECTIONS)
+                self._http_client = httpx.Client(
+                    transport=LimitedTransport(self, httpx.HTTPTransport(limits=limits)),
+                    timeout=LLM_HTTP_TIMEOUT_SECONDS
+                )
+            return self._http_client
+
+    @property
+    def http_async_client(self) -> httpx.AsyncClient:
+        with self._lock:
+            if self._http_async_client is None:
+                limits = httpx.Limits(max_connections=LLM_MAX_CONNECTIONS, max_keepalive_connections=LLM_MAX_CONNECTIONS)
+                self._http_async_client = httpx.AsyncClient(
+                    transport=LimitedTransport(self, httpx.AsyncHTTPTransport(limits=limits)),
+                    timeout=LLM_HTTP_TIMEOUT_SECONDS
+                )
+            return self._http_async_client
+
+    def client(self, key, build: Callable):
+        """Return the client registered under `key`, building it on first use."""
+        with self._lock:
+            if key in self._clients:
+                return self._clients[key]
+        client = build()
+        with self._lock:
+            return self._clients.setdefault(key, client)
+
+    def report(self) -> Dict:
+        with self._lock:
+            limiters = list(self._limiters.values())
+            clients = len(self._clients)
+        return {"clients": clients, "deployments": {limiter.deployment: limiter.report() for limiter in limiters}}
+
+llm_registry = LLMRegistry()
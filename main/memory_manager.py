@@ -0,0 +1,147 @@
+# memory_manager.py
+
+import os
+import asyncio
+from typing import Callable, List, Optional
+from langchain_core.prompts import PromptTemplate
+
+from token_accounting import count_tokens, usage_scope
+from llm_registry import llm_priority
+
+# ---------------------------------------------
+# Memory budget configuration
+# ---------------------------------------------
+# Tokens of conversation history sent with each turn (summary + recent turns)
+MEMORY_TOKEN_BUDGET = int(os.getenv("MEMORY_TOKEN_BUDGET", "1500"))
+# Most recent turns kept word for word; older ones are folded into the summary
+MEMORY_VERBATIM_TURNS = int(os.getenv("MEMORY_VERBATIM_TURNS", "6"))
+SUMMARY_MAX_TOKENS = 300
+# Lines waiting for the summarizer are capped so a failing LLM can't grow memory forever
+MAX_UNSUMMARIZED_LINES = 200
+
+summary_prompt = PromptTemplate.from_template(
+    """
+    You maintain a running summary of a conversation between a user and Donna, an admin assistant.
+
+    Current summary:
+    {summary}
+
+    New conversation lines:
+    {lines}
+
+    Update the summary with the new lines. Keep names, email addresses, dates, times and
+    decisions; drop small talk. Reply with the updated summary only, in at most 150 words.
+    """
+)
+
+# ---------------------------------------------
+# Helpers
+# ---------------------------------------------
+def _line(message) -> str:
+    return f"User: {message.content}" if message.type == "human" else f"Assistant: {message.content}"
+
+def _turn_starts(messages: List) -> List[int]:
+    """Indexes of the user messages that start each turn."""
+    return [i for i, message in enumerate(messages) if message.type == "human"]
+
+def _truncate_to_tokens(text: str, max_tokens: int) -> str:
+    while text and count_tokens(text) > max_tokens:
+        text = text[:int(len(text) * 0.9)]
+    return text
+
+# ---------------------------------------------
+# Rendering: bounded history for prompts
+# ---------------------------------------------
+def render_history(session) -> str:
+    """
+    Conversation history for the polish prompt: the rolling summary, any lines
+    still waiting to be summarized, then recent turns. Oldest lines are
+    dropped first if the result would exceed MEMORY_TOKEN_BUDGET.
+    """
+    lines = list(session.unsummarized) + [_line(m) for m in session.memory.messages]
+    header = f"Summary of earlier conversation: {session.summary}" if session.summary else ""
+
+    budget = MEMORY_TOKEN_BUDGET - count_tokens(header)
+    kept, used = [], 0
+    for line in reversed(lines):
+        tokens = count_tokens(line)
+        if used + tokens > budget and kept:
+            break
+        kept.append(line)
+        used += tokens
+    kept.reverse()
+
+    return "\n".join(([header] if header else []) + kept)
+
+# ---------------------------------------------
+# Compaction: fold old turns into the summary
+# ---------------------------------------------
+def compact_memory(session, llm, on_update: Optional[Callable] = None):
+    """
+    Keep the last MEMORY_VERBATIM_TURNS turns in chat memory (fewer if they
+    exceed the token budget) and move older turns to the session's
+    summarization queue. The summary is updated by a background task so the
+    current turn never waits for it. Call while holding the session lock.
+
+    Args:
+        session (AgentSession): The conversation to compact.
+        llm: Chat model used for the summary.
+        on_update (callable, optional): Called with the session, under its
+            lock, once the background task has updated its summary (e.g. to
+            persist it).
+    """
+    messages = session.memory.messages
+    starts = _turn_starts(messages)
+
+    keep_from = starts[-MEMORY_VERBATIM_TURNS] if len(starts) > MEMORY_VERBATIM_TURNS else (starts[0] if starts else 0)
+    # Also fold whole turns while the verbatim part is over budget (always keep the last turn)
+    while keep_from < (starts[-1] if starts else 0):
+        if sum(count_tokens(m.content) for m in messages[keep_from:]) <= MEMORY_TOKEN_BUDGET:
+            break
+        keep_from = next(i for i in starts if i > keep_from)
+
+    if keep_from == 0:
+        return
+
+    session.memory.messages = messages[keep_from:]
+    session.unsummarized.extend(_line(m) for m in messages[:keep_from])
+
+    if session.summary_task is None or session.summary_task.done():
+        del session.unsummarized[:-MAX_UNSUMMARIZED_LINES]
+        session.summary_task = asyncio.create_task(_summarize(session, llm, on_update))
+
+async def _summarize(session, llm, on_update: Optional[Callable] = None):
+    """Fold queued lines into the rolling summary until the queue is empty."""
+    with usage_scope(session.token_usage, stage="summary"), llm_priority("background"):
+        while session.unsummarized:
+            batch = list(session.unsummarized)
+            try:
+                response = await llm.ainvoke(summary_prompt.format(
+                    summary=session.summary or "(none yet)",
+                    lines="\n".join(batch)
+                ))
+            except Exception as e:
+                print(f"❌ [DEBUG] Conversation summary update failed: {e}")
+                return
+
+            session.summary = _truncate_to_tokens(response.content.strip(), SUMMARY_MAX_TOKENS)
+            # New lines may have been queued meanwhile; drop only what was summarized
+            del session.unsummarized[:len(batch)]
+
+    if on_update:
+        # Saving bumps the session version, so wait until no turn is running
+        async with session.lock:
+            on_update(session)
+
+def memory_report(session) -> dict:
+    """Sizes of a session's summary, queued lines and verbatim history, plus its dialog state."""
+    return {
+        "session_id": session.session_id,
+        "summary": session.summary,
+        "summary_tokens": count_tokens(session.summary),
+        "unsummarized_lines": len(session.unsummarized),
+        "verbatim_messages": len(session.memory.messages),
+        "history_tokens": count_tokens(render_history(session)),
+        "dialog_state": session.dialog.model_dump(),
+        "token_usage": session.token_usage
+    }
@@ -1,6 +1,6 @@
 # models.py
 
-from typing import List, Dict, Optional
+from typing import Any, List, Dict, Optional
 from pydantic import BaseModel, Field
 
 # ---------------------------------------------------
@@ -18,12 +18,15 @@ class AggregatedDataResponse(BaseModel):
 # ---------------------------------------------------
 class QueryRequest(BaseModel):
     query: str
+    session_id: Optional[str] = None  # A new session is started when omitted
+    background: bool = False  # Run as a job: /ask returns its job_id right away
 
 class QueryResponse(BaseModel):
     question: str
     tool_used: str
     response: str
     human_feedback: str
+    session_id: Optional[str] = None
 
 # ---------------------------------------------------
 # For internal use with LangChain agent results
@@ -31,6 +34,19 @@ class QueryResponse(BaseModel):
 class AgentResult(BaseModel):
     output: str
     tool_used: Optional[str] = "unknown"
+    tools_called: Optional[List[str]] = None  # Every tool the turn ran, in order
+
+# ---------------------------------------------------
+# Per-session dialog state (kept apart from chat history)
+# ---------------------------------------------------
+class PendingAction(BaseModel):
+    type: str                                          # "task", "event" or "email"
+    details: str                                       # Polished request awaiting completion
+    slots: Dict[str, Any] = Field(default_factory=dict)  # Values collected so far
+    missing: List[str] = Field(default_factory=list)     # What the user was asked for
+
+class DialogState(BaseModel):
+    pending: Optional[PendingAction] = None
 
 # ---------------------------------------------------
 # Output schema for structured event extraction
@@ -42,6 +58,8 @@ class EventSlots(BaseModel):
     title: Optional[str] = None
     location: Optional[str] = None
     description: Optional[str] = None
+    attendees: Optional[List[str]] = None  # Email addresses
+    duration_minutes: Optional[int] = None
     missing_fields: Optional[List[str]] = None
 
 # ---------------------------------------------------
@@ -0,0 +1,194 @@
+# parallel_tools.py
+
+import os
+import time
+import asyncio
+import threading
+from contextvars import ContextVar
+from typing import Dict, FrozenSet, List, Optional
+from langchain.agents import AgentExecutor
+from langchain_core.agents import AgentAction, AgentStep
+from langchain_core.callbacks import adispatch_custom_event
+
+from graph_tools.tracing import span
+
+# ---------------------------------------------
+# Scheduling limits
+# ---------------------------------------------
+# Read-only tool calls of one agent step that may run at the same time
+AGENT_PARALLEL_TOOLS = int(os.getenv("AGENT_PARALLEL_TOOLS", "4"))
+# Read-only calls still running after this long are answered with a timeout message
+AGENT_TOOL_TIMEOUT_SECONDS = float(os.getenv("AGENT_TOOL_TIMEOUT_SECONDS", "20"))
+# Tools that legitimately take longer than the default
+TOOL_TIMEOUTS = {
+    "find_available_meeting_times": 30,
+    "get_team_presence": 30,
+}
+
+# ---------------------------------------------
+# Stats: wall time saved by running calls together
+# ---------------------------------------------
+class ParallelToolStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.steps = 0
+        self.parallel_steps = 0
+        self.calls = 0
+        self.timeouts = 0
+        self.wall_seconds = 0.0
+        self.sequential_seconds = 0.0
+
+    def record(self, calls: int, wall: float, sequential: float, timeouts: int):
+        with self._lock:
+            self.steps += 1
+            self.calls += calls
+            self.timeouts += timeouts
+            self.wall_seconds += wall
+            self.sequential_seconds += sequential
+            if calls > 1:
+                self.parallel_steps += 1
+
+    def report(self) -> Dict:
+        with self._lock:
+            return {
+                "steps": self.steps,
+                "steps_with_several_calls": self.parallel_steps,
+                "tool_calls": self.calls,
+                "timeouts": self.timeouts,
+                "wall_seconds": round(self.wall_seconds, 3),
+                "sequential_seconds": round(self.sequential_seconds, 3),
+                "saved_seconds": round(self.sequential_seconds - self.wall_seconds, 3),
+            }
+
+parallel_stats = ParallelToolStats()
+
+# ---------------------------------------------
+# One agent step: read-only calls run together, writes in order
+# ---------------------------------------------
+class StepSchedule:
+    """
+    Tool calls planned in one agent step. Consecutive read-only calls form a
+    group that runs concurrently (at most `max_parallel` at a time); every
+    other call is a group of its own. A group starts only after the previous
+    one finished, so writes keep their planned order relative to everything
+    else in the step.
+    """
+
+    def __init__(self, read_only_tools: FrozenSet[str], max_parallel: int):
+        self.read_only_tools = read_only_tools
+        self.actions: List[AgentAction] = []
+        self.durations: List[float] = []
+        self.timeouts = 0
+        self.started = None
+        self.finished = None
+        self._semaphore = asyncio.Semaphore(max_parallel)
+        self._groups = None  # action index -> group number
+        self._done = []  # group number -> asyncio.Event
+        self._remaining = []  # group number -> calls still running
+
+    def _plan(self):
+        self._groups = []
+        for index, action in enumerate(self.actions):
+            is_read = action.tool in self.read_only_tools
+            previous_read = index > 0 and self.actions[index - 1].tool in self.read_only_tools
+            if not self._groups or not (is_read and previous_read):
+                self._done.append(asyncio.Event())
+                self._remaining.append(0)
+            self._groups.append(len(self._done) - 1)
+            self._remaining[-1] += 1
+
+    def _index(self, action: AgentAction) -> int:
+        return next(i for i, planned in enumerate(self.actions) if planned is action)
+
+    async def run(self, action: AgentAction, perform, timeout: float) -> AgentStep:
+        if self._groups is None:
+            self._plan()
+        group = self._groups[self._index(action)]
+        if group > 0:
+            await self._done[group - 1].wait()
+
+        started = time.perf_counter()
+        self.started = self.started or started
+        try:
+            if action.tool in self.read_only_tools:
+                async with self._semaphore:
+                    try:
+                        return await asyncio.wait_for(perform(), timeout)
+                    except asyncio.TimeoutError:
+                        self.timeouts += 1
+                        print(f"❌ [DEBUG] Tool {action.tool} timed out after {timeout:g}s")
+                        return AgentStep(action=action, observation=f"❌ {action.tool} timed out after {timeout:g} seconds.")
+            # Writes are never abandoned half-way
+            return await perform()
+        finally:
+            self.finished = time.perf_counter()
+            self.durations.append(self.finished - started)
+            self._remaining[group] -= 1
+            if self._remaining[group] == 0:
+                self._done[group].set()
+
+_current_schedule: ContextVar[Optional[StepSchedule]] = ContextVar("tool_step_schedule", default=None)
+
+# ---------------------------------------------
+# Executor
+# ---------------------------------------------
+class ParallelToolExecutor(AgentExecutor):
+    """
+    AgentExecutor whose async runs schedule the tool calls of each step with
+    StepSchedule instead of starting them all at once: read-only calls run
+    concurrently under a cap and a per-tool timeout, writes stay ordered.
+    Wall time saved per step is added to `parallel_stats` and sent as a
+    "tool_step" custom event.
+    """
+
+    read_only_tools: FrozenSet[str] = frozenset()
+    max_parallel_tools: int = AGENT_PARALLEL_TOOLS
+    tool_timeout_seconds: float = AGENT_TOOL_TIMEOUT_SECONDS
+    tool_timeouts: Dict[str, float] = TOOL_TIMEOUTS
+
+    async def _aiter_next_step(self, name_to_tool_map, color_mapping, inputs, intermediate_steps, run_manager=None):
+        schedule = StepSchedule(self.read_only_tools, self.max_parallel_tools)
+        token = _current_schedule.set(schedule)
+        try:
+            async for item in super()._aiter_next_step(
+                name_to_tool_map, color_mapping, inputs, intermediate_steps, run_manager
+            ):
+                if isinstance(item, AgentAction):
+                    schedule.actions.append(item)  # Planned; runs once the step yields its results
+                yield item
+        finally:
+            _current_schedule.reset(token)
+
+        if schedule.durations:
+            await self._report_step(schedule, run_manager)
+
+    async def _aperform_agent_action(self, name_to_tool_map, color_mapping, agent_action, run_manager=None):
+        schedule = _current_schedule.get()
+
+        async def perform():
+            with span(f"tool {agent_action.tool}", kind="tool", input=agent_action.tool_input):
+                return await AgentExecutor._aperform_agent_action(
+                    self, name_to_tool_map, color_mapping, agent_action, run_manager
+                )
+
+        if schedule is None or not any(planned is agent_action for planned in schedule.actions):
+            return await perform()
+        timeout = self.tool_timeouts.get(agent_action.tool, self.tool_timeout_seconds)
+        return await schedule.run(agent_action, perform, timeout)
+
+    async def _report_step(self, schedule: StepSchedule, run_manager):
+        wall = schedule.finished - schedule.started
+        sequential = sum(schedule.durations)
+        parallel_stats.record(len(schedule.durations), wall, sequential, schedule.timeouts)
+        if len(schedule.durations) < 2:
+            return
+
+        tools = [action.tool for action in schedule.actions]
+        try:
+            await adispatch_custom_event(
+                "tool_step",
+                {"tools": tools, "wall_seconds": round(wall, 3), "saved_seconds": round(sequential - wall, 3)},
+                config={"callbacks": run_manager.get_child() if run_manager else None}
+            )
+        except RuntimeError:
+            pass  # Called outside a traced run
@@ -0,0 +1,70 @@
+# presence_api.py
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel
+from typing import List, Optional
+from collections import Counter
+from graph_tools.presence_service import get_presences, get_team_member_ids, subscribe, handle_notifications
+
+# Initialize API router
+router = APIRouter()
+
+# ---------------------------------------------
+# Pydantic Model: Batch presence request
+# ---------------------------------------------
+class PresenceRequest(BaseModel):
+    user_ids: List[str] = []
+    team_id: Optional[str] = None
+    max_age: Optional[int] = None   # Seconds; 0 bypasses the cache
+    subscribe: bool = False         # Keep these users current via change notifications
+
+# ---------------------------------------------
+# Endpoint: Presence for many users in one call
+# ---------------------------------------------
+@router.post("/presence", summary="Get presence for many users or a whole Team")
+async def batch_presence(request: PresenceRequest):
+    """
+    Return availability and activity for a list of users and/or Team members.
+
+    Up to 650 users are resolved per Graph request and results are cached
+    briefly, so checking a 100-person team costs at most one Graph call.
+
+    Returns:
+        dict: Presences, a count per availability state, and any subscription IDs.
+    """
+    ids = list(request.user_ids)
+    if request.team_id:
+        ids += get_team_member_ids(request.team_id)
+    if not ids:
+        raise HTTPException(status_code=400, detail="Provide user_ids or team_id.")
+
+    try:
+        presences = get_presences(ids, request.max_age)
+        subscriptions = subscribe(ids) if request.subscribe else []
+    except RuntimeError as e:
+        raise HTTPException(status_code=502, detail=str(e))
+
+    return {
+        "presences": list(presences.values()),
+        "summary": dict(Counter(p["availability"] for p in presences.values())),
+        "subscriptions": subscriptions
+    }
+
+# ---------------------------------------------
+# Endpoint: Graph change notification webhook
+# ---------------------------------------------
+@router.post("/presence/notifications", summary="Microsoft Graph presence change notifications")
+async def presence_notifications(request: Request, validationToken: Optional[str] = None):
+    """
+    Receive presence change notifications from Microsoft Graph.
+
+    Answers the subscription validation handshake and invalidates cached
+    presence for users reported as changed.
+    """
+    if validationToken:
+        return PlainTextResponse(validationToken)
+
+    body = await request.json()
+    updated = handle_notifications(body.get("value", []))
+    return PlainTextResponse(status_code=202, content=f"{updated} updated")
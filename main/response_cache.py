@@ -0,0 +1,185 @@
+# response_cache.py
+
+import os
+import re
+import math
+import time
+import zlib
+import threading
+from collections import OrderedDict
+from datetime import date
+from typing import Dict, Optional
+
+from models import AgentResult
+from intent_router import WRITE_CUES
+from graph_tools import data_versions
+
+# ---------------------------------------------
+# Cache configuration
+# ---------------------------------------------
+# Graph data can also change outside this app (new mail, meetings booked by
+# others), so entries expire after a TTL even if no local write bumps them.
+RESPONSE_CACHE_TTL_SECONDS = int(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "300"))
+# Cosine similarity needed to reuse a near-duplicate query (0 disables similarity matching)
+RESPONSE_CACHE_SIMILARITY = float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0.9"))
+RESPONSE_CACHE_MAX_ENTRIES = 1000
+VECTOR_BUCKETS = 4096
+
+# Words that don't change what is being asked (read verbs, politeness, articles)
+FILLER_WORDS = {
+    "please", "kindly", "can", "could", "would", "you", "me", "i", "my", "the", "a", "an", "for", "to", "is", "are",
+    "there", "on", "in", "of", "do", "have", "show", "list", "display", "get", "tell", "what", "whats", "which", "any", "see"
+}
+# Different words for the same data
+SYNONYMS = {
+    "meeting": "calendar", "meetings": "calendar", "event": "calendar", "events": "calendar", "agenda": "calendar",
+    "schedule": "calendar", "appointments": "calendar", "task": "tasks", "todo": "tasks", "todos": "tasks",
+    "inbox": "emails", "email": "emails", "mail": "emails", "mails": "emails"
+}
+# Words that change the answer even when the rest of the query is identical
+SALIENT_WORDS = {
+    "today", "tomorrow", "yesterday", "tonight", "week", "month", "morning", "afternoon", "evening",
+    "next", "last", "previous", "unread", "not", "no", "all", "monday", "tuesday", "wednesday",
+    "thursday", "friday", "saturday", "sunday"
+}
+
+# ---------------------------------------------
+# Query normalization + hashed n-gram vectors
+# ---------------------------------------------
+def normalize_query(text: str) -> str:
+    """Lower-case, drop punctuation, possessives and filler words, map synonyms."""
+    text = re.sub(r"['’]s\b|['’]", "", text.lower())
+    words = re.sub(r"[^\w\s@.-]", " ", text).split()
+    return " ".join(SYNONYMS.get(word, word) for word in words if word not in FILLER_WORDS)
+
+def text_vector(normalized: str) -> Dict[int, float]:
+    """Hash word unigrams and character trigrams into a sparse unit vector."""
+    features = normalized.split()
+    padded = f" {normalized} "
+    features += [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+    vector = {}
+    for feature in features:
+        bucket = zlib.crc32(feature.encode("utf-8")) % VECTOR_BUCKETS
+        vector[bucket] = vector.get(bucket, 0.0) + 1.0
+    norm = math.sqrt(sum(v * v for v in vector.values())) or 1.0
+    return {bucket: value / norm for bucket, value in vector.items()}
+
+def cosine_similarity(a: Dict[int, float], b: Dict[int, float]) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(value * b.get(bucket, 0.0) for bucket, value in a.items())
+
+def _salient(normalized: str) -> frozenset:
+    return frozenset(w for w in normalized.split() if w in SALIENT_WORDS or w.isdigit())
+
+# ---------------------------------------------
+# Response cache
+# ---------------------------------------------
+class ResponseCache:
+    """
+    Caches agent answers to read-only questions.
+
+    Entries are keyed on the session and the normalized query (plus today's
+    date, so "today" answers don't outlive the day): follow-ups like "show
+    them" only make sense within the conversation that asked them. Each entry
+    remembers the data-domain versions it was computed from; any Graph write
+    to one of those domains makes it stale. Near-duplicate queries can reuse
+    an entry via hashed n-gram similarity.
+    """
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"exact_hits": 0, "similar_hits": 0, "misses": 0, "stale": 0, "stored": 0, "skipped_writes": 0}
+
+    def is_cacheable_query(self, query: str) -> bool:
+        """Write intents are never served from (or stored in) the cache."""
+        if WRITE_CUES.search(query):
+            with self._lock:
+                self.stats["skipped_writes"] += 1
+            return False
+        return True
+
+    def _is_fresh(self, entry: Dict) -> bool:
+        return (
+            time.time() - entry["stored_at"] < RESPONSE_CACHE_TTL_SECONDS
+            and all(data_versions.version(domain) == version for domain, version in entry["versions"].items())
+        )
+
+    def lookup(self, query: str, session_id: str) -> Optional[AgentResult]:
+        """Return a cached answer for the query (or a near-duplicate) in this session, if still valid."""
+        normalized = normalize_query(query)
+        key = (session_id, date.today().isoformat(), normalized)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            hit = "exact_hits" if entry else None
+
+            if not entry and RESPONSE_CACHE_SIMILARITY > 0:
+                vector, salient = text_vector(normalized), _salient(normalized)
+                best, best_score = None, RESPONSE_CACHE_SIMILARITY
+                for candidate_key, candidate in self._entries.items():
+                    if candidate_key[:2] != key[:2] or candidate["salient"] != salient:
+                        continue
+                    score = cosine_similarity(vector, candidate["vector"])
+                    if score >= best_score:
+                        best, best_score = candidate_key, score
+                if best:
+                    key, entry, hit = best, self._entries[best], "similar_hits"
+
+            if not entry:
+                self.stats["misses"] += 1
+                return None
+            if not self._is_fresh(entry):
+                del self._entries[key]
+                self.stats["stale"] += 1
+                self.stats["misses"] += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.stats[hit] += 1
+            return entry["result"].model_copy()
+
+    def store(self, query: str, result: AgentResult, versions: Dict[str, int], session_id: str):
+        """
+        Cache an answer if every tool the turn ran was a read-only tool.
+
+        Args:
+            query (str): The user's query.
+            result (AgentResult): The answer to cache.
+            versions (dict): data_versions.snapshot() taken before the turn ran.
+            session_id (str): Session the answer belongs to.
+        """
+        tools = result.tools_called or []
+        normalized = normalize_query(query)
+        if not tools or not normalized:
+            return
+        if any(tool not in data_versions.READ_TOOL_DOMAINS for tool in tools):
+            # e.g. a directory lookup followed by a message send
+            with self._lock:
+                self.stats["skipped_writes"] += 1
+            return
+
+        domains = {data_versions.READ_TOOL_DOMAINS[tool] for tool in tools}
+        key = (session_id, date.today().isoformat(), normalized)
+        with self._lock:
+            self._entries[key] = {
+                "result": result,
+                "versions": {domain: versions.get(domain, 0) for domain in domains},
+                "stored_at": time.time(),
+                "vector": text_vector(normalized),
+                "salient": _salient(normalized)
+            }
+            self._entries.move_to_end(key)
+            self.stats["stored"] += 1
+            while len(self._entries) > RESPONSE_CACHE_MAX_ENTRIES:
+                self._entries.popitem(last=False)
+
+    def report(self) -> Dict:
+        with self._lock:
+            lookups = self.stats["exact_hits"] + self.stats["similar_hits"] + self.stats["misses"]
+            hits = self.stats["exact_hits"] + self.stats["similar_hits"]
+            return dict(self.stats, entries=len(self._entries), hit_rate=round(hits / lookups, 3) if lookups else None)
+
+response_cache = ResponseCache()
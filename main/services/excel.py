@@ -1,23 +1,17 @@
 # ✅ Necessary Imports
 import pandas as pd
-import os
 import datetime
 from datetime import timedelta, time
 import textwrap
 import difflib
 import base64
+import asyncio
 from pandasai import SmartDataframe
-from langchain_openai import AzureChatOpenAI
 import numpy as np
+from llm_config import get_llm
 
-# ✅ Load Azure OpenAI LLM configuration
-llm = AzureChatOpenAI(
-    azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
-    azure_deployment=os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME"),
-    api_version=os.getenv("AZURE_OPENAI_API_VERSION"),
-    openai_api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-    temperature=0.7,  # Balanced creativity + reliability
-)
+# ✅ Shared Azure OpenAI client (pooled connections + rate limits)
+llm = get_llm(temperature=0.7)  # Balanced creativity + reliability
 
 # ------------------------------------------------------------
 # ✅ Query Enhancement Logic — Auto-extends user intent
@@ -120,8 +114,8 @@ async def ask_question_to_excel(file_path: str, question: str) -> dict:
         }
     )
 
-    # Ask the enhanced question to the LLM-powered dataframe
-    response = smart_df.chat(enhanced_question)
+    # Ask the enhanced question to the LLM-powered dataframe (blocking, so off the event loop)
+    response = await asyncio.to_thread(smart_df.chat, enhanced_question)
 
     # ✅ Normalize output for JSON responses
     if isinstance(response, dict):
@@ -1,17 +1,7 @@
-from langchain_openai import AzureChatOpenAI
-import os
-from dotenv import load_dotenv
+from llm_config import get_llm
 
-# ✅ Load environment variables from .env file
-load_dotenv()
-
-# ✅ Initialize the Azure OpenAI LLM client
-llm = AzureChatOpenAI(
-    azure_deployment=os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME"),
-    azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
-    api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-    api_version=os.getenv("AZURE_OPENAI_API_VERSION"),
-)
+# ✅ Shared Azure OpenAI client (pooled connections + rate limits; service default temperature)
+llm = get_llm(temperature=None)
 
 # -------------------------------------------------------
 # ✅ Main Function: Summarize or answer questions from text
@@ -0,0 +1,118 @@
+# session_pool.py
+
+import os
+import time
+import asyncio
+from collections import OrderedDict
+from typing import Callable, Optional
+from langchain_community.chat_message_histories import ChatMessageHistory
+from models import DialogState
+
+# ---------------------------------------------
+# Pool limits
+# ---------------------------------------------
+MAX_SESSIONS = int(os.getenv("AGENT_MAX_SESSIONS", "500"))
+SESSION_IDLE_SECONDS = int(os.getenv("AGENT_SESSION_IDLE_SECONDS", "3600"))
+
+# ---------------------------------------------
+# Per-session state
+# ---------------------------------------------
+class AgentSession:
+    """
+    Everything that belongs to one conversation: its chat memory (recent
+    turns plus a rolling summary of older ones), dialog state (pending
+    action), token usage and the lock that serializes its turns. Shared, expensive parts (LLM client, tools,
+    prompt, executor) live outside the session.
+    """
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.memory = ChatMessageHistory(session_id=session_id)
+        self.dialog = DialogState()
+        self.summary = ""
+        self.unsummarized = []  # Lines folded out of memory, not yet in the summary
+        self.summary_task = None
+        self.token_usage = {}  # stage -> {"calls", "prompt_tokens", "completion_tokens"}
+        self.version = 0  # Bumped on every save; tells stored state from stale copies
+        self.lock = asyncio.Lock()
+        self.last_used = time.time()
+
+    def touch(self):
+        self.last_used = time.time()
+
+# ---------------------------------------------
+# Pool: lazy creation + LRU / idle eviction
+# ---------------------------------------------
+class SessionPool:
+    """
+    Lazily creates sessions and evicts the least recently used ones once the
+    pool is full or a session has been idle too long. Sessions that are in
+    the middle of a turn are never evicted.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[str], AgentSession] = AgentSession,
+        max_sessions: int = MAX_SESSIONS,
+        idle_seconds: int = SESSION_IDLE_SECONDS
+    ):
+        self.factory = factory
+        self.max_sessions = max_sessions
+        self.idle_seconds = idle_seconds
+        self._sessions = OrderedDict()
+
+    def get(self, session_id: str) -> AgentSession:
+        """Return the session, creating it on first use."""
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = self.factory(session_id)
+            self._sessions[session_id] = session
+            self._evict()
+        else:
+            self._sessions.move_to_end(session_id)
+        session.touch()
+        return session
+
+    def peek(self, session_id: str) -> Optional[AgentSession]:
+        """Return the session if it is loaded, without creating or touching it."""
+        return self._sessions.get(session_id)
+
+    def drop(self, session_id: str):
+        self._sessions.pop(session_id, None)
+
+    def _evict(self):
+        cutoff = time.time() - self.idle_seconds
+        for session_id in list(self._sessions):
+            session = self._sessions[session_id]
+            over_capacity = len(self._sessions) > self.max_sessions
+            if not over_capacity and session.last_used >= cutoff:
+                break
+            if not session.lock.locked():
+                self._on_evict(session)
+                del self._sessions[session_id]
+
+    def _on_evict(self, session: AgentSession):
+        """Hook for subclasses that persist sessions before dropping them."""
+
+    async def _before_turn(self, session: AgentSession):
+        """Hook for subclasses that load shared session state before a turn."""
+
+    def save(self, session: AgentSession):
+        """Hook for subclasses that persist a session after it changed."""
+
+    def __len__(self):
+        return len(self._sessions)
+
+    async def run(self, session_id: str, turn: Callable):
+        """
+        Run `turn(session)` while holding the session's lock, so turns of one
+        session are serialized while different sessions run in parallel.
+        """
+        session = self.get(session_id)
+        async with session.lock:
+            session.touch()
+            await self._before_turn(session)
+            try:
+                return await turn(session)
+            finally:
+                self.save(session)
@@ -0,0 +1,317 @@
+# session_store.py
+
+import os
+import json
+import time
+import zlib
+import asyncio
+import atexit
+import threading
+from typing import Dict, Optional
+from langchain_core.messages import AIMessage, HumanMessage
+
+from graph_tools.local_db import open_db
+from models import DialogState
+from session_pool import AgentSession, SessionPool
+
+# ---------------------------------------------
+# Backend configuration
+# ---------------------------------------------
+# "sqlite" (default) shares sessions between worker processes on one host,
+# "redis" between hosts, "memory" keeps them in this process only.
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "sqlite").lower()
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", "sessions.db")
+SESSION_REDIS_URL = os.getenv("SESSION_REDIS_URL", "redis://localhost:6379/0")
+# Stored sessions not written for this long are removed (0 keeps them forever)
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", "604800"))
+# How often the write-behind thread flushes changed sessions
+SESSION_FLUSH_INTERVAL = float(os.getenv("SESSION_FLUSH_INTERVAL", "0.5"))
+
+SESSION_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+# ---------------------------------------------
+# Backends: key -> compressed blob
+# ---------------------------------------------
+class SessionBackend:
+    """
+    Storage interface for session blobs. Implement these three methods to
+    keep sessions in another key-value store.
+    """
+
+    def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def put_many(self, items: Dict[str, bytes]):
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+class MemoryBackend(SessionBackend):
+    """Process-local backend (single worker, nothing survives a restart)."""
+
+    def __init__(self):
+        self._items = {}
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self._items.get(key)
+
+    def put_many(self, items: Dict[str, bytes]):
+        self._items.update(items)
+
+    def delete(self, key: str):
+        self._items.pop(key, None)
+
+class SQLiteBackend(SessionBackend):
+    """
+    Sessions in a local SQLite file. WAL mode lets every worker process on
+    the host read while one writes.
+    """
+
+    def __init__(self, path: str = SESSION_DB_PATH, ttl_seconds: int = SESSION_TTL_SECONDS):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self._last_purge = 0.0
+
+    def _db(self):
+        return open_db(self.path, SESSION_SCHEMA)
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._db() as conn:
+            row = conn.execute("SELECT value FROM sessions WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row else None
+
+    def put_many(self, items: Dict[str, bytes]):
+        now = time.time()
+        with self._db() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO sessions (key, value, updated_at) VALUES (?, ?, ?)",
+                [(key, value, now) for key, value in items.items()]
+            )
+            if self.ttl_seconds and now - self._last_purge > 3600:
+                conn.execute("DELETE FROM sessions WHERE updated_at < ?", (now - self.ttl_seconds,))
+                self._last_purge = now
+
+    def delete(self, key: str):
+        with self._db() as conn:
+            conn.execute("DELETE FROM sessions WHERE key = ?", (key,))
+
+class RedisBackend(SessionBackend):
+    """Sessions in Redis (or any server speaking its protocol), for several hosts."""
+
+    def __init__(self, url: str = SESSION_REDIS_URL, ttl_seconds: int = SESSION_TTL_SECONDS, prefix: str = "donna:"):
+        import redis  # Only needed when SESSION_BACKEND=redis
+        self.client = redis.Redis.from_url(url)
+        self.ttl_seconds = ttl_seconds
+        self.prefix = prefix
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(self.prefix + key)
+
+    def put_many(self, items: Dict[str, bytes]):
+        pipeline = self.client.pipeline()
+        for key, value in items.items():
+            pipeline.set(self.prefix + key, value, ex=self.ttl_seconds or None)
+        pipeline.execute()
+
+    def delete(self, key: str):
+        self.client.delete(self.prefix + key)
+
+def create_backend(name: str = SESSION_BACKEND) -> SessionBackend:
+    if name == "memory":
+        return MemoryBackend()
+    if name == "redis":
+        return RedisBackend()
+    return SQLiteBackend()
+
+# ---------------------------------------------
+# Compact serialization
+# ---------------------------------------------
+def encode(record: Dict) -> bytes:
+    return zlib.compress(json.dumps(record, separators=(",", ":"), ensure_ascii=False).encode("utf-8"))
+
+def decode(blob: bytes) -> Dict:
+    return json.loads(zlib.decompress(blob).decode("utf-8"))
+
+# ---------------------------------------------
+# Session store with write-behind
+# ---------------------------------------------
+class SessionStore:
+    """
+    Reads sessions from a backend and writes them behind the request: put()
+    only queues the encoded blob, and a background thread writes whatever
+    changed every SESSION_FLUSH_INTERVAL seconds in one batch. Reads see this
+    process's queued writes first. Writes are last-writer-wins, so route a
+    conversation's concurrent requests to one worker (the per-session lock
+    only serializes turns within a process).
+    """
+
+    def __init__(self, backend: SessionBackend, flush_interval: float = SESSION_FLUSH_INTERVAL):
+        self.backend = backend
+        self.flush_interval = flush_interval
+        self._pending = {}  # key -> blob waiting to be written
+        self._writing = {}  # batch currently being written
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self.stats = {"reads": 0, "queued": 0, "coalesced": 0, "written": 0, "flushes": 0, "errors": 0, "bytes_written": 0}
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            blob = self._pending.get(key) or self._writing.get(key)
+            self.stats["reads"] += 1
+        if blob is None:
+            try:
+                blob = self.backend.get(key)
+            except Exception as e:
+                print(f"❌ [DEBUG] Session read failed for {key}: {e}")
+                self.stats["errors"] += 1
+                return None
+        return decode(blob) if blob is not None else None
+
+    def put(self, key: str, record: Dict):
+        """Queue a record for writing; returns without touching the backend."""
+        blob = encode(record)
+        with self._lock:
+            if key in self._pending:
+                self.stats["coalesced"] += 1
+            self._pending[key] = blob
+            self.stats["queued"] += 1
+        self._ensure_thread()
+
+    def delete(self, key: str):
+        with self._lock:
+            self._pending.pop(key, None)
+        self.backend.delete(key)
+
+    def flush(self):
+        """Write all queued records now (also runs at exit)."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+                self._writing = batch
+            if not batch:
+                return
+            try:
+                self.backend.put_many(batch)
+            except Exception as e:
+                print(f"❌ [DEBUG] Session write failed, will retry: {e}")
+                with self._lock:
+                    self.stats["errors"] += 1
+                    # Keep newer records queued meanwhile; retry the rest
+                    for key, blob in batch.items():
+                        self._pending.setdefault(key, blob)
+                    self._writing = {}
+                return
+            with self._lock:
+                self._writing = {}
+                self.stats["flushes"] += 1
+                self.stats["written"] += len(batch)
+                self.stats["bytes_written"] += sum(len(blob) for blob in batch.values())
+
+    def _ensure_thread(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._flush_loop, name="session-writer", daemon=True)
+                    self._thread.start()
+                    atexit.register(self.flush)
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def report(self) -> Dict:
+        with self._lock:
+            return dict(self.stats, backend=type(self.backend).__name__, pending=len(self._pending))
+
+session_store = SessionStore(create_backend())
+
+# ---------------------------------------------
+# Agent sessions: memory, summary, dialog state
+# ---------------------------------------------
+def _agent_key(session_id: str) -> str:
+    return f"agent:{session_id}"
+
+def dump_agent_session(session) -> Dict:
+    return {
+        "v": session.version,
+        "messages": [[m.type, m.content] for m in session.memory.messages if m.type in ("human", "ai")],
+        "summary": session.summary,
+        "unsummarized": session.unsummarized,
+        "dialog": session.dialog.model_dump(exclude_none=True),
+        "usage": session.token_usage
+    }
+
+def load_agent_session(session, record: Dict):
+    session.version = record.get("v", 0)
+    session.memory.messages = [
+        HumanMessage(content=content) if kind == "human" else AIMessage(content=content)
+        for kind, content in record.get("messages", [])
+    ]
+    session.summary = record.get("summary", "")
+    session.unsummarized = record.get("unsummarized", [])
+    session.dialog = DialogState.model_validate(record.get("dialog", {}))
+    session.token_usage = record.get("usage", {})
+
+async def restore_agent_session(session) -> bool:
+    """
+    Load the stored state of a session if it is newer than what this process
+    holds (another worker may have served the last turn). The store is read
+    in a worker thread, off the event loop.
+
+    Returns:
+        bool: True if the session was (re)loaded.
+    """
+    record = await asyncio.to_thread(session_store.get, _agent_key(session.session_id))
+    if record is None or record.get("v", 0) <= session.version:
+        return False
+    load_agent_session(session, record)
+    return True
+
+def save_agent_session(session):
+    """Queue the session's state for writing (write-behind)."""
+    session.version += 1
+    session_store.put(_agent_key(session.session_id), dump_agent_session(session))
+
+# ---------------------------------------------
+# Document sessions (/upload, /chat)
+# ---------------------------------------------
+def get_document_session(session_id: str) -> Optional[Dict]:
+    return session_store.get(f"doc:{session_id}")
+
+def save_document_session(session_id: str, session: Dict):
+    session_store.put(f"doc:{session_id}", session)
+
+# ---------------------------------------------
+# Pool backed by the session store
+# ---------------------------------------------
+class PersistentSessionPool(SessionPool):
+    """
+    SessionPool whose sessions survive eviction and restarts and can be
+    served by any worker: state is reloaded before a turn when another
+    process has stored a newer version, and queued for writing after it.
+    """
+
+    async def _before_turn(self, session: AgentSession):
+        await restore_agent_session(session)
+
+    def save(self, session: AgentSession):
+        save_agent_session(session)
+
+    def peek(self, session_id: str) -> Optional[AgentSession]:
+        """Return the loaded session, or a detached copy of its stored state."""
+        session = super().peek(session_id)
+        if session is None:
+            record = session_store.get(_agent_key(session_id))
+            if record is not None:
+                session = self.factory(session_id)
+                load_agent_session(session, record)
+        return session
@@ -0,0 +1,369 @@
+# slot_extractor.py
+
+import os
+import re
+import threading
+from datetime import date, datetime, time, timedelta
+from zoneinfo import ZoneInfo
+from typing import Dict, List, Optional, Tuple
+
+from models import EventSlots
+from graph_tools.contact_directory import contact_directory
+from graph_tools.events import DEFAULT_TIMEZONE
+
+# ---------------------------------------------
+# Extraction settings
+# ---------------------------------------------
+# Extractions scoring below this are left to the LLM
+EVENT_SLOT_CONFIDENCE = float(os.getenv("EVENT_SLOT_CONFIDENCE", "0.75"))
+# Length of events whose request gives neither an end time nor a duration
+EVENT_DEFAULT_MINUTES = int(os.getenv("EVENT_DEFAULT_MINUTES", "30"))
+UNSURE = 0.4
+
+# ---------------------------------------------
+# Patterns
+# ---------------------------------------------
+EVENT_NOUNS = r"meeting|call|event|appointment|sync|1:1|one-on-one|catch-?up|lunch|coffee|review|session|interview|demo|standup|huddle"
+# The event noun must be the object of the verb: "book a quick call", "schedule the
+# budget review", not "create a task to review ..."
+EVENT_OBJECT_MODIFIER = r"(?:(?!(?:to|for|with|about|on|at|in|and|that|which)\b)[\w:'-]+\s+){0,3}"
+EVENT_CUE = re.compile(
+    rf"\b(schedule|book|set up|setup|arrange|organi[sz]e|plan|add|create|put)\s+(?:(?:a|an|the|my|our|another)\s+)?"
+    rf"{EVENT_OBJECT_MODIFIER}(?P<noun>{EVENT_NOUNS})\b|\bmeet (with|up)\b",
+    re.IGNORECASE
+)
+# Tasks and reminders go to the task branch, whatever else they mention
+TASK_CUE = re.compile(r"\b(tasks?|to-?dos?|reminders?|remind)\b", re.IGNORECASE)
+# Requests the extractor doesn't handle: changes to existing events, recurrence,
+# relative or vague times
+NOT_NEW_EVENT = re.compile(r"\b(cancel|delete|remove|move|reschedule|postpone|update|change|shift|push)\b", re.IGNORECASE)
+RECURRING = re.compile(r"\b(every|each|daily|weekly|monthly|recurring|bi-?weekly)\b", re.IGNORECASE)
+VAGUE_TIME = re.compile(
+    r"\b(next week|this week|next month|weekend|sometime|some time|later|soon|asap|whenever|"
+    r"end of (the )?(day|week|month)|eod|eow|(before|after) (lunch|work)|morning|afternoon|evening|tonight|midnight|"
+    r"in (an? |\d+ )(minutes?|hours?|days?|weeks?))\b",
+    re.IGNORECASE
+)
+
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+MONTHS = ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"]
+MONTH_NAME = r"(jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?|sep(?:t(?:ember)?)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)"
+
+RELATIVE_DAY = re.compile(r"\b(day after tomorrow|tomorrow|today)\b", re.IGNORECASE)
+WEEKDAY = re.compile(r"\b(?:(next|this|on|coming)\s+)?(mon|tue|wed|thu|fri|sat|sun)[a-z]*\b", re.IGNORECASE)
+ISO_DATE = re.compile(r"\b(\d{4})-(\d{2})-(\d{2})\b")
+DAY_MONTH = re.compile(rf"\b(\d{{1,2}})(?:st|nd|rd|th)?\s+(?:of\s+)?{MONTH_NAME}\b(?:,?\s+(\d{{4}}))?", re.IGNORECASE)
+MONTH_DAY = re.compile(rf"\b{MONTH_NAME}\s+(\d{{1,2}})(?:st|nd|rd|th)?\b(?:,?\s+(\d{{4}}))?", re.IGNORECASE)
+
+CLOCK = r"(\d{1,2})(?::([0-5]\d))?\s*(?:([ap])\.?m\b\.?)?"
+TIME_RANGE = re.compile(rf"\b(?:from\s+|between\s+)?{CLOCK}\s*(?:-|–|to|until|till|and)\s*{CLOCK}", re.IGNORECASE)
+TIME_OF_DAY = re.compile(r"\b(\d{1,2})(?::([0-5]\d))?\s*([ap])\.?m\b\.?|\b([01]?\d|2[0-3]):([0-5]\d)\b|\b(noon|midday)\b", re.IGNORECASE)
+BARE_HOUR = re.compile(r"\b(?:at|@)\s*(\d{1,2})(?::([0-5]\d))?\b(?!\s*(?:[ap]\.?m|%|min|hour|people|person))", re.IGNORECASE)
+DURATION = re.compile(
+    r"\bfor\s+(half an hour|an hour and a half|an? hour|(\d+(?:\.\d+)?)\s*(hours?|hrs?|h|minutes?|mins?|m))\b"
+    r"|\b(\d+)[- ](minute|min|hour)\b",
+    re.IGNORECASE
+)
+EMAIL = re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+")
+
+# Phrases that end an attendee list or a title
+STOP_WORDS = r"about|regarding|re:|to discuss|titled|called|named|on|at|from|for|by|tomorrow|today|next|this|between|in|with|and discuss"
+ATTENDEES = re.compile(
+    rf"\b(?:with|invite|inviting|including)\s+(?!(?:{STOP_WORDS})\b)(.+?)(?=\s+(?:{STOP_WORDS})\b|[.;!?]|$)",
+    re.IGNORECASE
+)
+TITLE = re.compile(
+    rf"\b(?:about|regarding|re:|to discuss|titled|called|named)\s+(.+?)(?=\s+(?:{STOP_WORDS})\b|[.;!?]|$)",
+    re.IGNORECASE
+)
+QUOTED = re.compile(r"[\"“'‘]([^\"”'’]{2,80})[\"”'’]")
+# Attendee words that don't name a contact
+NOT_A_NAME = re.compile(r"^(him|her|them|me|us|you|my team|the team|team|everyone|everybody|all|someone|people)$", re.IGNORECASE)
+
+# ---------------------------------------------
+# Stats: local extractions vs. LLM fallbacks
+# ---------------------------------------------
+class SlotStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.outcomes = {}  # "local" | "asked_for_time" | "fallback" -> turns
+
+    def record(self, outcome: str):
+        with self._lock:
+            self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+
+    def report(self) -> Dict:
+        with self._lock:
+            total = sum(self.outcomes.values())
+            local = total - self.outcomes.get("fallback", 0)
+            return {"turns": total, **self.outcomes, "local_rate": round(local / total, 3) if total else None}
+
+slot_stats = SlotStats()
+
+# ---------------------------------------------
+# Temporal parsing
+# ---------------------------------------------
+def _to_24h(hour: int, minute: int, meridiem: Optional[str]) -> Optional[time]:
+    if meridiem:
+        if not 1 <= hour <= 12:
+            return None
+        hour = hour % 12 + (12 if meridiem.lower() == "p" else 0)
+    if not 0 <= hour <= 23:
+        return None
+    return time(hour, minute)
+
+def _business_hour(hour: int, minute: int) -> Optional[time]:
+    """Read "at 3" as 3 PM and "at 9" as 9 AM (working hours)."""
+    if 1 <= hour <= 7:
+        hour += 12
+    return _to_24h(hour, minute, None)
+
+def _parse_dates(text: str, today: date) -> Tuple[List[date], float, List[Tuple[int, int]]]:
+    """Dates mentioned in the text, the confidence they leave, and the spans they used."""
+    dates, confidence, spans = [], 1.0, []
+
+    for match in RELATIVE_DAY.finditer(text):
+        offset = {"today": 0, "tomorrow": 1, "day after tomorrow": 2}[match.group(1).lower()]
+        dates.append(today + timedelta(days=offset))
+        spans.append(match.span())
+
+    for match in WEEKDAY.finditer(text):
+        qualifier, prefix = (match.group(1) or "").lower(), match.group(2).lower()
+        weekday = next(i for i, name in enumerate(WEEKDAYS) if name.startswith(prefix))
+        if not WEEKDAYS[weekday].startswith(match.group(0).split()[-1].lower()):
+            continue  # "sunny", "monitor", ...
+        ahead = (weekday - today.weekday()) % 7 or (0 if qualifier == "this" else 7)
+        if qualifier == "next":
+            confidence = min(confidence, 0.7)  # The coming one, or the week after?
+        dates.append(today + timedelta(days=ahead))
+        spans.append(match.span())
+
+    for match in ISO_DATE.finditer(text):
+        try:
+            dates.append(date(int(match.group(1)), int(match.group(2)), int(match.group(3))))
+            spans.append(match.span())
+        except ValueError:
+            confidence = UNSURE
+
+    for pattern, day_group, month_group in ((DAY_MONTH, 1, 2), (MONTH_DAY, 2, 1)):
+        for match in pattern.finditer(text):
+            month = MONTHS.index(match.group(month_group)[:3].lower()) + 1
+            year = int(match.group(3)) if match.group(3) else today.year
+            try:
+                mentioned = date(year, month, int(match.group(day_group)))
+            except ValueError:
+                confidence = UNSURE
+                continue
+            if mentioned < today and not match.group(3):
+                mentioned = mentioned.replace(year=year + 1)
+            dates.append(mentioned)
+            spans.append(match.span())
+
+    if len(set(dates)) > 1:
+        confidence = UNSURE
+    return dates, confidence, spans
+
+def _parse_times(text: str) -> Tuple[Optional[time], Optional[time], float, List[Tuple[int, int]]]:
+    """Start and (if given) end time of day, the confidence they leave, and the spans they used."""
+    # "2 to 3" alone could be anything; a range needs AM/PM or hh:mm times
+    match = next((m for m in TIME_RANGE.finditer(text) if m.group(3) or m.group(6) or (m.group(2) and m.group(5))), None)
+    if match:
+        start_hour, start_minute, start_meridiem, end_hour, end_minute, end_meridiem = match.groups()
+        start = _to_24h(int(start_hour), int(start_minute or 0), start_meridiem or end_meridiem)  # "3-4 pm": both PM
+        end = _to_24h(int(end_hour), int(end_minute or 0), end_meridiem or start_meridiem)
+        if start and end and start >= end and not start_meridiem and end_meridiem:
+            start = _to_24h(int(start_hour), int(start_minute or 0), "a")  # "11-1 pm"
+        if start is None or end is None or start >= end:
+            return None, None, UNSURE, [match.span()]
+        return start, end, 1.0, [match.span()]
+
+    matches = list(TIME_OF_DAY.finditer(text))
+    if len(matches) > 1:
+        return None, None, UNSURE, [m.span() for m in matches]
+    if matches:
+        match = matches[0]
+        if match.group(6):
+            start = time(12, 0)
+        elif match.group(3):
+            start = _to_24h(int(match.group(1)), int(match.group(2) or 0), match.group(3))
+        else:
+            start = _to_24h(int(match.group(4)), int(match.group(5)), None)
+        return start, None, 1.0 if start else UNSURE, [match.span()]
+
+    match = BARE_HOUR.search(text)
+    if match:
+        start = _business_hour(int(match.group(1)), int(match.group(2) or 0))
+        return start, None, 0.8 if start else UNSURE, [match.span()]
+    return None, None, 1.0, []
+
+def _parse_duration(text: str) -> Tuple[Optional[int], List[Tuple[int, int]]]:
+    match = DURATION.search(text)
+    if not match:
+        return None, []
+    phrase = match.group(1)
+    if phrase:
+        phrase = phrase.lower()
+        if phrase == "half an hour":
+            return 30, [match.span()]
+        if phrase == "an hour and a half":
+            return 90, [match.span()]
+        if phrase in ("an hour", "a hour"):
+            return 60, [match.span()]
+        amount, unit = float(match.group(2)), match.group(3).lower()
+    else:
+        amount, unit = float(match.group(4)), match.group(5).lower()
+    minutes = amount * 60 if unit.startswith("h") else amount
+    return int(minutes), [match.span()]
+
+# ---------------------------------------------
+# Title and attendees
+# ---------------------------------------------
+def _mask(text: str, spans: List[Tuple[int, int]]) -> str:
+    """Blank out spans already understood (same length, so later spans stay valid)."""
+    for begin, end in spans:
+        text = text[:begin] + " " * (end - begin) + text[end:]
+    return text
+
+def _clean_phrase(phrase: str) -> str:
+    phrase = re.sub(r"^(the|a|an|our|my)\s+", "", phrase.strip(" ,.:;!?\"'“”‘’"), flags=re.IGNORECASE)
+    return phrase[:1].upper() + phrase[1:]
+
+def _resolve_attendees(text: str) -> Tuple[List[str], List[str]]:
+    """Email addresses of the people the request names, and names that didn't resolve."""
+    emails, unresolved, names = [], [], []
+    for address in EMAIL.findall(text):
+        emails.append(address)
+
+    match = ATTENDEES.search(re.sub(r"\s+", " ", EMAIL.sub(" ", text)))
+    if match:
+        names = [name.strip(" ,.") for name in re.split(r"\s*(?:,|\band\b|&)\s*", match.group(1))]
+    for name in filter(None, names):
+        if NOT_A_NAME.match(name):
+            unresolved.append(name)
+            continue
+        contact = contact_directory.resolve_recipient(name)
+        if contact:
+            emails.append(contact["email"])
+        else:
+            unresolved.append(name)
+    return list(dict.fromkeys(emails)), unresolved
+
+def _title(text: str, noun: Optional[str], attendees: List[str]) -> str:
+    quoted = QUOTED.search(text)
+    if quoted:
+        return _clean_phrase(quoted.group(1))
+    match = TITLE.search(text)
+    if match and _clean_phrase(match.group(1)):
+        return _clean_phrase(match.group(1))
+    kind = (noun or "meeting").capitalize()
+    if attendees:
+        names = [(contact_directory.find_by_email(email) or {"name": email.split("@")[0]})["name"] for email in attendees]
+        return f"{kind} with {', '.join(names)}"
+    return kind
+
+# ---------------------------------------------
+# Extractor
+# ---------------------------------------------
+def extract_event_slots(
+    text: str,
+    previous: Optional[EventSlots] = None,
+    now: Optional[datetime] = None
+) -> Tuple[EventSlots, float]:
+    """
+    Read event-creation slots from a request with rules: relative and
+    absolute dates, clock times, ranges and durations, plus attendee names
+    looked up in the contact directory. No LLM or network call.
+
+    Args:
+        text (str): e.g. "Schedule a call with Alex tomorrow 3 PM for 30 minutes".
+        previous (EventSlots, optional): Slots collected on an earlier turn;
+            `text` is then the answer to a follow-up question (e.g. "4 PM").
+        now (datetime, optional): Reference time (naive, DEFAULT_TIMEZONE).
+
+    Returns:
+        tuple: (EventSlots, confidence between 0 and 1). Confidence 0 means
+        the text isn't a request for a new event; below EVENT_SLOT_CONFIDENCE
+        the request should go to the LLM. Start and end are naive ISO times
+        in DEFAULT_TIMEZONE; missing_fields lists what is still needed.
+    """
+    now = now or datetime.now(ZoneInfo(DEFAULT_TIMEZONE)).replace(tzinfo=None)
+    cue = EVENT_CUE.search(text)
+    if previous is None and not cue:
+        return EventSlots(), 0.0
+    if NOT_NEW_EVENT.search(text) or TASK_CUE.search(text):
+        return EventSlots(), 0.0
+
+    confidence = 1.0
+    if RECURRING.search(text) or VAGUE_TIME.search(text):
+        confidence = UNSURE
+
+    # Each parser sees the text with what earlier ones understood blanked out
+    dates, date_confidence, spans = _parse_dates(text, now.date())
+    rest = _mask(text, spans)
+    start_time, end_time, time_confidence, spans = _parse_times(rest)
+    rest = _mask(rest, spans)
+    minutes, spans = _parse_duration(rest)
+    rest = _mask(rest, spans)
+    attendees, unresolved = _resolve_attendees(text)
+    confidence = min(confidence, date_confidence, time_confidence)
+
+    # Numbers the rules didn't account for ("3ish", "15th", room numbers, ...) may be times
+    for pattern in (EMAIL, QUOTED, TITLE, re.compile(rf"\b(?:{EVENT_NOUNS})\b", re.IGNORECASE)):
+        rest = pattern.sub(" ", rest)
+    if re.search(r"\d", rest):
+        confidence = min(confidence, UNSURE)
+
+    if previous is not None:
+        attendees = list(dict.fromkeys((previous.attendees or []) + attendees))
+        minutes = minutes or previous.duration_minutes
+        title = previous.title
+    else:
+        title = _title(text, cue.group("noun") if cue else None, attendees)
+
+    slots = EventSlots(
+        intent="create_event",
+        title=title,
+        attendees=attendees or None,
+        duration_minutes=minutes,
+        missing_fields=[]
+    )
+    if unresolved:
+        slots.missing_fields.append("attendees")
+        confidence = min(confidence, UNSURE)
+
+    if start_time is None:
+        if dates or previous is not None:
+            confidence = min(confidence, UNSURE)  # A day but no time, or no answer to "when?"
+        slots.missing_fields.append("start")
+        return slots, confidence
+
+    if not dates:
+        # A time alone means its next occurrence
+        day = now.date() if datetime.combine(now.date(), start_time) > now else now.date() + timedelta(days=1)
+        confidence = min(confidence, 0.9)
+    else:
+        day = dates[0]
+    start = datetime.combine(day, start_time)
+    if end_time is not None:
+        end = datetime.combine(day, end_time)
+    else:
+        end = start + timedelta(minutes=minutes or EVENT_DEFAULT_MINUTES)
+    if start <= now or end <= start:
+        confidence = min(confidence, UNSURE)
+
+    slots.start = start.isoformat(timespec="seconds")
+    slots.end = end.isoformat(timespec="seconds")
+    return slots, confidence
+
+def describe_event(slots: EventSlots, request: str) -> str:
+    """Agent instruction for creating the extracted event."""
+    attendees = ", ".join(slots.attendees) if slots.attendees else "none"
+    return (
+        f"Create a calendar event with add_calendar_event_with_availability_check.\n"
+        f"Subject: {slots.title}\n"
+        f"Start: {slots.start}\n"
+        f"End: {slots.end}\n"
+        f"Time zone: {DEFAULT_TIMEZONE}\n"
+        f"Attendees: {attendees}\n"
+        f"Original request: {request}"
+    )
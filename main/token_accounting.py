@@ -0,0 +1,121 @@
+# token_accounting.py
+
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+from langchain_core.callbacks import BaseCallbackHandler
+
+from graph_tools.tracing import start_span
+
+# ---------------------------------------------
+# Token counting
+# ---------------------------------------------
+_encoding = None
+_encoding_failed = False
+
+def count_tokens(text: str) -> int:
+    """
+    Count tokens with tiktoken (o200k_base). Falls back to a ~4 characters
+    per token estimate when the encoding can't be loaded (e.g. offline).
+    """
+    global _encoding, _encoding_failed
+    if not text:
+        return 0
+    if _encoding is None and not _encoding_failed:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("o200k_base")
+        except Exception as e:
+            print(f"❌ [DEBUG] tiktoken unavailable, estimating token counts: {e}")
+            _encoding_failed = True
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return max(1, len(text) // 4)
+
+# ---------------------------------------------
+# Per-stage accounting (global and per session)
+# ---------------------------------------------
+_current_stage: ContextVar[str] = ContextVar("token_stage", default="other")
+_current_usage: ContextVar[Optional[Dict]] = ContextVar("token_usage", default=None)
+
+_lock = threading.Lock()
+stage_totals = {}  # stage -> {"calls", "prompt_tokens", "completion_tokens"}
+
+def _add(usage: Dict, stage: str, prompt_tokens: int, completion_tokens: int):
+    entry = usage.setdefault(stage, {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0})
+    entry["calls"] += 1
+    entry["prompt_tokens"] += prompt_tokens
+    entry["completion_tokens"] += completion_tokens
+
+def record_tokens(prompt_tokens: int, completion_tokens: int, stage: Optional[str] = None):
+    """Add one LLM call to the current stage, globally and for the current session."""
+    stage = stage or _current_stage.get()
+    with _lock:
+        _add(stage_totals, stage, prompt_tokens, completion_tokens)
+        session_usage = _current_usage.get()
+        if session_usage is not None:
+            _add(session_usage, stage, prompt_tokens, completion_tokens)
+
+def set_stage(stage: str):
+    """Attribute LLM calls made from here on (in this context) to `stage`."""
+    _current_stage.set(stage)
+
+@contextmanager
+def usage_scope(session_usage: Dict, stage: str = "other"):
+    """Record LLM calls made inside the block into `session_usage` as well."""
+    usage_token = _current_usage.set(session_usage)
+    stage_token = _current_stage.set(stage)
+    try:
+        yield
+    finally:
+        _current_stage.reset(stage_token)
+        _current_usage.reset(usage_token)
+
+# ---------------------------------------------
+# Callback: Record usage of every LLM call
+# ---------------------------------------------
+class TokenUsageCallback(BaseCallbackHandler):
+    """
+    Records prompt/completion tokens of each LLM call under the current stage.
+    Uses the provider's reported usage and falls back to counting the prompt
+    and completion text (streamed calls don't always report usage). Each call
+    is also traced as an "llm" span carrying its token counts.
+    """
+
+    def __init__(self):
+        self._prompt_estimates = {}
+        self._spans = {}
+
+    def _start(self, run_id, prompt_tokens: int):
+        self._prompt_estimates[run_id] = prompt_tokens
+        llm_span = start_span("llm", kind="llm", stage=_current_stage.get())
+        if llm_span is not None:
+            self._spans[run_id] = llm_span
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._start(run_id, sum(count_tokens(str(m.content)) for batch in messages for m in batch))
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._start(run_id, sum(count_tokens(p) for p in prompts))
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        estimate = self._prompt_estimates.pop(run_id, 0)
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        prompt_tokens = usage.get("prompt_tokens") or estimate
+        completion_tokens = usage.get("completion_tokens") or sum(
+            count_tokens(generation.text) for generations in response.generations for generation in generations
+        )
+        record_tokens(prompt_tokens, completion_tokens)
+
+        llm_span = self._spans.pop(run_id, None)
+        if llm_span is not None:
+            llm_span.set(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens).end()
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._prompt_estimates.pop(run_id, None)
+        llm_span = self._spans.pop(run_id, None)
+        if llm_span is not None:
+            llm_span.end(error=error)
+
+token_usage_callback = TokenUsageCallback()
@@ -0,0 +1,139 @@
+# tool_memo.py
+
+import copy
+import json
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+from langchain_core.tools import StructuredTool
+from langchain_core.callbacks import adispatch_custom_event
+
+from graph_tools import data_versions
+from graph_tools.tracing import annotate
+
+# ---------------------------------------------
+# Turn-scoped cache of read-only tool results
+# ---------------------------------------------
+class ToolResultCache:
+    """
+    Results of read-only tool calls made during one agent turn, keyed on the
+    tool name and its (defaults-filled) arguments. An entry is reused only
+    while the Graph data domain it read is unchanged.
+    """
+
+    def __init__(self):
+        self._results = {}  # (tool, args_json) -> (domain version, result)
+        self.hits = []  # tool names served from cache, in call order
+        self.misses = 0
+
+    def get(self, key, domain: str):
+        entry = self._results.get(key)
+        if entry and entry[0] == data_versions.version(domain):
+            return copy.deepcopy(entry[1])
+        return None
+
+    def put(self, key, domain: str, version: int, result):
+        self._results[key] = (version, copy.deepcopy(result))
+
+    def clear(self):
+        self._results.clear()
+
+_current_cache: ContextVar[Optional[ToolResultCache]] = ContextVar("tool_result_cache", default=None)
+
+_stats_lock = threading.Lock()
+memo_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+def _count(name: str):
+    with _stats_lock:
+        memo_stats[name] += 1
+
+@contextmanager
+def turn_scope():
+    """Memoize read-only tool calls made inside this block (one agent turn)."""
+    cache = ToolResultCache()
+    token = _current_cache.set(cache)
+    try:
+        yield cache
+    finally:
+        _current_cache.reset(token)
+
+# ---------------------------------------------
+# Tool wrappers
+# ---------------------------------------------
+def _invoke(tool: StructuredTool, kwargs: Dict):
+    # The wrapper already reports the tool run; keep the inner call out of the trace
+    return tool.ainvoke(kwargs, config={"callbacks": []})
+
+def _cache_key(tool: StructuredTool, kwargs: Dict):
+    try:
+        arguments = tool.args_schema.model_validate(kwargs).model_dump()
+    except Exception:
+        arguments = kwargs
+    return tool.name, json.dumps(arguments, sort_keys=True, default=str)
+
+def _memoized_read_tool(tool: StructuredTool, domain: str) -> StructuredTool:
+    async def call(**kwargs):
+        cache = _current_cache.get()
+        if cache is None:
+            return await _invoke(tool, kwargs)
+
+        key = _cache_key(tool, kwargs)
+        cached = cache.get(key, domain)
+        if cached is not None:
+            cache.hits.append(tool.name)
+            _count("hits")
+            annotate(cached=True)
+            # Shows up in astream_events (and the /ask/stream trace) as a custom event
+            try:
+                await adispatch_custom_event("tool_cache_hit", {"tool": tool.name, "input": kwargs})
+            except RuntimeError:
+                pass  # Called outside a traced run
+            return cached
+
+        version = data_versions.version(domain)
+        result = await _invoke(tool, kwargs)
+        cache.misses += 1
+        _count("misses")
+        cache.put(key, domain, version, result)
+        return result
+
+    return StructuredTool.from_function(
+        coroutine=call,
+        name=tool.name,
+        description=tool.description,
+        args_schema=tool.args_schema
+    )
+
+def _invalidating_tool(tool: StructuredTool) -> StructuredTool:
+    async def call(**kwargs):
+        try:
+            return await _invoke(tool, kwargs)
+        finally:
+            cache = _current_cache.get()
+            if cache is not None:
+                cache.clear()
+                _count("invalidations")
+
+    return StructuredTool.from_function(
+        coroutine=call,
+        name=tool.name,
+        description=tool.description,
+        args_schema=tool.args_schema
+    )
+
+def memoize_tools(tools: List) -> List:
+    """
+    Wrap agent tools so read-only Graph tools are memoized within a turn and
+    every other Graph tool (a potential write) clears the turn's cache.
+    Tools that don't touch Graph (e.g. web search) are returned unchanged.
+    """
+    wrapped = []
+    for tool in tools:
+        if not isinstance(tool, StructuredTool):
+            wrapped.append(tool)
+        elif tool.name in data_versions.READ_TOOL_DOMAINS:
+            wrapped.append(_memoized_read_tool(tool, data_versions.READ_TOOL_DOMAINS[tool.name]))
+        else:
+            wrapped.append(_invalidating_tool(tool))
+    return wrapped
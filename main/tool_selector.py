@@ -0,0 +1,192 @@
+# tool_selector.py
+
+import re
+import json
+import threading
+from typing import Dict, List, Optional, Tuple
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from token_accounting import count_tokens
+
+# ---------------------------------------------
+# Tool groups: cues and dependencies
+# ---------------------------------------------
+# A group is bound to the agent when its cue matches the request. Groups
+# matched by nothing are left out, so their schemas aren't sent with every
+# agent LLM call. When no group matches ("Tell Alex I'm running late"), every
+# tool is bound: a wrong guess costs the turn, extra schemas only cost tokens.
+GROUP_CUES = {
+    "email": r"\b(e-?mails?|mails?|inbox|reply|forward|deliver(y|ed)|unread)\b",
+    "contacts": r"\b(contacts?|phone( number)?|address book)\b",
+    "users": r"\b(users?|profile|directory|employees?|colleagues?|accounts?|display name|who am i|onboard|offboard)\b",
+    "teams": r"\b(teams?|chats?|messages?|dm|ping|broadcast|channels?)\b",
+    "presence": r"\b(presence|status|busy|away|online|offline|do not disturb|dnd|available|availability)\b",
+    "calendar": r"\b(calendar|events?|meetings?|schedule|appointments?|agenda|reschedule|book|invite|availability|free (time|slots?))\b",
+    "tasks": r"\b(tasks?|to-?dos?|remind(er)?s?)\b",
+    "web": r"\b(search|web|internet|google|look up|news|weather|who (is|was))\b",
+}
+# Groups whose tools are typically needed alongside another group's
+GROUP_DEPENDENCIES = {
+    "email": ["contacts"],
+    "calendar": ["contacts"],
+    "teams": ["users"],
+    "presence": ["users"],
+}
+
+# ---------------------------------------------
+# Fixed evaluation set: request -> tool the agent must be able to call
+# ---------------------------------------------
+# The last block has no cue of any group, so it checks what happens when the
+# cues say nothing rather than restating them.
+TOOL_SELECTION_EVAL = [
+    ("Show my last 5 emails", "list_emails"),
+    ("Send an email to Priya about the budget review", "send_email"),
+    ("Was my mail to the finance team delivered?", "get_email_delivery_status"),
+    ("Reply to John's email saying I agree", "send_email"),
+    ("List my contacts", "get_user_contacts"),
+    ("Save Maria's phone number +44 20 7946 0958", "add_user_contact"),
+    ("Who am I signed in as?", "get_signed_in_user_profile"),
+    ("List all users in the organization", "list_all_users"),
+    ("Find colleagues named Alex in the directory", "search_directory_users"),
+    ("Create a new user account for Sam Lee", "create_new_user"),
+    ("Change Sam's display name to Samuel Lee", "update_user_display_name"),
+    ("Remove the user account of the intern", "delete_user"),
+    ("Which teams am I in?", "list_joined_teams"),
+    ("Join the Marketing team", "join_team"),
+    ("Message Ravi on Teams that I'm running late", "send_private_message_to_user"),
+    ("Broadcast a chat message to the sales team about the outage", "broadcast_private_message"),
+    ("What's my presence right now?", "get_user_presence"),
+    ("Set my status to busy", "set_user_presence"),
+    ("Is anyone in my team online?", "get_team_presence"),
+    ("What meetings do I have today?", "get_events"),
+    ("Schedule a meeting with Anna tomorrow at 3 PM", "add_calendar_event_with_availability_check"),
+    ("Cancel the design review event on Friday", "delete_calendar_event"),
+    ("Move my 1:1 with Tom to 4 PM", "update_calendar_event"),
+    ("Find a free slot next week for a call with the vendor", "find_available_meeting_times"),
+    ("Book an appointment with the dentist at 10 AM", "add_calendar_event_with_availability_check"),
+    ("What tasks are due today?", "list_tasks_today_tool"),
+    ("Show all my to-dos", "list_all_tasks_tool"),
+    ("Remind me to call the bank at 5 PM", "create_task"),
+    ("Delete the task about expense reports", "delete_task"),
+    ("Search the web for the latest Azure OpenAI pricing", "tavily_search_results_json"),
+    ("What's the weather in London?", "tavily_search_results_json"),
+    ("Who is the CEO of Microsoft?", "tavily_search_results_json"),
+    ("Brief me on today", "get_events"),
+    ("Tell Alex I'm running late", "send_private_message_to_user"),
+    ("Let Priya know the deck is ready", "send_email"),
+    ("What's Maria's number?", "get_user_contacts"),
+    ("Is Ravi around?", "get_user_presence"),
+    ("Put lunch with Sam on Thursday at noon", "add_calendar_event_with_availability_check"),
+    ("Add milk to my shopping list", "create_task"),
+    ("Who's the new hire in finance?", "search_directory_users"),
+]
+
+# ---------------------------------------------
+# Stats: schema tokens saved per agent LLM call
+# ---------------------------------------------
+class ToolSelectionStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.turns = 0
+        self.all_tools_turns = 0
+        self.agent_calls = 0
+        self.schema_tokens_sent = 0
+        self.schema_tokens_saved = 0
+        self.groups = {}  # group -> turns it was bound
+
+    def record(self, groups: Optional[Tuple[str, ...]], agent_calls: int, sent_tokens: int, saved_tokens: int):
+        with self._lock:
+            self.turns += 1
+            self.agent_calls += agent_calls
+            self.schema_tokens_sent += sent_tokens * agent_calls
+            self.schema_tokens_saved += saved_tokens * agent_calls
+            if groups is None:
+                self.all_tools_turns += 1
+            for group in groups or ():
+                self.groups[group] = self.groups.get(group, 0) + 1
+
+    def report(self) -> Dict:
+        with self._lock:
+            return {
+                "turns": self.turns,
+                "all_tools_turns": self.all_tools_turns,
+                "agent_llm_calls": self.agent_calls,
+                "schema_tokens_sent": self.schema_tokens_sent,
+                "schema_tokens_saved": self.schema_tokens_saved,
+                "groups": dict(self.groups),
+            }
+
+# ---------------------------------------------
+# Selector
+# ---------------------------------------------
+class ToolSelector:
+    """
+    Picks the tool groups a request needs by keyword cues. None means "bind
+    every tool".
+    """
+
+    def __init__(self, tools: List, group_tool_names: Dict[str, List[str]]):
+        self.tools = {tool.name: tool for tool in tools}
+        self.group_tool_names = group_tool_names
+        self.cues = {group: re.compile(pattern, re.IGNORECASE) for group, pattern in GROUP_CUES.items()}
+        self._schema_tokens = {}
+        self.stats = ToolSelectionStats()
+        self._evaluation = None
+
+    def select(self, text: str) -> Optional[Tuple[str, ...]]:
+        """Sorted group names the request needs, or None when no cue matched."""
+        groups = {group for group, cue in self.cues.items() if group in self.group_tool_names and cue.search(text)}
+        if not groups:
+            return None
+
+        for group in list(groups):
+            groups.update(dependency for dependency in GROUP_DEPENDENCIES.get(group, []) if dependency in self.group_tool_names)
+        return tuple(sorted(groups))
+
+    def tools_for(self, groups: Optional[Tuple[str, ...]]) -> List:
+        """Tools of the given groups, in their original order (all tools for None)."""
+        if groups is None:
+            return list(self.tools.values())
+        names = {name for group in groups for name in self.group_tool_names[group]}
+        return [tool for name, tool in self.tools.items() if name in names]
+
+    def schema_tokens(self, tools: List) -> int:
+        """Prompt tokens taken by the JSON schemas of `tools`."""
+        total = 0
+        for tool in tools:
+            if tool.name not in self._schema_tokens:
+                self._schema_tokens[tool.name] = count_tokens(json.dumps(convert_to_openai_tool(tool)))
+            total += self._schema_tokens[tool.name]
+        return total
+
+    def record_turn(self, groups: Optional[Tuple[str, ...]], agent_calls: int):
+        """Account one agent turn that ran `agent_calls` LLM calls with the groups' tools bound."""
+        sent = self.schema_tokens(self.tools_for(groups))
+        saved = self.schema_tokens(self.tools_for(None)) - sent
+        self.stats.record(groups, agent_calls, sent, saved)
+
+    def evaluate(self) -> Dict:
+        """
+        Share of TOOL_SELECTION_EVAL requests whose expected tool is bound
+        (binding every tool scores 1.0, so 1 - accuracy is the loss).
+        """
+        if self._evaluation is None:
+            misses, sent = [], 0
+            for request, expected in TOOL_SELECTION_EVAL:
+                groups = self.select(request)
+                tools = self.tools_for(groups)
+                sent += self.schema_tokens(tools)
+                if expected not in {tool.name for tool in tools}:
+                    misses.append({"request": request, "expected": expected, "groups": groups})
+            total = len(TOOL_SELECTION_EVAL)
+            self._evaluation = {
+                "requests": total,
+                "accuracy": round(1 - len(misses) / total, 3),
+                "avg_schema_tokens": round(sent / total),
+                "all_tools_schema_tokens": self.schema_tokens(self.tools_for(None)),
+                "misses": misses,
+            }
+        return self._evaluation
+
+    def report(self) -> Dict:
+        return dict(self.stats.report(), evaluation=self.evaluate())
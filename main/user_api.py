@@ -0,0 +1,240 @@
+# user_api.py
+
+import json
+import secrets
+from collections import deque
+from urllib.parse import quote
+from fastapi import APIRouter, UploadFile, File
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, EmailStr, ValidationError
+from typing import Dict, Iterator, List, Optional, Tuple
+from graph_tools.batch import batch_request, iter_graph_batch
+from graph_tools.graph_client import graph_get, graph_post
+from graph_tools.pagination import ndjson_lines
+from graph_tools.user_directory import find_user, sync_user_directory
+from bulk_import import spool_upload, iter_spooled_rows, normalize_row, describe_validation_error
+
+# Initialize router
+router = APIRouter()
+
+# Directory writes are throttled harder than reads, so keep fan-out small
+PROVISION_MAX_CONCURRENCY = 2
+ROSTER_COLUMN_ALIASES = {
+    "name": "display_name",
+    "full_name": "display_name",
+    "upn": "user_principal_name",
+    "email": "user_principal_name",
+    "title": "job_title",
+    "office_location": "office",
+    "enabled": "account_enabled",
+}
+
+# ---------------------------------------------
+# Pydantic Model: One roster row
+# ---------------------------------------------
+class UserRecord(BaseModel):
+    display_name: str
+    user_principal_name: EmailStr
+    mail_nickname: Optional[str] = None
+    password: Optional[str] = None  # Generated (and returned once) when missing
+    department: Optional[str] = None
+    job_title: Optional[str] = None
+    office: Optional[str] = None
+    account_enabled: Optional[bool] = None  # Left as is for existing users; new users are enabled
+
+# Roster field -> (Graph property, directory cache column)
+UPDATABLE_FIELDS = {
+    "display_name": ("displayName", "display_name"),
+    "department": ("department", "department"),
+    "job_title": ("jobTitle", "job_title"),
+    "office": ("officeLocation", "office"),
+    "account_enabled": ("accountEnabled", "account_enabled"),
+}
+
+# ---------------------------------------------
+# Helper: Plan a create or update for one user
+# ---------------------------------------------
+def _temporary_password() -> str:
+    return f"{secrets.token_urlsafe(12)}Aa1!"
+
+def _plan(record: UserRecord) -> Tuple[str, Optional[str], Dict]:
+    """
+    Compare a roster row with the directory cache.
+
+    Returns:
+        tuple: (action, existing user ID, Graph payload) where action is
+        "create", "update" or "unchanged".
+    """
+    existing = find_user(record.user_principal_name)
+
+    if not existing:
+        payload = {
+            "accountEnabled": record.account_enabled is not False,
+            "displayName": record.display_name,
+            "mailNickname": record.mail_nickname or record.user_principal_name.split("@")[0],
+            "userPrincipalName": record.user_principal_name,
+            "passwordProfile": {
+                "forceChangePasswordNextSignIn": True,
+                "password": record.password or _temporary_password()
+            }
+        }
+        for field, (graph_field, _) in UPDATABLE_FIELDS.items():
+            value = getattr(record, field)
+            if value is not None and graph_field not in payload:
+                payload[graph_field] = value
+        return "create", None, payload
+
+    changes = {}
+    for field, (graph_field, column) in UPDATABLE_FIELDS.items():
+        value = getattr(record, field)
+        if value is not None and value != existing.get(column):
+            changes[graph_field] = value
+    return ("update" if changes else "unchanged"), existing["id"], changes
+
+def _create_after_server_error(request: Dict) -> Dict:
+    """
+    Settle a create that failed with a 5xx. Graph may have created the user
+    anyway, so look the UPN up before posting it once more.
+
+    Returns:
+        dict: Response-like dict with "status" (201 when the user exists now) and "body".
+    """
+    upn = request["body"]["userPrincipalName"]
+    existing = graph_get(f"users/{quote(upn)}?$select=id,userPrincipalName")
+    if existing.get("id"):
+        return {"status": 201, "body": existing}
+
+    response = graph_post("users", request["body"])
+    return {"status": response.status_code, "body": response.json() if response.content else None}
+
+# ---------------------------------------------
+# Pipeline: validate, dedupe, plan and write via $batch
+# ---------------------------------------------
+def _provision_users(rows: Iterator[Tuple[int, Dict]], dry_run: bool) -> Iterator[Dict]:
+    """
+    Validate roster rows, dedupe by UPN, diff them against the directory and
+    run creates/updates through Graph $batch. Yields one result per row as it
+    is known, then a summary. With dry_run nothing is written.
+    """
+    immediate = deque()
+    pending = {}
+    seen = set()
+    summary = {}
+
+    def requests():
+        for row_number, raw in rows:
+            try:
+                record = UserRecord(**normalize_row(raw, ROSTER_COLUMN_ALIASES))
+            except ValidationError as e:
+                immediate.append({"row": row_number, "status": "invalid", "detail": describe_validation_error(e)})
+                continue
+
+            upn = record.user_principal_name.lower()
+            if upn in seen:
+                immediate.append({"row": row_number, "upn": record.user_principal_name, "status": "duplicate"})
+                continue
+            seen.add(upn)
+
+            action, user_id, payload = _plan(record)
+            result = {"row": row_number, "upn": record.user_principal_name}
+
+            if action == "unchanged":
+                immediate.append(dict(result, status="unchanged"))
+            elif dry_run:
+                changes = {k: v for k, v in payload.items() if k != "passwordProfile"}
+                immediate.append(dict(result, status=f"would_{action}", changes=changes))
+            elif action == "create":
+                generated = None if record.password else payload["passwordProfile"]["password"]
+                pending[str(row_number)] = dict(result, action=action, password=generated)
+                yield batch_request(str(row_number), "POST", "/users", payload)
+            else:
+                pending[str(row_number)] = dict(result, action=action)
+                yield batch_request(str(row_number), "PATCH", f"/users/{user_id}", payload)
+
+    def count(result):
+        summary[result["status"]] = summary.get(result["status"], 0) + 1
+        return result
+
+    def drain():
+        while immediate:
+            yield count(immediate.popleft())
+
+    written = 0
+    # Creates aren't retried blindly on a 5xx: a repeated POST for a user that was created fails as a conflict
+    batches = iter_graph_batch(
+        requests(),
+        max_concurrency=PROVISION_MAX_CONCURRENCY,
+        safe_to_retry=lambda request: request["method"] != "POST"
+    )
+    for request, response in batches:
+        yield from drain()
+
+        info = pending.pop(request["id"])
+        action = info.pop("action")
+        password = info.pop("password", None)
+        if action == "create" and response.get("status", 500) >= 500:
+            try:
+                response = _create_after_server_error(request)
+            except Exception as e:
+                response = {"status": 503, "body": str(e)}
+        status_code = response.get("status")
+
+        if (action == "create" and status_code == 201) or (action == "update" and status_code == 204):
+            written += 1
+            result = dict(info, status=f"{action}d")
+            if password:
+                result["temporary_password"] = password
+            yield count(result)
+        else:
+            yield count(dict(
+                info,
+                status="failed",
+                detail=f"{status_code}: {json.dumps(response.get('body'), default=str)}"
+            ))
+
+    yield from drain()
+
+    if written:
+        try:
+            sync_user_directory()
+        except Exception as e:
+            print(f"❌ [DEBUG] User directory sync after provisioning failed: {e}")
+
+    yield {"summary": summary, "dry_run": dry_run}
+
+# ---------------------------------------------
+# Endpoint: Provision users from a CSV / XLSX roster
+# ---------------------------------------------
+@router.post("/users/provision", summary="Bulk create/update users from a CSV or Excel roster")
+async def provision_users_file(file: UploadFile = File(...), dry_run: bool = False):
+    """
+    Create or update users from an HR roster file.
+
+    Expected columns: display_name, user_principal_name, and optionally
+    mail_nickname, password, department, job_title, office, account_enabled.
+    Users whose UPN already exists are updated (changed fields only).
+
+    Args:
+        file (UploadFile): CSV or XLSX roster.
+        dry_run (bool): Report planned creates/updates without writing anything.
+
+    Returns:
+        StreamingResponse: NDJSON with one result per user and a final summary.
+    """
+    temp_file_path, extension = await spool_upload(file, "roster")
+    rows = iter_spooled_rows(temp_file_path, extension)
+    return StreamingResponse(ndjson_lines(_provision_users(rows, dry_run)), media_type="application/x-ndjson")
+
+# ---------------------------------------------
+# Endpoint: Provision users from JSON
+# ---------------------------------------------
+@router.post("/users/provision_json", summary="Bulk create/update users from a JSON roster")
+async def provision_users_json(users: List[Dict], dry_run: bool = False):
+    """
+    Create or update users from a JSON array using the UserRecord fields.
+
+    Returns:
+        StreamingResponse: NDJSON with one result per user and a final summary.
+    """
+    rows = ((row_number, raw) for row_number, raw in enumerate(users, start=1))
+    return StreamingResponse(ndjson_lines(_provision_users(rows, dry_run)), media_type="application/x-ndjson")